@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Optional, Tuple, TYPE_CHECKING, Union
 
+import area_of_effect
 import configs.color as color
 from entity import Actor, EquippableItem
 import exceptions
@@ -53,8 +54,10 @@ class PickupAction(Action):
             raise exceptions.Impossible("Your inventory is full.")
                 
         self.engine.game_map.entities.remove(item)
+        item.mark_changed()  #and the map it leaves
         item.parent = self.entity.inventory
         inventory.items.append(item)
+        item.mark_changed()
 
         self.engine.message_log.add_message(f"You picked up the {item.name}!")
 
@@ -111,18 +114,21 @@ class FireballWeaponAction(Action):
         if not self.engine.game_map.visible[self.target_xy]:
             raise exceptions.Impossible("You must target somewhere visible.")
         
-        targets_hit = False
-        for actor in self.engine.game_map.actors:  #includes player and hidden entities, as long as target is visible
-            if actor.distance(*self.target_xy) <= self.radius:
-                targets_hit = True
-                self.engine.message_log.add_message(
-                    f"{actor.name} was engulfed in fire from a fireball, taking {self.damage} damage"
-                )
-                actor.fighter.take_damage(self.damage)  #dealt true damage
-        
-        if not targets_hit:
+        #includes player and hidden entities, as long as target is visible
+        targets = area_of_effect.get_actors_in_area(
+            self.engine.game_map,
+            area_of_effect.circle_area(self.engine.game_map, self.target_xy, self.radius),
+        )
+
+        if not targets:
             raise exceptions.Impossible("There are no targets within range.")
 
+        for actor in targets:
+            self.engine.message_log.add_message(
+                "{} was engulfed in fire from a fireball, taking {} damage", args=(actor.name, self.damage)
+            )
+            actor.fighter.take_damage(self.damage)  #dealt true damage
+
 
 class DropItem(ConsumableItemAction):
     def perform(self) -> None:
@@ -152,12 +158,16 @@ class WaitAction(Action):
 class TakeStairsAction(Action):
     def perform(self) -> None:
         '''
-        Take the stairs down if it exists
+        Take the stairs down or up, whichever the entity stands on
         '''
         if (self.entity.x, self.entity.y) == self.engine.game_map.downstairs_location:
             self.engine.game_world.generate_floor()
             self.engine.message_log.add_message("You have descended the staircase into the dark...", color.descend)
 
+        elif (self.entity.x, self.entity.y) == self.engine.game_map.upstairs_location:
+            self.engine.game_world.move_to_floor(self.engine.game_world.current_floor - 1)
+            self.engine.message_log.add_message("You have climbed back up the staircase.", color.descend)
+
         else:
             raise exceptions.Impossible("There are no stairs here!")
         
@@ -202,17 +212,17 @@ class MeleeAction(ActionWithDirection):
         else:
             attack_color = color.enemy_atk
 
-        attack_desc = f"{self.entity.name.capitalize()} attacks {target.name}"
+        attack_args = (self.entity.name.capitalize(), target.name)
 
         if damage > 0:
             self.engine.message_log.add_message(
-                f"{attack_desc} for {damage} hit points.", attack_color
+                "{} attacks {} for {} hit points.", attack_color, args=(*attack_args, damage)
             )
             target.fighter.hp -= damage  #uses setter of fighter component
 
         else:
             self.engine.message_log.add_message(
-                f"{attack_desc} but no damage is dealt", attack_color
+                "{} attacks {} but no damage is dealt", attack_color, args=attack_args
             )
 
         #account for thorns on enemy after attack if attack is valid
@@ -226,7 +236,7 @@ class MovementAction(ActionWithDirection):
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             #destination not in bounds
             raise exceptions.Impossible("The destination is blocked.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.is_walkable(dest_x, dest_y):
             #note: currently requires that dx, dy at most 1
             #destination blocked by wall/other tile
             raise exceptions.Impossible("The destination is blocked.")
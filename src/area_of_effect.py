@@ -0,0 +1,118 @@
+'''Shared area-of-effect queries used by consumables and weapon abilities
+
+Areas are boolean masks over their bounding box, cut down to the map, so their cost doesn't
+grow with the map; finding the actors hit only looks at the entities in that box
+'''
+from __future__ import annotations
+
+import functools
+from typing import List, NamedTuple, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+from entity import Actor
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+
+class Area(NamedTuple):
+    '''The tiles of an area: 'mask' covers its bounding box, whose top left tile is (x, y)'''
+
+    x: int
+    y: int
+    mask: np.ndarray
+
+    @property
+    def bounds(self) -> Tuple[int, int, int, int]:
+        '''The bounding box (x1, y1, x2, y2), as GameMap.clip returns it'''
+        return self.x, self.y, self.x + self.mask.shape[0], self.y + self.mask.shape[1]
+
+    def contains(self, x: int, y: int) -> bool:
+        x1, y1, x2, y2 = self.bounds
+        return x1 <= x < x2 and y1 <= y < y2 and bool(self.mask[x - x1, y - y1])
+
+
+@functools.lru_cache(maxsize=None)
+def disc_mask(radius: int) -> np.ndarray:
+    '''Returns a (2r+1, 2r+1) mask of the cells within Euclidean distance 'radius' of the center
+
+    Cached, so the mask of each radius is only built once; do not write into it
+    '''
+    offsets = np.arange(-radius, radius + 1)
+    mask = offsets[:, np.newaxis] ** 2 + offsets[np.newaxis, :] ** 2 <= radius ** 2
+    mask.flags.writeable = False
+    return mask
+
+
+def circle_area(gamemap: GameMap, center: Tuple[int, int], radius: int) -> Area:
+    '''Returns the area of every tile within 'radius' of 'center' '''
+    cx, cy = center
+
+    #clip the disc to the map boundaries
+    x1, y1, x2, y2 = gamemap.clip(cx - radius, cy - radius, cx + radius + 1, cy + radius + 1)
+    if x1 >= x2 or y1 >= y2:
+        return Area(cx, cy, np.zeros((0, 0), dtype=bool))
+
+    mask = disc_mask(radius)[
+        x1 - (cx - radius) : x2 - (cx - radius),
+        y1 - (cy - radius) : y2 - (cy - radius),
+    ]
+    return Area(x1, y1, mask)
+
+
+def cone_area(
+    gamemap: GameMap, origin: Tuple[int, int], target: Tuple[int, int], radius: int, angle: float = 90.0,
+) -> Area:
+    '''Returns the area of a cone from 'origin' towards 'target'
+
+    'angle' is the full width of the cone in degrees; the origin tile itself is not included
+    '''
+    ox, oy = origin
+    x1, y1, x2, y2 = gamemap.clip(ox - radius, oy - radius, ox + radius + 1, oy + radius + 1)
+    if x1 >= x2 or y1 >= y2:
+        return Area(ox, oy, np.zeros((0, 0), dtype=bool))
+
+    dx = np.arange(x1, x2)[:, np.newaxis] - ox
+    dy = np.arange(y1, y2)[np.newaxis, :] - oy
+
+    aim = np.arctan2(target[1] - oy, target[0] - ox)
+    #wrap the angle difference into [-pi, pi] so cones pointing west work as well
+    offset = np.abs((np.arctan2(dy, dx) - aim + np.pi) % (2 * np.pi) - np.pi)
+
+    in_range = dx ** 2 + dy ** 2 <= radius ** 2
+    in_cone = offset <= np.radians(angle) / 2
+
+    area = in_range & in_cone
+    if x1 <= ox < x2 and y1 <= oy < y2:
+        area[ox - x1, oy - y1] = False
+    return Area(x1, y1, np.asfortranarray(area))
+
+
+def line_area(gamemap: GameMap, origin: Tuple[int, int], target: Tuple[int, int]) -> Area:
+    '''Returns the area of the Bresenham line from 'origin' to 'target', excluding the origin'''
+    path = tcod.los.bresenham(origin, target)[1:]
+    in_bounds = (
+        (path[:, 0] >= 0) & (path[:, 0] < gamemap.width)
+        & (path[:, 1] >= 0) & (path[:, 1] < gamemap.height)
+    )
+    path = path[in_bounds]
+    if not len(path):
+        return Area(*origin, np.zeros((0, 0), dtype=bool))
+
+    x1, y1 = path.min(axis=0)
+    x2, y2 = path.max(axis=0) + 1
+    area = np.zeros((x2 - x1, y2 - y1), dtype=bool, order="F")
+    area[path[:, 0] - x1, path[:, 1] - y1] = True
+    return Area(int(x1), int(y1), area)
+
+
+def get_actors_in_area(gamemap: GameMap, area: Area) -> List[Actor]:
+    '''Returns every living actor standing on a tile of 'area', in turn order'''
+    x1, y1, _, _ = area.bounds
+    return [
+        entity
+        for entity in gamemap.entities.in_region(*area.bounds)
+        if isinstance(entity, Actor) and entity.is_alive and area.mask[entity.x - x1, entity.y - y1]
+    ]
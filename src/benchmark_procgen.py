@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+'''Benchmark and quality statistics of the procgen layout generators over many seeds, floors and map sizes
+
+Runs headless and fans the runs out over a process pool, from the src folder:
+    python benchmark_procgen.py --seeds 1000 --floors 1 4 7 --sizes 80x43 800x430 --generators rooms caves
+'''
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import numpy as np
+import tcod
+
+from entity import Actor
+import procgen
+import tile_types
+
+ROOM_MIN_SIZE = 6
+ROOM_MAX_SIZE = 10
+
+#rooms attempted on the default 80x43 map, scaled with the map area for other sizes
+BASE_MAX_ROOMS = 30
+BASE_AREA = 80 * 43
+
+#which spawnable entity ids are monsters, the rest are items
+IS_MONSTER = np.array([isinstance(entity, Actor) for entity in procgen.spawnable_entities], dtype=bool)
+
+METRICS = (
+    "time_ms", "peak_kib", "rooms_placed", "rooms_attempted",
+    "reachable_fraction", "stairs_distance", "monsters", "items", "regions_connected", "regions_filled",
+)
+
+
+def measure_layout(layout: procgen.DungeonLayout) -> Dict[str, float]:
+    '''Returns the quality statistics of a generated layout'''
+    walkable = tile_types.TILES["walkable"][layout.tiles]
+
+    #walking distance from the entrance to every tile in the 8 directions actors move, like
+    #procgen.label_regions connects them; unreachable tiles keep the max value
+    distance = tcod.path.maxarray(walkable.shape, dtype=np.int32, order="F")
+    distance[layout.entrance_location] = 0
+    tcod.path.dijkstra2d(distance, walkable.astype(np.int8), 1, 1, out=distance)
+    reachable = distance != np.iinfo(np.int32).max
+
+    stairs_distance = distance[layout.downstairs_location]
+    monsters = int(IS_MONSTER[layout.spawns[:, 0]].sum())
+
+    return {
+        "rooms_placed": layout.rooms_placed,
+        "rooms_attempted": layout.rooms_attempted,
+        "regions_connected": layout.regions_connected,
+        "regions_filled": layout.regions_filled,
+        "reachable_fraction": reachable.sum() / max(int(walkable.sum()), 1),
+        "stairs_distance": stairs_distance if reachable[layout.downstairs_location] else np.nan,
+        "monsters": monsters,
+        "items": len(layout.spawns) - monsters,
+    }
+
+
+def run_batch(
+    generator_name: str, map_width: int, map_height: int, floor_number: int, seeds: List[int], trace_memory: bool,
+) -> List[Dict[str, float]]:
+    '''Generates and measures one layout per seed; runs in a worker process'''
+    generate = procgen.layout_generators[generator_name]
+    max_rooms = max(1, round(BASE_MAX_ROOMS * map_width * map_height / BASE_AREA))
+    parameters = dict(
+        max_rooms=max_rooms,
+        room_min_size=ROOM_MIN_SIZE,
+        room_max_size=ROOM_MAX_SIZE,
+        map_width=map_width,
+        map_height=map_height,
+        floor_number=floor_number,
+    )
+
+    results = []
+    for seed in seeds:
+        start = time.perf_counter()
+        layout = generate(**parameters, seed=seed)
+        elapsed = time.perf_counter() - start
+
+        #tracing slows generation down, so memory is measured on a second, identical run
+        peak = np.nan
+        if trace_memory:
+            tracemalloc.start()
+            generate(**parameters, seed=seed)
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+        results.append({"time_ms": elapsed * 1000, "peak_kib": peak, **measure_layout(layout)})
+    return results
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def print_report(key: Tuple[str, int, int, int], results: List[Dict[str, float]]) -> None:
+    generator_name, map_width, map_height, floor_number = key
+    values = {metric: np.array([result[metric] for result in results], dtype=np.float64) for metric in METRICS}
+    p50, p90, p99 = np.percentile(values["time_ms"], [50, 90, 99])
+
+    print(f"{generator_name} {map_width}x{map_height} floor {floor_number} ({len(results)} runs)")
+    print(f"  time ms          p50 {p50:8.2f}  p90 {p90:8.2f}  p99 {p99:8.2f}  max {values['time_ms'].max():8.2f}")
+    if not np.isnan(values["peak_kib"]).all():
+        print(f"  peak memory KiB  p50 {np.nanmedian(values['peak_kib']):8.1f}  max {np.nanmax(values['peak_kib']):8.1f}")
+    print(
+        f"  rooms            {values['rooms_placed'].mean():.1f} placed of "
+        f"{values['rooms_attempted'].mean():.0f} attempted"
+    )
+    print(
+        f"  reachable floor  mean {values['reachable_fraction'].mean():.3f}  "
+        f"min {values['reachable_fraction'].min():.3f}"
+    )
+    print(
+        f"  repaired regions connected {values['regions_connected'].mean():.2f}  "
+        f"filled {values['regions_filled'].mean():.2f}"
+    )
+    unreachable_stairs = int(np.isnan(values["stairs_distance"]).sum())
+    if unreachable_stairs < len(results):
+        print(
+            f"  stairs distance  mean {np.nanmean(values['stairs_distance']):.1f}  "
+            f"max {np.nanmax(values['stairs_distance']):.0f}  (unreachable {unreachable_stairs})"
+        )
+    print(f"  per floor        monsters {values['monsters'].mean():.2f}  items {values['items'].mean():.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=200, help="layouts generated per map size and floor")
+    parser.add_argument("--floors", type=int, nargs="+", default=[1, 4, 7])
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(80, 43), (800, 430)], help="WIDTHxHEIGHT")
+    parser.add_argument(
+        "--generators", nargs="+", default=list(procgen.layout_generators), choices=list(procgen.layout_generators),
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="size of the process pool")
+    parser.add_argument("--batch", type=int, default=50, help="seeds per task sent to a worker")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced runs measuring peak memory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for generator_name in args.generators:
+            for map_width, map_height in args.sizes:
+                for floor_number in args.floors:
+                    key = (generator_name, map_width, map_height, floor_number)
+                    for first in range(0, args.seeds, args.batch):
+                        seeds = list(range(first, min(first + args.batch, args.seeds)))
+                        futures.setdefault(key, []).append(executor.submit(
+                            run_batch, generator_name, map_width, map_height, floor_number, seeds, not args.no_memory,
+                        ))
+
+        for key, batches in futures.items():
+            print_report(key, [result for future in batches for result in future.result()])
+
+    print(f"total wall time {time.perf_counter() - start:.1f} s with {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+'''Benchmark of save time, load time and file size per save codec, on mid-game engines
+
+Plays a few seeds headless for some floors and turns, then saves and loads every engine with
+every codec, from the src folder:
+    python benchmark_saves.py --seeds 5 --floors 4 --turns 100 --codecs none zlib:1 lzma:1 lzma bz2
+
+Save time is what a save costs in total, the snapshot taken on the game's thread plus compressing
+and writing on the background thread; the snapshot alone is reported as well. Delta saves are
+measured on a copy of each engine played on for --delta-turns turns after a full save
+'''
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import actions
+from engine import Engine
+import exceptions
+from persistence import codecs, save_format
+from persistence.save_service import write_atomic
+import setup_game
+
+METRICS = ("snapshot_ms", "save_ms", "load_ms", "size_kib", "delta_ms", "delta_kib")
+
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+def play(seed: int, floors: int, turns: int) -> Engine:
+    '''Returns the engine of a game played for 'turns' turns on each of 'floors' floors
+
+    The player wanders and fights at random and is healed every turn, so every game gets that far
+    '''
+    engine = setup_game.new_game(seed=seed, pregenerate=False)
+    rng = random.Random(seed)
+
+    for floor in range(floors):
+        if floor > 0:
+            engine.game_world.generate_floor()
+        play_turns(engine, rng, turns)
+
+    engine.update_fov()
+    return engine
+
+
+def play_turns(engine: Engine, rng: random.Random, turns: int) -> None:
+    player = engine.player
+    for _ in range(turns):
+        player.fighter.hp = player.fighter.max_hp
+        try:
+            actions.BumpAction(player, *rng.choice(DIRECTIONS)).perform()
+        except exceptions.Impossible:
+            continue
+        engine.handle_enemy_turns()
+        engine.update_fov()
+        engine.timers.advance()
+
+
+def measure(
+    engine: Engine, codec: str, level: Optional[int], filename: str, repeat: int, delta_turns: int,
+) -> Dict[str, float]:
+    '''Saves and loads the engine 'repeat' times, returning the best times'''
+    snapshot, save, load, delta = [], [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = save_format.dumps(engine)
+        snapshot.append(time.perf_counter() - start)
+        write_atomic(filename, save_format.compress(data, codec, level))
+        save.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        setup_game.load_game(filename)
+        load.append(time.perf_counter() - start)
+
+        #a copy to play on, writable like a loaded game
+        played = save_format.loads(bytearray(save_format.dumps(engine)))
+        history = save_format.SaveHistory("benchmark")
+        save_format.dumps(played, history=history)
+        play_turns(played, random.Random(len(delta)), delta_turns)
+
+        start = time.perf_counter()
+        delta_data = save_format.compress(save_format.dumps(played, history=history), codec, level)
+        delta.append(time.perf_counter() - start)
+
+    return {
+        "snapshot_ms": min(snapshot) * 1000,
+        "save_ms": min(save) * 1000,
+        "load_ms": min(load) * 1000,
+        "size_kib": os.path.getsize(filename) / 1024,
+        "delta_ms": min(delta) * 1000,  #without writing, which is an append instead of a new file
+        "delta_kib": len(delta_data) / 1024,
+    }
+
+
+def print_report(codec: Tuple[str, Optional[int]], results: List[Dict[str, float]], baseline_kib: float) -> None:
+    name, level = codec
+    _, level = codecs.get_codec(name, level)
+    values = {metric: np.array([result[metric] for result in results]) for metric in METRICS}
+
+    print(f"{name}:{level} ({len(results)} engines)")
+    for metric in ("save_ms", "snapshot_ms", "load_ms", "delta_ms"):
+        print(f"  {metric:12} p50 {np.median(values[metric]):8.2f}  max {values[metric].max():8.2f}")
+    ratio = values["size_kib"].mean() / baseline_kib if baseline_kib else np.nan
+    print(f"  size KiB     mean {values['size_kib'].mean():7.1f}  max {values['size_kib'].max():7.1f}  ({ratio:.0%} of uncompressed)")
+    print(f"  delta KiB    mean {values['delta_kib'].mean():7.1f}  max {values['delta_kib'].max():7.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=5, help="games played")
+    parser.add_argument("--floors", type=int, default=4, help="floors played per game")
+    parser.add_argument("--turns", type=int, default=100, help="turns played per floor")
+    parser.add_argument(
+        "--codecs", type=codecs.parse_codec, nargs="+", default=[(name, None) for name in codecs.CODECS],
+        help="NAME or NAME:LEVEL, names: " + ", ".join(codecs.CODECS),
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="saves and loads per engine and codec, the best is kept")
+    parser.add_argument("--delta-turns", type=int, default=5, help="turns played between a full save and a delta save")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engines = [play(seed, args.floors, args.turns) for seed in range(args.seeds)]
+    print(f"played {len(engines)} games in {time.perf_counter() - start:.1f} s")
+
+    baseline_kib = float(np.mean([len(save_format.dumps(engine)) / 1024 for engine in engines]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.sav")
+        for codec in args.codecs:
+            results = [measure(engine, *codec, filename, args.repeat, args.delta_turns) for engine in engines]
+            print_report(codec, results, baseline_kib)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import random
 from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
@@ -10,6 +9,7 @@ from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
 
 if TYPE_CHECKING:
     from entity import Actor
+    from timer_wheel import Timer
 
 class BaseAI (Action):
 
@@ -22,30 +22,43 @@ class BaseAI (Action):
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         '''Computes and returns a path to the target position
         
-        If no valid path, returns empty list
+        On maps with a 'path_margin' (chunked ones) only the box around both ends, widened by
+        that many tiles, is searched, so the cost doesn't grow with the map. If no valid path, returns empty list
         '''
+        gamemap = self.entity.gamemap
+        margin = gamemap.path_margin
+        if margin is None:
+            x1, y1, x2, y2 = 0, 0, gamemap.width, gamemap.height
+        else:
+            x1, y1, x2, y2 = gamemap.clip(
+                min(self.entity.x, dest_x) - margin,
+                min(self.entity.y, dest_y) - margin,
+                max(self.entity.x, dest_x) + margin + 1,
+                max(self.entity.y, dest_y) + margin + 1,
+            )
 
         # Copy the walkable array
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        cost = np.array(gamemap.get_tiles(x1, y1, x2, y2)["walkable"], dtype=np.int8)
 
         #want to fill in the cost array given the other entities
-        for entity in self.entity.gamemap.entities:
+        for entity in gamemap.entities.in_region(x1, y1, x2, y2):
+            x, y = entity.x - x1, entity.y - y1
             #check that entity blocks movement (enemy) and cost is not 0 (blocked)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
+            if entity.blocks_movement and cost[x, y]:
                 '''Add to the cost of a blocked position
                 A lower number means more enemies will crowd behidn each other in the halls
                 A higher number means enemies will take longer paths to surround the player
                 '''
-                cost[entity.x, entity.y] += 10
+                cost[x, y] += 10
 
         #create a graph from the cost array and pass that to a pathfinder
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
         pathfinder = tcod.path.Pathfinder(graph)
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  #start position
+        pathfinder.add_root((self.entity.x - x1, self.entity.y - y1))  #start position
 
-        #compute the path to the destination and remove the starting poitn
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        #compute the path to the destination, remove the starting point and move it back to map coordinates
+        path: List[List[int]] = (pathfinder.path_to((dest_x - x1, dest_y - y1))[1:] + (x1, y1)).tolist()
 
         #convert from List[List[int]] to List[Tuple[int, int]]
         return [(index[0], index[1]) for index in path]
@@ -71,10 +84,12 @@ class HostileEnemy(BaseAI):
                 return MeleeAction(self.entity, dx, dy).perform()  #hits player if right next to
 
             self.path = self.get_path_to(target.x, target.y) #gets new path
+            self.entity.mark_changed()
             
         #in player's vision but not close enough to attack, move closer
         if len(self.path) > 0:
             dest_x, dest_y = self.path.pop(0)  #moves by 1 closer to player
+            self.entity.mark_changed()  #even if the move turns out to be blocked
             return MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
             ).perform()
@@ -92,20 +107,34 @@ class ConfusedEnemy(BaseAI):
         super().__init__(entity)
 
         self.previous_ai = previous_ai
-        self.turns_remaining = turns_remaining
+
+        #the confusion wears off when the engine's timer wheel fires this timer
+        self.timer: Timer = self.engine.timers.schedule(turns_remaining, self.expire)
+
+    @property
+    def turns_remaining(self) -> int:
+        return self.engine.timers.remaining(self.timer)
+
+    def expire(self) -> None:
+        '''Reverts the AI back into its previous form'''
+        if self.entity.ai is not self:
+            return  #died or was confused again in the meantime
+
+        self.engine.message_log.add_message(
+            "{} is no longer confused.", args=(self.entity.name,)
+        )
+        self.entity.ai = self.previous_ai
+        self.entity.mark_changed()  #may not be on the current floor
 
     def perform(self) -> None:
 
-        #revert the AI back into its previous form after turns_remaining reaches 0
+        #the timer normally reverts the AI, this catches a timer that was lost (e.g. a copied entity)
         if self.turns_remaining <= 0:
-            self.engine.message_log.add_message(
-                f"{self.entity.name} is no longer confused."
-            )
-            self.entity.ai = self.previous_ai
+            self.expire()
 
         else:  #is still confused
             #pick random direction
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = self.engine.game_world.rng("ai").choice(
                 [
                     (-1, -1),  #northwest
                     (0, -1), #north
@@ -118,8 +147,6 @@ class ConfusedEnemy(BaseAI):
                 ]
             )
 
-            self.turns_remaining -= 1
-            
             #actor will try to move and attack in a random direction
             #can just bump into a wall, and waste a turn
 
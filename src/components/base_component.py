@@ -19,4 +19,10 @@ class BaseComponent:
 
     @property
     def engine(self) -> Engine:
-        return self.gamemap.engine
\ No newline at end of file
+        return self.gamemap.engine
+
+    def mark_changed(self) -> None:
+        '''Components are saved with their entity, so a change to one flags the entity, see Entity.mark_changed'''
+        parent = getattr(self, "parent", None)  #unset until the entity takes the component
+        if parent is not None:
+            parent.mark_changed()
\ No newline at end of file
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import math
 from typing import Optional, TYPE_CHECKING
 
 import actions
+import area_of_effect
 from actions import Action, ConsumableItemAction
 import configs.color as color
 import components.ai
@@ -37,6 +39,7 @@ class Consumable(BaseComponent):
         inventory = entity.parent
         if isinstance(inventory, components.inventory.Inventory):  #meaning if item is actually in an inventory
             inventory.items.remove(entity)
+            inventory.mark_changed()
     
 
 class HealingConsumable(Consumable):
@@ -67,20 +70,14 @@ class LightningDamageConsumable(Consumable):
         '''Targets closest enemy if any'''
 
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
-
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    closest_distance = distance
-                    target = actor
+        #closer than maximum_range + 1, as the scroll has always counted it: 5.9 tiles away is in a range of 5
+        target = self.engine.game_map.get_nearest_actor(
+            consumer.x, consumer.y, math.nextafter(self.maximum_range + 1, 0), exclude=consumer,
+        )
 
         if target is not None:
             self.engine.message_log.add_message(
-                f"A lightning bolt struck {target.name}, dealing {self.damage} damage!"
+                "A lightning bolt struck {}, dealing {} damage!", args=(target.name, self.damage)
             )
             target.fighter.take_damage(self.damage)
             self.consume()
@@ -118,6 +115,7 @@ class ConfusionConsumable(Consumable):
         )
 
         target.ai = components.ai.ConfusedEnemy(entity=target, previous_ai=target.ai, turns_remaining=self.number_of_turns)
+        target.mark_changed()
         self.consume()
 
 
@@ -142,16 +140,19 @@ class FireballDamageConsumable(Consumable):
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You must target somewhere visible.")
         
-        targets_hit = False
-        for actor in self.engine.game_map.actors:  #includes player and hidden entities, as long as target is visible
-            if actor.distance(*target_xy) <= self.radius:
-                targets_hit = True
-                self.engine.message_log.add_message(
-                    f"{actor.name} was engulfed in fire from a fireball, taking {self.damage} damage"
-                )
-                actor.fighter.take_damage(self.damage)  #dealt true damage
-        
-        if not targets_hit:
+        #includes player and hidden entities, as long as target is visible
+        targets = area_of_effect.get_actors_in_area(
+            self.engine.game_map,
+            area_of_effect.circle_area(self.engine.game_map, target_xy, self.radius),
+        )
+
+        if not targets:
             raise Impossible("There are no targets within range.")
+
+        for actor in targets:
+            self.engine.message_log.add_message(
+                "{} was engulfed in fire from a fireball, taking {} damage", args=(actor.name, self.damage)
+            )
+            actor.fighter.take_damage(self.damage)  #dealt true damage
         
         self.consume()
\ No newline at end of file
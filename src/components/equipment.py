@@ -12,35 +12,41 @@ if TYPE_CHECKING:
 class Equipment(BaseComponent):
     parent: Actor  #class variable
 
+    #every equipment slot, new slots only need to be added here
+    SLOTS = ("weapon", "armor")
+
     def __init__(self, weapon: Optional[EquippableItem] = None, armor: Optional[EquippableItem] = None) -> None:
         #TODO: add head/body/leg/feet armor + shield/offhand weapons
         '''Has a weapon and armor slot for each actor'''
         self.weapon = weapon
         self.armor = armor
 
+        #running totals over all slots, updated on equip/unequip so reading them is O(1)
+        self._bonus_power = 0
+        self._bonus_defense = 0
+        for slot in self.SLOTS:
+            self._add_bonuses(getattr(self, slot), sign=1)
+
     @property
     def bonus_defense(self) -> int:
-        bonus = 0
-
-        if self.weapon is not None and self.weapon.equippable is not None:
-            bonus += self.weapon.equippable.bonus_defense
-
-        if self.armor is not None and self.armor.equippable is not None:
-            bonus += self.armor.equippable.bonus_defense
-
-        return bonus
+        return self._bonus_defense
     
     @property
     def bonus_power(self) -> int:
-        bonus = 0
+        return self._bonus_power
 
-        if self.weapon is not None and self.weapon.equippable is not None:
-            bonus += self.weapon.equippable.bonus_power
+    def _add_bonuses(self, item: Optional[EquippableItem], sign: int) -> None:
+        '''Adds (sign=1) or removes (sign=-1) the bonuses of 'item' from the running totals'''
+        if item is None or item.equippable is None:
+            return
 
-        if self.armor is not None and self.armor.equippable is not None:
-            bonus += self.armor.equippable.bonus_power
+        self._bonus_power += sign * item.equippable.bonus_power
+        self._bonus_defense += sign * item.equippable.bonus_defense
 
-        return bonus
+    def _stats_changed(self) -> None:
+        '''Tells the owner's fighter that its derived stats are out of date'''
+        self.parent.fighter.invalidate_stats()
+        self.mark_changed()
 
     def item_is_equipped(self, item: EquippableItem) -> bool:
         '''Returns if item is equipped to the parent's equipment slots'''
@@ -64,6 +70,10 @@ class Equipment(BaseComponent):
             self.unequip_from_slot(slot, add_message)
 
         setattr(self, slot, item)
+        self._add_bonuses(item, sign=1)
+        self._stats_changed()
+        if item.equippable is not None:
+            item.equippable.resume_cooldown()
 
         if add_message:
             self.equip_message(item.name)
@@ -76,6 +86,10 @@ class Equipment(BaseComponent):
             self.unequip_message(current_item.name)
 
         setattr(self, slot, None)
+        self._add_bonuses(current_item, sign=-1)
+        self._stats_changed()
+        if current_item.equippable is not None:
+            current_item.equippable.pause_cooldown()
 
     def toggle_equip(self, equippable_item: EquippableItem, add_message: bool = True) -> None:
         if (
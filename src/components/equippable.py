@@ -16,6 +16,7 @@ import actions
 if TYPE_CHECKING:
     from entity import EquippableItem
     from entity import Actor
+    from timer_wheel import Timer
 
 class Equippable(BaseComponent):
     parent: EquippableItem
@@ -36,16 +37,48 @@ class Equippable(BaseComponent):
         #cooldown counts action turn. Cooldown-1 down time
         # Cooldown of 1 means possible action every turn. Cooldown of 2 means possible action every 2 turns
         self.cooldown = cooldown
-        self._current_cooldown = 0
+        self._cooldown_timer: Optional[Timer] = None  #registered in the engine's timer wheel while cooling down
+
+    @property
+    def cooldown_timer(self) -> Optional[Timer]:
+        '''The timer of the cooldown, None when the ability is ready'''
+        return self._cooldown_timer
 
     @property
     def current_cooldown(self) -> int:
-        return self._current_cooldown
+        if self._cooldown_timer is None:
+            return 0
+        return self.engine.timers.remaining(self._cooldown_timer)
 
     @current_cooldown.setter
     def current_cooldown(self, value: int) -> None:
         #bounded by 0 <= value <= self.cooldown
-        self._current_cooldown = max(0, min(self.cooldown, value))
+        value = max(0, min(self.cooldown, value))
+
+        if self._cooldown_timer is not None:
+            self.engine.timers.cancel(self._cooldown_timer)
+            self._cooldown_timer = None
+
+        if value > 0:
+            self._cooldown_timer = self.engine.timers.schedule(value, self.end_cooldown)
+        self.mark_changed()
+
+    def end_cooldown(self) -> None:
+        '''Called by the timer wheel when the cooldown is over'''
+        self._cooldown_timer = None
+        self.mark_changed()  #the item may lie on another floor by now
+
+    def pause_cooldown(self) -> None:
+        '''Stops the cooldown running down, as only equipped items recharge'''
+        if self._cooldown_timer is not None:
+            self.engine.timers.pause(self._cooldown_timer)
+            self.mark_changed()
+
+    def resume_cooldown(self) -> None:
+        '''Lets the cooldown run down again once the item is equipped'''
+        if self._cooldown_timer is not None:
+            self.engine.timers.resume(self._cooldown_timer)
+            self.mark_changed()
 
     @property
     def player(self) -> Actor:
@@ -139,12 +172,12 @@ class ChainMail(Equippable):
 
         if damage > 0:
             self.engine.message_log.add_message(
-                f"Chainmail's thorns dealt {damage} hit points to {aggressor.name}.", attack_color
+                "Chainmail's thorns dealt {} hit points to {}.", attack_color, args=(damage, aggressor.name)
             )
             aggressor.fighter.hp -= damage  #uses setter of fighter component
 
         else:
             self.engine.message_log.add_message(
-                f"Chainmail's thorns attacked {aggressor.name} but no damage is dealt", attack_color
+                "Chainmail's thorns attacked {} but no damage is dealt", attack_color, args=(aggressor.name,)
             )
     
\ No newline at end of file
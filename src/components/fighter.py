@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 import configs.color as color
 
@@ -18,8 +18,12 @@ class Fighter(BaseComponent):
     def __init__(self, hp: int, base_defense: int, base_power: int, class_action: actions.Action = None) -> None:
         self.max_hp = hp
         self._hp = hp
-        self.base_defense = base_defense  #TODO: FIX DEFENSE MECHANICS
-        self.base_power = base_power
+        self._base_defense = base_defense  #TODO: FIX DEFENSE MECHANICS
+        self._base_power = base_power
+
+        #derived stats, computed on first read and cleared by invalidate_stats
+        self._defense: Optional[int] = None
+        self._power: Optional[int] = None
 
         self.class_action = class_action
 
@@ -32,16 +36,46 @@ class Fighter(BaseComponent):
     @hp.setter
     def hp(self, value: int) -> None:
         self._hp = max(0, min(value, self.max_hp))
+        self.mark_changed()
         if self._hp == 0 and self.parent.ai is not None:
             self.die()
 
+    @property
+    def base_defense(self) -> int:
+        return self._base_defense
+
+    @base_defense.setter
+    def base_defense(self, value: int) -> None:
+        self._base_defense = value
+        self.invalidate_stats()
+        self.mark_changed()
+
+    @property
+    def base_power(self) -> int:
+        return self._base_power
+
+    @base_power.setter
+    def base_power(self, value: int) -> None:
+        self._base_power = value
+        self.invalidate_stats()
+        self.mark_changed()
+
     @property
     def defense(self) -> int:
-        return self.base_defense + self.bonus_defense
+        if self._defense is None:
+            self._defense = self.base_defense + self.bonus_defense
+        return self._defense
     
     @property
     def power(self) -> int:
-        return self.base_power + self.bonus_power
+        if self._power is None:
+            self._power = self.base_power + self.bonus_power
+        return self._power
+
+    def invalidate_stats(self) -> None:
+        '''Clears the cached derived stats; called when base stats or equipment change'''
+        self._defense = None
+        self._power = None
     
     @property
     def bonus_defense(self) -> int:
@@ -61,10 +95,12 @@ class Fighter(BaseComponent):
         if self.engine.player is self.parent:   #player death
             #event handler changed in MainEventHandler
             self.engine.lives_left -= 1
-            death_message = f"You died! You have {self.engine.lives_left+1} lives left."
+            death_message = "You died! You have {} lives left."
+            death_args = (self.engine.lives_left+1,)
             death_color = color.player_die
         else:
-            death_message = f"{self.parent.name} is dead."
+            death_message = "{} is dead."
+            death_args = (self.parent.name,)
             death_color = color.enemy_die
 
         self.parent.char = "%"
@@ -74,7 +110,7 @@ class Fighter(BaseComponent):
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
 
-        self.engine.message_log.add_message(death_message, death_color)
+        self.engine.message_log.add_message(death_message, death_color, args=death_args)
 
         self.engine.player.level.add_xp(self.parent.level.xp_given)
 
@@ -19,6 +19,7 @@ class Inventory(BaseComponent):
         Removes item from the inventory and restores it to gamemap, at player's curr location
         '''
         self.items.remove(item)
+        self.mark_changed()
         item.place(self.parent.x, self.parent.y, self.gamemap)
 
         self.engine.message_log.add_message(f"You dropped {item.name}.")
\ No newline at end of file
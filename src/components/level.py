@@ -38,18 +38,20 @@ class Level (BaseComponent):
             return
         
         self.current_xp += xp
+        self.mark_changed()
 
-        self.engine.message_log.add_message(f"You have gained {xp} xp points.")
+        self.engine.message_log.add_message("You have gained {} xp points.", args=(xp,))
 
         if self.requires_level_up:
             self.engine.message_log.add_message(
-                f"You advanced to level {self.current_level + 1}!"
+                "You advanced to level {}!", args=(self.current_level + 1,)
             )
 
     def increase_level(self) -> None:
         self.current_xp -= self.experience_to_next_level
 
         self.current_level += 1
+        self.mark_changed()
 
     def increase_max_hp(self, amount: int = 20) -> None:
         self.parent.fighter.max_hp += amount
@@ -55,4 +55,8 @@ CURSOR_Y_KEYS = {
     tcod.event.KeySym.PAGEUP: -10,
     tcod.event.KeySym.PAGEDOWN: 10,
 
-}
\ No newline at end of file
+}
+
+#the part of the screen the map is drawn on, bigger maps scroll to follow the player
+MAP_VIEW_WIDTH = 80
+MAP_VIEW_HEIGHT = 43
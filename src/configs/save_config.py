@@ -0,0 +1,28 @@
+#compression of save files, one of persistence.codecs.CODECS; benchmark_saves.py compares them
+SAVE_CODEC = "lzma"
+SAVE_COMPRESSION_LEVEL = 1  #None for the codec's default level
+
+#floor snapshots are taken while changing floors, so they favor speed
+SNAPSHOT_CODEC = "zlib"
+SNAPSHOT_COMPRESSION_LEVEL = 1
+#floors evicted from memory are written to files in this folder, None keeps their snapshots in memory
+SNAPSHOT_DIR = None
+
+#saves after a full one only write what changed since the save before, see persistence.save_service
+DELTA_SAVES = True
+#the deltas are compacted into a new full save after this many of them...
+DELTAS_PER_FULL_SAVE = 20
+#...or once together they are this much larger than the full save, as loading replays all of them
+MAX_DELTA_SIZE_RATIO = 2.0
+
+#the action journal is written every this many seconds, a hard kill loses at most this much play
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+#saves are kept in this folder, in slots, see persistence.save_slots
+SAVE_DIR = "saves"
+#slots games are played in, picked when starting a new game
+SAVE_SLOTS = 3
+#autosave slots, used in turn so the older ones can be rolled back to
+AUTOSAVE_SLOTS = 3
+#the game autosaves every this many turns, 0 turns autosaving off
+AUTOSAVE_INTERVAL = 100
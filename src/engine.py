@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import lzma  #lzma.compress does compression on object
-import pickle  #pickles.dump serializes object hierarchy in Python
-
+from concurrent.futures import Future
+import time
 from typing import TYPE_CHECKING
 
+import numpy as np
 from tcod.console import Console
 from tcod.map import compute_fov
 
@@ -13,6 +13,10 @@ import configs.color as color
 import exceptions
 from interface.message_log import MessageLog
 import interface.render_functions as render_functions
+from persistence import save_format
+from persistence.action_journal import action_journal
+from persistence.save_service import save_service
+from timer_wheel import TimerWheel
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -30,28 +34,52 @@ class Engine:
         self.mouse_location = (0, 0)
         self.player = player
 
+        #cooldowns and status effects register their expirations here, advanced once per turn
+        self.timers = TimerWheel()
+
         #10 lives to beat the game
         self.lives_left = 9
 
     def handle_enemy_turns(self) -> None:
 
-        #self.game_map.actors gets a generator of actors in map
-        for entity in set(self.game_map.actors) - {self.player}:
+        #self.game_map.actors gets a generator of actors in map, listed first since turns can change it
+        for entity in [actor for actor in self.game_map.actors if actor is not self.player]:
             if entity.ai is not None: #if it has an AI, then perform it
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass  # Ignore impossible action exceptions from AI for now
 
-    def update_fov(self) -> None:
-        '''Recompute the visible area based on the player's POV'''
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8
+    def update_fov(self, radius: int = 8) -> None:
+        '''Recompute the visible area based on the player's POV
+
+        Only the square the radius reaches is computed, so the cost doesn't grow with the map
+        '''
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+
+        #generate whatever came into reach of the viewport
+        game_map.load_viewport()
+
+        x1, y1, x2, y2 = game_map.clip(x - radius, y - radius, x + radius + 1, y + radius + 1)
+        visible = compute_fov(
+            game_map.get_tiles(x1, y1, x2, y2)["transparent"],
+            (x - x1, y - y1),
+            radius=radius,
         )
+
+        region = np.s_[x1:x2, y1:y2]
+        if region == game_map.visible_region and np.array_equal(game_map.visible[region], visible):
+            return  #nothing came into or went out of sight, so nothing was explored either
+
+        #only the previously computed square can still have visible tiles
+        game_map.visible[game_map.visible_region] = False
+        game_map.visible_region = region
+        game_map.visible[region] = visible
+
         #update "explored" to include "visible"
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[region] |= visible
+        game_map.mark_changed()
             
     def render(self, console: Console) -> None:
 
@@ -82,12 +110,44 @@ class Engine:
         #prints mouse hovering info
         render_functions.render_names_at_mouse_location(console=console, x=21, y=44, engine=self)
 
-    def save_as(self, filename: str) -> None:
-        '''Saves this engine state as a compressed file        
-        Note the engine defines the state
+    def save_metadata(self) -> dict:
+        '''What the menus show of a save of this engine, kept uncompressed in the save's header'''
+        return {
+            "floor": self.game_world.current_floor,
+            "lives_left": self.lives_left,
+            "level": self.player.level.current_level,
+            "turn": self.timers.turn,
+            "timestamp": time.time(),
+        }
+
+    def snapshot(self) -> save_format.GraphSnapshot:
+        '''Captures the state of the game in memory, for restore, e.g. before each rollout of a simulation
+
+        The state is kept as uncompressed save data (see save_format.take_snapshot), which restore
+        puts back into the same objects rather than building a new graph
+        '''
+        return save_format.take_snapshot(self)
+
+    def restore(self, snapshot: save_format.GraphSnapshot) -> None:
+        '''Puts a snapshot of this engine back in place, any number of times
+
+        The engine, player, maps and entities stay the same objects, and the arrays of the maps the
+        same arrays. Floors evicted to snapshot files (see FloorCache) are the exception, revisiting
+        one deletes its file, so rollouts should keep floor snapshots in memory
         '''
-        save_data = lzma.compress(pickle.dumps(self))
+        if not snapshot.objects or snapshot.objects[0] is not self:
+            raise ValueError("The snapshot is of another engine")
 
-        #TODO: put this file in saves folder...
-        with open(filename, "wb") as f:  #saves in saves folder
-            f.write(save_data)
\ No newline at end of file
+        executor = self.game_world._executor  #not part of the state, its worker processes carry on
+        save_format.restore_snapshot(snapshot)
+        self.game_world._executor = executor
+
+    def save_as(self, filename: str) -> Future:
+        '''Saves this engine state to a file, in the background
+        Note the engine defines the state
+
+        The state is captured before this returns; the returned future is done once the file is written
+        '''
+        future = save_service.save(self, filename)
+        action_journal.checkpoint(self, save_service.checkpoint, future, filename)  #replays start from the save from now on
+        return future
\ No newline at end of file
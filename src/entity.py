@@ -48,15 +48,30 @@ class Entity:
         self.blocks_movement = blocks_movement
         self.render_order = render_order
 
+        #whether the entity changed since the last save, so delta saves can leave it out, see mark_changed
+        self.changed = True
+
         if parent is not None:
             #if gamemap isn't provided now then it will be set later
             self.parent = parent
             parent.entities.add(self)
+            parent.mark_changed()
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def mark_changed(self) -> None:
+        '''Flags the entity for the next delta save, along with what holds it: its map or the actor carrying it
+
+        Delta saves only look into flagged objects, so whatever changes an entity or its
+        components calls this, e.g. moving, taking damage or a timer of another floor firing
+        '''
+        self.changed = True
+        parent = getattr(self, "parent", None)  #possibly uninitialized
+        if parent is not None:
+            parent.mark_changed()
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         '''Spawns a copy of this instance at the given location; note deepcopy to avoid alias'''
         clone = copy.deepcopy(self)
@@ -64,6 +79,7 @@ class Entity:
         clone.y = y
         clone.parent = gamemap
         gamemap.entities.add(clone)
+        clone.mark_changed()
         return clone
     
     def distance(self, x: int, y: int) -> float:
@@ -76,6 +92,7 @@ class Entity:
         '''Place this entity at a new location. Handles moving across GameMaps'''
         self.x = x
         self.y = y
+        self.mark_changed()  #and the map or inventory it leaves
 
         #Gamemap is none means stays in current map
         if gamemap:
@@ -84,11 +101,16 @@ class Entity:
                     self.parent.entities.remove(self)
             self.parent = gamemap
             gamemap.entities.add(self)
+            gamemap.mark_changed()
+        elif hasattr(self, "parent") and self.parent is self.gamemap:
+            self.parent.entities.moved(self)
 
     def move(self, dx: int, dy: int) -> None:
         #moves the entity
         self.x += dx
         self.y += dy
+        self.parent.entities.moved(self)  #only entities on a map move
+        self.mark_changed()
 
 
 class Actor(Entity):
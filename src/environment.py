@@ -0,0 +1,189 @@
+'''Gym-style environment: the game as reset and step with discrete actions, headless
+
+    env = RLGameEnv(crop=10)
+    observation, info = env.reset(seed=1)
+    observation, reward, terminated, truncated, info = env.step(env.sample_action())
+
+Observations are {"stats": the player's PLAYER_STATS, "layers": see observation.ObservationBuilder},
+arrays the environment rewrites in place every step, so copy them to keep them.
+
+Steps play out like turns of the game (see EventHandler.play_turn): the player's action, enemy
+turns, FOV and timers. Choices the game asks for outside of actions are made by the environment,
+character creation on respawns and level ups. There is no window, and the message log drops its
+messages; render draws the game into a console on request
+'''
+from __future__ import annotations
+
+import random
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import tcod
+
+import actions
+from engine import Engine
+from interface.message_log import MessageLog
+import input_handlers
+from persistence.action_journal import LEVEL_UPS
+from observation import ObservationBuilder
+import setup_game
+
+#the eight directions of bump actions, clockwise from north
+DIRECTIONS = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+#the discrete actions, by index
+ACTIONS = tuple(f"bump_{dx}_{dy}" for dx, dy in DIRECTIONS) + ("wait", "pickup", "take_stairs")
+
+#what the observation holds of the player, in order
+PLAYER_STATS = ("x", "y", "hp", "max_hp", "power", "defense", "level", "xp", "floor", "lives_left")
+
+
+class RLGameEnv:
+    '''The game as an environment, one engine at a time
+
+    Rewards are the experience the player gains, 'floor_reward' for every floor deeper than
+    any reached before, and minus 'death_penalty' for every life lost. Like gymnasium's, an
+    episode is terminated once the game is over, or truncated after 'max_steps' steps.
+    The layers cover the whole map, or with 'crop' the square of that radius around the player
+    '''
+
+    def __init__(
+        self,
+        max_steps: Optional[int] = 1000,
+        floor_reward: float = 10.0,
+        death_penalty: float = 10.0,
+        screen_width: int = 80,
+        screen_height: int = 50,
+        crop: Optional[int] = None,
+    ) -> None:
+        self.max_steps = max_steps
+        self.floor_reward = floor_reward
+        self.death_penalty = death_penalty
+        self.screen_width, self.screen_height = screen_width, screen_height
+        self.crop = crop
+
+        self.stats = np.zeros(len(PLAYER_STATS), dtype=np.float32)
+        self.observation: Optional[ObservationBuilder] = None  #created by reset, for the size of its maps
+
+        self.engine: Optional[Engine] = None
+        self.steps = 0
+        self.deepest_floor = 0
+        self.done = True
+        self._level_ups = 0  #taken so far, the environment takes them in turn
+        self._rng = random.Random()
+
+    @property
+    def action_count(self) -> int:
+        return len(ACTIONS)
+
+    def sample_action(self) -> int:
+        '''Returns a random action, drawn from the stream seeded by reset'''
+        return self._rng.randrange(len(ACTIONS))
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        '''Starts a new game, the same one for the same 'seed', and returns its observation and info'''
+        engine = setup_game.new_game(seed=seed, pregenerate=False)
+        engine.message_log = MessageLog(silent=True)
+        self.create_character(input_handlers.AttributeSelection(engine))
+
+        self.engine = engine
+        self.steps = 0
+        self.deepest_floor = engine.game_world.current_floor
+        self.done = False
+        self._level_ups = 0
+        self._rng = random.Random(engine.game_world.seed)
+
+        observation = self.observation
+        if observation is None or (self.crop is None and observation.map_shape != (engine.game_map.width, engine.game_map.height)):
+            self.observation = ObservationBuilder.for_engine(engine, self.crop)
+        return self.observe(), self.info()
+
+    def step(self, action: int) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        '''Plays the action with the given index, returns the observation, reward, whether the episode is terminated or truncated, and info
+
+        Actions that are impossible (walking into a wall, no stairs to take) cost a step but no turn
+        '''
+        if self.engine is None or self.done:
+            raise RuntimeError("The episode is over, call reset first")
+        if not 0 <= action < len(ACTIONS):
+            raise ValueError(f"{action} is not an action, there are {len(ACTIONS)}")
+
+        engine = self.engine
+        player, lives_left, turn = engine.player, engine.lives_left, engine.timers.turn
+        xp = player.level.current_xp
+
+        handler = input_handlers.MainGameEventHandler(engine).play_turn(self.make_action(action))
+
+        #experience gained before the level up spends it, and as long as the player is the same
+        reward = float(player.level.current_xp - xp)
+        if isinstance(handler, input_handlers.LevelUpHandler):
+            self.level_up()
+        elif isinstance(handler, input_handlers.AttributeSelection):
+            self.create_character(handler)
+
+        reward -= self.death_penalty * (lives_left - engine.lives_left)
+        floor = engine.game_world.current_floor
+        if floor > self.deepest_floor:
+            reward += self.floor_reward * (floor - self.deepest_floor)
+            self.deepest_floor = floor
+
+        self.steps += 1
+        terminated = isinstance(handler, input_handlers.GameOverEventHandler)
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        self.done = terminated or truncated
+
+        info = self.info()
+        info["turn_taken"] = engine.timers.turn != turn
+        return self.observe(), reward, terminated, truncated, info
+
+    def make_action(self, action: int) -> actions.Action:
+        '''Returns the game action of an action index'''
+        player = self.engine.player
+        if action < len(DIRECTIONS):
+            return actions.BumpAction(player, *DIRECTIONS[action])
+        name = ACTIONS[action]
+        if name == "wait":
+            return actions.WaitAction(player)
+        if name == "pickup":
+            return actions.PickupAction(player)
+        return actions.TakeStairsAction(player)
+
+    def create_character(self, handler: input_handlers.AttributeSelection) -> None:
+        '''Creates the character of an AttributeSelection, its skill points spread over hp, power and defense'''
+        points = [handler.hp_points, handler.power_points, handler.defense_points]
+        for i in range(handler.current_skill_points):
+            points[i % 3] += 1
+        input_handlers.create_character(handler.engine, *points, weapon=None, armor=None)
+
+    def level_up(self) -> None:
+        '''Takes a level up, increasing max hp, power and defense in turn'''
+        getattr(self.engine.player.level, LEVEL_UPS[self._level_ups % len(LEVEL_UPS)])()
+        self._level_ups += 1
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        '''Updates the observation in place and returns it: the player's stats and the map layers'''
+        engine = self.engine
+        player = engine.player
+        fighter = player.fighter
+        self.stats[:] = (
+            player.x, player.y, fighter.hp, fighter.max_hp, fighter.power, fighter.defense,
+            player.level.current_level, player.level.current_xp,
+            engine.game_world.current_floor, engine.lives_left,
+        )
+        return {"stats": self.stats, "layers": self.observation.update(engine)}
+
+    def info(self) -> Dict[str, Any]:
+        engine = self.engine
+        return {"turn": engine.timers.turn, "floor": engine.game_world.current_floor, "steps": self.steps}
+
+    def render(self) -> tcod.console.Console:
+        '''Draws the game into a new console, like the window shows it, for the caller to present or print'''
+        console = tcod.console.Console(self.screen_width, self.screen_height, order="F")
+        self.engine.render(console)
+        return console
+
+    def close(self) -> None:
+        if self.engine is not None:
+            self.engine.game_world.close()
+        self.engine = None
+        self.done = True
@@ -0,0 +1,127 @@
+'''Keeps visited floors so they can be revisited'''
+from __future__ import annotations
+
+from collections import OrderedDict
+import os
+from typing import Dict, Optional, TYPE_CHECKING
+
+import configs.save_config as save_config
+from game_map import GameMap
+from persistence import save_format
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+
+class Snapshot:
+    '''The compressed data of an evicted floor
+
+    A record of its own rather than plain bytes, so delta saves write it once and refer to it afterwards
+    '''
+
+    changed = False  #snapshots never change
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+
+class FloorCache:
+    '''Visited floors by floor number
+
+    The 'live_capacity' most recently visited floors stay live as GameMaps. Older ones are
+    evicted to compressed snapshots, kept in memory or, if 'snapshot_dir' is given, written to files there.
+    Those files are named after their floor. The timers of an evicted floor (see GameMap.timers) are
+    paused with it and resumed once it is restored, so its monsters' confusion doesn't wear off
+    while nobody plays it. The folder is a setting of the session, not saved:
+    a loaded cache uses SNAPSHOT_DIR of configs.save_config, so a save can't point it at other
+    files. Floors whose file isn't there are generated anew
+    '''
+
+    def __init__(
+        self,
+        live_capacity: int = 3,
+        snapshot_dir: Optional[str] = save_config.SNAPSHOT_DIR,
+        codec: str = save_config.SNAPSHOT_CODEC,
+        level: Optional[int] = save_config.SNAPSHOT_COMPRESSION_LEVEL,
+    ) -> None:
+        self.live_capacity = max(1, live_capacity)
+        self.snapshot_dir = snapshot_dir
+        self.codec = codec
+        self.level = level
+
+        self.live: OrderedDict[int, GameMap] = OrderedDict()  #least recently visited first
+        self.snapshots: Dict[int, Optional[Snapshot]] = {}  #compressed data, None if it is in the floor's file
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["snapshot_dir"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.snapshot_dir = save_config.SNAPSHOT_DIR
+
+    def snapshot_path(self, floor: int) -> str:
+        '''The file the snapshot of 'floor' is written to, in 'snapshot_dir' '''
+        return os.path.join(self.snapshot_dir, f"floor_{int(floor)}.snapshot")
+
+    def __contains__(self, floor: int) -> bool:
+        return floor in self.live or floor in self.snapshots
+
+    def get(self, floor: int, engine: Engine) -> Optional[GameMap]:
+        '''Returns the map of a visited floor, restoring it from its snapshot if needed'''
+        if floor in self.live:
+            self.live.move_to_end(floor)
+            return self.live[floor]
+
+        if floor not in self.snapshots:
+            return None
+
+        snapshot = self.snapshots.pop(floor)
+        if isinstance(snapshot, Snapshot):
+            data = snapshot.data
+        else:
+            if self.snapshot_dir is None or not os.path.exists(self.snapshot_path(floor)):
+                return None  #e.g. saved in a session with another snapshot folder
+            path = self.snapshot_path(floor)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+
+        game_map = self.restore(data, engine)
+        for timer in game_map.timers():
+            engine.timers.resume(timer)
+        self.put(floor, game_map)
+        return game_map
+
+    def put(self, floor: int, game_map: GameMap) -> None:
+        '''Marks the floor as the most recently visited, evicting the oldest live floors'''
+        self.live[floor] = game_map
+        self.live.move_to_end(floor)
+
+        while len(self.live) > self.live_capacity:
+            old_floor, old_map = self.live.popitem(last=False)
+            for timer in old_map.timers():
+                old_map.engine.timers.pause(timer)
+            data = self.snapshot(old_map)
+
+            if self.snapshot_dir is None:
+                self.snapshots[old_floor] = Snapshot(data)
+            else:
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                with open(self.snapshot_path(old_floor), "wb") as f:
+                    f.write(data)
+                self.snapshots[old_floor] = None
+
+    def snapshot(self, game_map: GameMap) -> bytes:
+        '''Returns a compressed snapshot of the floor, without its engine
+
+        GameMaps save their tile ids rather than their tiles, and chunked maps only the chunks generated so far
+        '''
+        return save_format.dumps(game_map, externals={"engine": game_map.engine}, codec=self.codec, level=self.level)
+
+    @staticmethod
+    def restore(data: bytes, engine: Engine) -> GameMap:
+        '''Rebuilds a live GameMap from a snapshot of any codec'''
+        #a bytearray, so the arrays of uncompressed snapshots are writable as well
+        return save_format.loads(bytearray(data), externals={"engine": engine})
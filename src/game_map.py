@@ -1,42 +1,206 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING, Union
+from collections.abc import MutableSet
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import math
+import multiprocessing
+import random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING, Union
+import zlib
 
 import numpy as np
 from tcod.console import Console
 
+import configs.interface_config as config
+import configs.save_config as save_config
 from entity import Actor, ConsumableItem, EquippableItem
 import tile_types
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
+    from procgen import ChunkGenerator, DungeonLayout
+    from timer_wheel import Timer
+
+class EntitySet(MutableSet):
+    '''A set of entities that iterates in insertion order
+
+    Turn order and every query follow this order, so a seeded game plays out the same each time.
+    Entities are also bucketed by position, in cells of CELL_SIZE tiles square, so queries of an
+    area (see in_region) only look at the entities near it. The buckets are built by the first
+    such query and left out of saves; entities changing position call 'moved' to keep them up to date
+    '''
+
+    CELL_SIZE = 8
+
+    #entities by cell, None until the first query of an area (e.g. after loading)
+    _cells: Optional[Dict[Tuple[int, int], Dict[Entity, None]]] = None
+
+    def __init__(self, entities: Iterable[Entity] = ()) -> None:
+        self._entities: Dict[Entity, None] = dict.fromkeys(entities)
+
+    def __getstate__(self) -> dict:
+        return {"_entities": self._entities}
+
+    def __contains__(self, entity: object) -> bool:
+        return entity in self._entities
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(self._entities)
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def add(self, entity: Entity) -> None:
+        if entity in self._entities:
+            self.moved(entity)
+            return
+        self._entities[entity] = None
+        if self._cells is not None:
+            self._insert(entity)
+
+    def discard(self, entity: Entity) -> None:
+        self._entities.pop(entity, None)
+        if self._cells is not None and entity in self._cell_of:
+            cell = self._cell_of.pop(entity)
+            del self._ranks[entity]
+            bucket = self._cells[cell]
+            del bucket[entity]
+            if not bucket:
+                del self._cells[cell]
+
+    def moved(self, entity: Entity) -> None:
+        '''Moves an entity to the bucket of its new position'''
+        if self._cells is None:
+            return
+        cell = (entity.x // self.CELL_SIZE, entity.y // self.CELL_SIZE)
+        old_cell = self._cell_of[entity]
+        if cell != old_cell:
+            bucket = self._cells[old_cell]
+            del bucket[entity]
+            if not bucket:
+                del self._cells[old_cell]
+            self._cell_of[entity] = cell
+            self._cells.setdefault(cell, {})[entity] = None
+
+    def _insert(self, entity: Entity) -> None:
+        cell = (entity.x // self.CELL_SIZE, entity.y // self.CELL_SIZE)
+        self._cell_of[entity] = cell
+        self._cells.setdefault(cell, {})[entity] = None
+        #ranks grow with insertion, so results sorted by rank come in iteration order
+        self._ranks[entity] = self._next_rank
+        self._next_rank += 1
+
+    def in_region(self, x1: int, y1: int, x2: int, y2: int) -> List[Entity]:
+        '''Returns the entities in the region [x1, x2) x [y1, y2), in iteration order'''
+        if self._cells is None:
+            self._cells, self._cell_of, self._ranks, self._next_rank = {}, {}, {}, 0
+            for entity in self._entities:
+                self._insert(entity)
+
+        size = self.CELL_SIZE
+        cx1, cy1, cx2, cy2 = x1 // size, y1 // size, (x2 - 1) // size + 1, (y2 - 1) // size + 1
+        if (cx2 - cx1) * (cy2 - cy1) <= len(self._cells):
+            buckets = [self._cells.get((cx, cy)) for cx in range(cx1, cx2) for cy in range(cy1, cy2)]
+        else:  #fewer occupied cells than cells in the region
+            buckets = [bucket for (cx, cy), bucket in self._cells.items() if cx1 <= cx < cx2 and cy1 <= cy < cy2]
+
+        found = [
+            entity
+            for bucket in buckets if bucket
+            for entity in bucket
+            if x1 <= entity.x < x2 and y1 <= entity.y < y2
+        ]
+        found.sort(key=self._ranks.__getitem__)
+        return found
+
 
 class GameMap:
+    #paths are searched in the box around both their ends widened by this many tiles, None for the whole map
+    path_margin: Optional[int] = None
+
     def __init__(self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()) -> None:
 
         self.engine = engine
         self.width, self.height = width, height
 
         #creates 2D array, fill with wall
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        self.tiles = self._create_tiles()
         # #creates wall at specific location
         # self.tiles[30:33, 22] = tile_types.wall
 
         self.downstairs_location = (0, 0)
+        self.upstairs_location: Optional[Tuple[int, int]] = None  #None on the first floor
 
-        self.entities = set(entities)
+        self.entities = EntitySet(entities)
 
         #creates visible and explored, filled with False
-        self.visible = np.full((width, height), fill_value=False, order="F")  #Tiles the player sees currently
-        self.explored = np.full((width, height), fill_value=False, order="F")  #Tiles the player has seen before
+        self.visible = self._create_layer()  #Tiles the player sees currently
+        self.explored = self._create_layer()  #Tiles the player has seen before
+        self.visible_region = np.s_[:, :]  #the only part of 'visible' that can hold True, see Engine.update_fov
 
         self.entrance_location = (0, 0)
 
+        #whether the floor changed since the last save, so delta saves can leave it out, see mark_changed
+        self.changed = True
+
+    def _create_tiles(self) -> Optional[np.ndarray]:
+        return np.full((self.width, self.height), fill_value=tile_types.wall, order="F")
+
+    def _create_layer(self) -> np.ndarray:
+        #zeros rather than full, so the pages of huge maps are only committed once written to
+        return np.zeros((self.width, self.height), dtype=bool, order="F")
+
+    def __getstate__(self) -> dict:
+        '''Saves tile ids instead of whole tiles, which repeat the graphics of their type on every tile
+
+        and only the visible region of 'visible', the rest is False anyway. It changes every turn, so
+        delta saves write this crop instead of the whole array
+        '''
+        state = self.__dict__.copy()
+        if self.tiles is not None:
+            state["tiles"] = tile_types.to_tile_ids(self.tiles)
+        if type(self.visible) is np.ndarray:  #chunked maps only save the chunks they have
+            state["visible"] = self.visible[self.visible_region]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        if state["tiles"] is not None:
+            state["tiles"] = tile_types.from_tile_ids(state["tiles"])
+        if type(state["visible"]) is np.ndarray and state["visible"].shape != (state["width"], state["height"]):
+            visible = np.zeros((state["width"], state["height"]), dtype=bool, order="F")
+            visible[state["visible_region"]] = state["visible"]
+            state["visible"] = visible
+        self.__dict__.update(state)
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    def mark_changed(self) -> None:
+        '''Flags the floor for the next delta save: its field of view changed or entities came, went or changed
+
+        Only the map's own record is saved again. Its entities are saved if they are flagged as
+        well (see Entity.mark_changed), its arrays if their contents changed (see save_format.SaveHistory)
+        '''
+        self.changed = True
+
+    def timers(self) -> Iterator[Timer]:
+        '''Iterates over the timers of the floor's actors: their confusions and the cooldowns of what they wear'''
+        from components.ai import ConfusedEnemy
+
+        for actor in self.actors:
+            ai = actor.ai
+            while isinstance(ai, ConfusedEnemy):  #confused again while confused
+                yield ai.timer
+                ai = ai.previous_ai
+
+            for slot in actor.equipment.SLOTS:
+                item = getattr(actor.equipment, slot)
+                if item is not None and item.equippable is not None and item.equippable.cooldown_timer is not None:
+                    yield item.equippable.cooldown_timer
+
     @property
     def actors(self) -> Iterator[Actor]:
         '''Iterate over the map's living actors'''
@@ -52,58 +216,353 @@ class GameMap:
         yield from (entity for entity in self.entities if isinstance(entity, Union[ConsumableItem, EquippableItem]))
 
     def get_blocking_entity_at_location(self, location_x: int, location_y: int) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.x == location_x 
-                and entity.y == location_y 
-                and entity.blocks_movement
-            ):
+        for entity in self.entities.in_region(location_x, location_y, location_x + 1, location_y + 1):
+            if entity.blocks_movement:
                 return entity
             
         return None
     
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.entities.in_region(x, y, x + 1, y + 1):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
     
     def get_item_at_location(self, x: int, y: int) -> Optional[Union[ConsumableItem, EquippableItem]]:
-        for item in self.items:
-            if item.x == x and item.y == y:
-                return item
+        for entity in self.entities.in_region(x, y, x + 1, y + 1):
+            if isinstance(entity, (ConsumableItem, EquippableItem)):
+                return entity
         return None
 
+    def get_actor_positions(self) -> Tuple[List[Actor], np.ndarray]:
+        '''Returns the living actors and an (n, 2) array of their (x, y) positions, in matching order
+
+        A scan of every entity, for queries over the whole map; those of an area are better off with
+        EntitySet.in_region
+        '''
+        actors = list(self.actors)
+        positions = np.array([(actor.x, actor.y) for actor in actors], dtype=np.intp).reshape(-1, 2)
+        return actors, positions
+
+    def get_actors_in_range(
+        self,
+        x: int,
+        y: int,
+        max_range: float,
+        *,
+        k: Optional[int] = None,
+        fov: Optional[np.ndarray] = None,
+        visible_only: bool = True,
+        exclude: Optional[Actor] = None,
+    ) -> List[Actor]:
+        '''Returns living actors at most 'max_range' away from (x, y), closest first, ties in turn order
+
+        Only the entities in the buckets of the square around (x, y) are looked at, see EntitySet.
+        'k' limits the result to the k nearest actors
+        If 'visible_only', only actors on tiles of 'fov' count, which defaults to what the player sees
+        Monsters can pass their own field of view as 'fov' to query from their side
+        '''
+        if visible_only and fov is None:
+            fov = self.visible
+        reach = math.floor(max_range)
+
+        #squared distances, so no sqrt is needed to compare against the range
+        found = []
+        for entity in self.entities.in_region(x - reach, y - reach, x + reach + 1, y + reach + 1):
+            if not isinstance(entity, Actor) or not entity.is_alive or entity is exclude:
+                continue
+            distance = (entity.x - x) ** 2 + (entity.y - y) ** 2
+            if distance <= max_range ** 2 and (not visible_only or fov[entity.x, entity.y]):
+                found.append((distance, entity))
+
+        found.sort(key=lambda pair: pair[0])  #stable, so ties stay in turn order
+        if k is not None:
+            found = found[:k]
+        return [entity for _, entity in found]
+
+    def get_nearest_actor(self, x: int, y: int, max_range: float, **kwargs) -> Optional[Actor]:
+        '''Returns the closest living actor within 'max_range' of (x, y), see get_actors_in_range'''
+        nearest = self.get_actors_in_range(x, y, max_range, k=1, **kwargs)
+        return nearest[0] if nearest else None
+
     def in_bounds(self, x: int, y: int) -> bool:
         '''Sepcification: returns True if x, y are in boundaries'''
         return 0 <= x < self.width and 0 <= y < self.height
+
+    def clip(self, x1: int, y1: int, x2: int, y2: int) -> Tuple[int, int, int, int]:
+        '''Returns the region [x1, x2) x [y1, y2) cut down to the map boundaries'''
+        return max(x1, 0), max(y1, 0), min(x2, self.width), min(y2, self.height)
+
+    def get_tiles(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        '''Returns the tiles of the region [x1, x2) x [y1, y2), which must lie inside the map
+
+        FOV, pathfinding and rendering only ask for the region they need, so their cost
+        doesn't grow with the map. Don't write into the result, it is a view on dense maps
+        '''
+        return self.tiles[x1:x2, y1:y2]
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        return bool(self.tiles["walkable"][x, y])
+
+    def load_viewport(self) -> None:
+        '''Makes sure the map around the viewport is generated; dense maps are generated up front'''
+
+    def get_viewport(self) -> Tuple[int, int, int, int]:
+        '''Returns the region (x1, y1, x2, y2) of the map that is drawn on screen
+
+        Maps bigger than the screen scroll to keep the player centered, stopping at the map edges
+        '''
+        width = min(self.width, config.MAP_VIEW_WIDTH)
+        height = min(self.height, config.MAP_VIEW_HEIGHT)
+
+        player = self.engine.player
+        x1 = min(max(player.x - width // 2, 0), self.width - width)
+        y1 = min(max(player.y - height // 2, 0), self.height - height)
+
+        return x1, y1, x1 + width, y1 + height
+
+    def to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        '''Converts a map position to the console position it is drawn at'''
+        x1, y1, _, _ = self.get_viewport()
+        return x - x1, y - y1
+
+    def to_map(self, screen_x: int, screen_y: int) -> Optional[Tuple[int, int]]:
+        '''Converts a console position (e.g. of the mouse) to a map position, None if the map isn't drawn there'''
+        x1, y1, x2, y2 = self.get_viewport()
+        x, y = screen_x + x1, screen_y + y1
+
+        if x1 <= x < x2 and y1 <= y < y2:
+            return x, y
+        return None
     
     def render(self, console: Console) -> None:
-        '''Quickly renders the entire map
+        '''Quickly renders the part of the map in the viewport
         
         If a tile is in the "visible" array, draws with "light" colors
         If a it isn't, and it is in the "explored" array, then draw it with "dark" colors
         Otherwise, default is "SHROUD" colors
         '''
-        console.rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
+        x1, y1, x2, y2 = self.get_viewport()
+        tiles = self.get_tiles(x1, y1, x2, y2)
+
+        console.rgb[0 : x2 - x1, 0 : y2 - y1] = np.select(
+            condlist=[self.visible[x1:x2, y1:y2], self.explored[x1:x2, y1:y2]],
+            choicelist=[tiles["light"], tiles["dark"]],
             default=tile_types.SHROUD,
         )
 
+        #only entities in the viewport and in FOV are printed
         entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
+            (
+                entity
+                for entity in self.entities
+                if x1 <= entity.x < x2 and y1 <= entity.y < y2 and self.visible[entity.x, entity.y]
+            ),
+            key=lambda x: x.render_order.value,
         )
 
         #renders all entities on screen
         for entity in entities_sorted_for_rendering:
-            #only print entities in FOV
-            if self.visible[entity.x, entity.y]:
-                console.print(x=entity.x, y=entity.y, string=entity.char, fg=entity.color)
+            console.print(x=entity.x - x1, y=entity.y - y1, string=entity.char, fg=entity.color)
+
+
+class ChunkedLayer:
+    '''A boolean layer of a ChunkedGameMap, e.g. its visible tiles, stored in square chunks
+
+    Indexed like a (width, height) array, by a position or by a region of two slices; regions
+    read as a copy. A chunk is only allocated once True is written into it, the others read as False,
+    so the layer costs memory for the part of the map that was seen rather than the whole map
+    '''
+
+    def __init__(self, width: int, height: int, chunk_size: int) -> None:
+        self.width, self.height = width, height
+        self.chunk_size = chunk_size
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}  #by chunk position
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def __array__(self, dtype: Optional[np.dtype] = None, copy: Optional[bool] = None) -> np.ndarray:
+        '''The whole layer as a dense array, for code that needs one (e.g. observations of a whole map)'''
+        return self[:, :] if dtype is None else self[:, :].astype(dtype)
+
+    def __getitem__(self, key: Tuple[Union[int, slice], Union[int, slice]]) -> Union[bool, np.ndarray]:
+        x, y = key
+        size = self.chunk_size
+        if not isinstance(x, slice):
+            chunk = self.chunks.get((x // size, y // size))
+            return chunk is not None and bool(chunk[x % size, y % size])
+
+        x1, y1, x2, y2 = self._region(x, y)
+        result = np.zeros((x2 - x1, y2 - y1), dtype=bool, order="F")
+        for position, region, part in self._overlaps(x1, y1, x2, y2, self.chunks):
+            result[region] = self.chunks[position][part]
+        return result
+
+    def __setitem__(self, key: Tuple[Union[int, slice], Union[int, slice]], value: Union[bool, np.ndarray]) -> None:
+        x, y = key
+        size = self.chunk_size
+        if not isinstance(x, slice):
+            if value or (x // size, y // size) in self.chunks:
+                self._writable_chunk((x // size, y // size))[x % size, y % size] = value
+            return
+
+        x1, y1, x2, y2 = self._region(x, y)
+        value = np.broadcast_to(np.asarray(value, dtype=bool), (x2 - x1, y2 - y1))
+        #False needs no chunk, so only the chunks there are take it
+        positions = self._chunk_positions(x1, y1, x2, y2) if value.any() else self.chunks
+        for position, region, part in self._overlaps(x1, y1, x2, y2, positions):
+            if position in self.chunks or value[region].any():
+                self._writable_chunk(position)[part] = value[region]
+
+    def _region(self, x: slice, y: slice) -> Tuple[int, int, int, int]:
+        x1, x2, x_step = x.indices(self.width)
+        y1, y2, y_step = y.indices(self.height)
+        if x_step != 1 or y_step != 1:
+            raise IndexError("Regions of a chunked layer can't have steps")
+        return x1, y1, max(x1, x2), max(y1, y2)
+
+    def _chunk_positions(self, x1: int, y1: int, x2: int, y2: int) -> Iterator[Tuple[int, int]]:
+        '''Iterates over the positions of the chunks overlapping the region [x1, x2) x [y1, y2)'''
+        size = self.chunk_size
+        for chunk_x in range(x1 // size, (x2 - 1) // size + 1):
+            for chunk_y in range(y1 // size, (y2 - 1) // size + 1):
+                yield chunk_x, chunk_y
+
+    def _overlaps(
+        self, x1: int, y1: int, x2: int, y2: int, positions: Iterable[Tuple[int, int]],
+    ) -> Iterator[Tuple[Tuple[int, int], Tuple[slice, slice], Tuple[slice, slice]]]:
+        '''Iterates over those of 'positions' whose chunks overlap the region [x1, x2) x [y1, y2),
+
+        with the overlap as slices of the region and of the chunk
+        '''
+        size = self.chunk_size
+        for chunk_x, chunk_y in positions:
+            origin_x, origin_y = chunk_x * size, chunk_y * size
+            ox1, oy1 = max(x1, origin_x), max(y1, origin_y)
+            ox2, oy2 = min(x2, origin_x + size), min(y2, origin_y + size)
+            if ox1 < ox2 and oy1 < oy2:
+                yield (
+                    (chunk_x, chunk_y),
+                    np.s_[ox1 - x1 : ox2 - x1, oy1 - y1 : oy2 - y1],
+                    np.s_[ox1 - origin_x : ox2 - origin_x, oy1 - origin_y : oy2 - origin_y],
+                )
+
+    def _writable_chunk(self, position: Tuple[int, int]) -> np.ndarray:
+        chunk = self.chunks.get(position)
+        if chunk is None:
+            chunk = self.chunks[position] = np.zeros((self.chunk_size, self.chunk_size), dtype=bool, order="F")
+        elif not chunk.flags.writeable:  #a view on a loaded save or a restored snapshot
+            chunk = self.chunks[position] = chunk.copy(order="F")
+        return chunk
+
+
+class ChunkedGameMap(GameMap):
+    '''A map far bigger than the screen, stored and generated in square chunks
+
+    A chunk is generated by 'chunk_generator' the first time it comes near the viewport,
+    so only the part of the map that was reached costs memory and generation time.
+    Chunks hold tile ids; tiles of chunks that were never generated read as walls.
+    'visible' and 'explored' are ChunkedLayers, and paths are only searched near both their ends
+    '''
+
+    path_margin = 16
+
+    def __init__(
+        self, engine: Engine, width: int, height: int, chunk_generator: ChunkGenerator, entities: Iterable[Entity] = (),
+    ) -> None:
+        self.chunk_generator = chunk_generator
+        self.chunk_size = chunk_generator.chunk_size
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}  #tile ids of every generated chunk, by chunk position
+
+        super().__init__(engine, width, height, entities)
+
+    def _create_tiles(self) -> None:
+        #no dense tile array, tiles are read through get_tiles and is_walkable
+        return None
+
+    def _create_layer(self) -> ChunkedLayer:
+        return ChunkedLayer(self.width, self.height, self.chunk_size)
+
+    def chunk_range(self, x1: int, y1: int, x2: int, y2: int) -> Iterator[Tuple[int, int]]:
+        '''Iterates over the positions of the chunks overlapping the region [x1, x2) x [y1, y2)'''
+        size = self.chunk_size
+        for chunk_x in range(x1 // size, (x2 - 1) // size + 1):
+            for chunk_y in range(y1 // size, (y2 - 1) // size + 1):
+                yield chunk_x, chunk_y
+
+    def get_tile_ids(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        '''Returns the tile ids of the region [x1, x2) x [y1, y2), copied out of the chunks it overlaps'''
+        tile_ids = np.full((x2 - x1, y2 - y1), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+        size = self.chunk_size
+
+        for chunk_x, chunk_y in self.chunk_range(x1, y1, x2, y2):
+            chunk = self.chunks.get((chunk_x, chunk_y))
+            if chunk is None:
+                continue
+
+            #overlap of the region and the chunk, in map coordinates
+            origin_x, origin_y = chunk_x * size, chunk_y * size
+            ox1, oy1 = max(x1, origin_x), max(y1, origin_y)
+            ox2, oy2 = min(x2, origin_x + chunk.shape[0]), min(y2, origin_y + chunk.shape[1])
+
+            tile_ids[ox1 - x1 : ox2 - x1, oy1 - y1 : oy2 - y1] = chunk[
+                ox1 - origin_x : ox2 - origin_x, oy1 - origin_y : oy2 - origin_y
+            ]
+
+        return tile_ids
+
+    def get_tiles(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        return tile_types.from_tile_ids(self.get_tile_ids(x1, y1, x2, y2))
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        if chunk is None:
+            return False
+        return bool(tile_types.TILES["walkable"][chunk[x % self.chunk_size, y % self.chunk_size]])
+
+    def load_viewport(self) -> None:
+        '''Generates the chunks overlapping the viewport, or within half a chunk of it'''
+        margin = self.chunk_size // 2
+        x1, y1, x2, y2 = self.get_viewport()
+
+        for chunk_x, chunk_y in self.chunk_range(*self.clip(x1 - margin, y1 - margin, x2 + margin, y2 + margin)):
+            if (chunk_x, chunk_y) not in self.chunks:
+                self.load_chunk(chunk_x, chunk_y)
+
+    def load_chunk(self, chunk_x: int, chunk_y: int) -> DungeonLayout:
+        '''Generates a chunk and spawns its entities; returns its layout, in chunk coordinates'''
+        from procgen import spawnable_entities
+
+        layout = self.chunk_generator.generate(chunk_x, chunk_y)
+        self.chunks[chunk_x, chunk_y] = layout.tiles
+
+        origin_x, origin_y = chunk_x * self.chunk_size, chunk_y * self.chunk_size
+
+        if layout.upstairs_location is not None:
+            self.upstairs_location = (layout.upstairs_location[0] + origin_x, layout.upstairs_location[1] + origin_y)
+
+        for entity_id, x, y in layout.spawns.tolist():
+            spawnable_entities[entity_id].spawn(self, x + origin_x, y + origin_y)
+
+        return layout
+
 
 class GameWorld:
     '''
     Holds the settings for the game map and generates new maps when moving down the stairs
+
+    Every floor is generated from a seed derived from the world's seed, so the next floor can be
+    generated in a worker process while the current one is played, and descending only has
+    to build the already finished layout. Other subsystems (AI, respawns) draw from their
+    own streams, also derived from the world's seed, so a whole run is reproducible and
+    parallel games never share random state
+
+    Each floor is laid out by the procgen generator its entry in 'generators_by_floor' names
+    (procgen.generators_by_floor by default).
+    With a 'chunk_size', floors are ChunkedGameMaps, generated a chunk at a time as they are
+    explored, for maps far bigger than the screen; 'max_rooms' then counts per chunk
     '''
 
     def __init__(
@@ -115,7 +574,13 @@ class GameWorld:
             max_rooms: int,
             room_min_size: int,
             room_max_size: int,
-            current_floor: int = 0
+            current_floor: int = 0,
+            seed: Optional[int] = None,
+            pregenerate: bool = True,
+            live_floor_capacity: int = 3,
+            snapshot_dir: Optional[str] = save_config.SNAPSHOT_DIR,
+            chunk_size: Optional[int] = None,
+            generators_by_floor: Optional[Tuple[Tuple[int, str], ...]] = None,
     ) -> None:
         self.engine = engine
 
@@ -127,21 +592,153 @@ class GameWorld:
         self.room_min_size = room_min_size
         self.room_max_size = room_max_size
 
+        self.chunk_size = chunk_size
+        self.generators_by_floor = generators_by_floor
+
+        from floor_cache import FloorCache
+
         self.current_floor = current_floor
 
-    def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+        #visited floors, the most recent stay live and older ones are kept as compressed snapshots
+        self.floors = FloorCache(live_capacity=live_floor_capacity, snapshot_dir=snapshot_dir)
+
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self._rngs: Dict[Tuple[str, Optional[int]], random.Random] = {}  #saved, so streams continue after loading
+
+        #background generation of the next floor, not saved with the engine
+        self.pregenerate = pregenerate
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Optional[Tuple[int, Future]] = None  #(floor, future of its layout)
+
+    def __getstate__(self) -> dict:
+        '''Worker processes and futures can't be saved, so saves leave them out'''
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_pending"] = None
+        return state
+
+    def close(self) -> None:
+        '''Shuts down the worker process of pregeneration, once the game is replaced or the app exits
+
+        Floors are still generated afterwards if the world is played on, on demand
+        '''
+        if self._pending is not None:
+            self._pending[1].cancel()
+            self._pending = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.pregenerate = False
+
+    def derive_seed(self, subsystem: str, floor: Optional[int] = None) -> int:
+        '''Returns the seed of a subsystem's stream, optionally specific to one floor'''
+        keys = [self.seed, zlib.crc32(subsystem.encode())]
+        if floor is not None:
+            keys.append(floor)
+        return int(np.random.SeedSequence(keys).generate_state(1)[0])
+
+    def floor_seed(self, floor: int) -> int:
+        '''Returns the seed the given floor is generated from, so it can be regenerated at any time'''
+        return self.derive_seed("procgen", floor)
 
-        #TODO: make able to go back to previous maps (map array in gameworld + add upstairs to map)
+    def rng(self, subsystem: str, floor: Optional[int] = None) -> random.Random:
+        '''Returns the random stream of a subsystem (e.g. "ai", "respawn"), created on first use'''
+        key = (subsystem, floor)
+        if key not in self._rngs:
+            self._rngs[key] = random.Random(self.derive_seed(subsystem, floor))
+        return self._rngs[key]
 
-        self.current_floor += 1
+    def layout_generator(self, floor: int) -> Callable[..., DungeonLayout]:
+        '''Returns the procgen layout generator of the given floor'''
+        from procgen import generators_by_floor, get_max_value_for_floor, layout_generators
 
-        self.engine.game_map = generate_dungeon(
+        return layout_generators[get_max_value_for_floor(self.generators_by_floor or generators_by_floor, floor)]
+
+    def layout_parameters(self, floor: int) -> dict:
+        '''Returns the keyword arguments of the layout generator of the given floor'''
+        return dict(
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
             map_width=self.map_width,
             map_height=self.map_height,
-            engine=self.engine,
+            floor_number=floor,
+            seed=self.floor_seed(floor),
         )
-        
\ No newline at end of file
+
+    def chunk_generator(self, floor: int) -> ChunkGenerator:
+        '''Returns the generator of the chunks of the given floor, for chunked worlds'''
+        from procgen import ChunkGenerator
+
+        return ChunkGenerator(chunk_size=self.chunk_size, **self.layout_parameters(floor))
+
+    def generate_floor(self) -> None:
+        '''Moves the player down to the next floor, generating it on the first visit'''
+        self.move_to_floor(self.current_floor + 1)
+
+    def move_to_floor(self, floor: int) -> None:
+        '''Moves the player to a floor, arriving on its up stairs when going down and its down stairs when going up'''
+        from procgen import build_chunked_dungeon, build_dungeon
+
+        descending = floor > self.current_floor
+
+        game_map = self.floors.get(floor, self.engine)
+        if game_map is None and self.chunk_size is not None:
+            #first visit, only the chunks around the entrance are generated for now
+            game_map = build_chunked_dungeon(self.chunk_generator(floor), self.engine)
+        elif game_map is None:
+            #first visit
+            layout = self._take_pregenerated(floor)
+            if layout is None:
+                layout = self.layout_generator(floor)(**self.layout_parameters(floor))
+
+            game_map = build_dungeon(layout, self.engine)
+        else:
+            arrival = game_map.entrance_location if descending else game_map.downstairs_location
+            self.engine.player.place(*arrival, game_map)
+
+        self.current_floor = floor
+        self.engine.game_map = game_map
+        self.floors.put(floor, game_map)
+
+        if floor + 1 not in self.floors:
+            self._pregenerate(floor + 1)
+
+    def _pregenerate(self, floor: int) -> None:
+        '''Starts generating the layout of 'floor' in a worker process'''
+        if not self.pregenerate or self.chunk_size is not None:
+            return  #chunked floors are generated as they are explored instead
+
+        try:
+            if self._executor is None:
+                #spawn instead of fork, so the worker doesn't inherit the window and its threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                )
+            self._pending = (floor, self._executor.submit(
+                self.layout_generator(floor), **self.layout_parameters(floor),
+            ))
+        except (OSError, RuntimeError):
+            #no worker processes available here, generate floors on demand instead
+            self.pregenerate = False
+            self._executor = None
+            self._pending = None
+
+    def _take_pregenerated(self, floor: int) -> Optional[DungeonLayout]:
+        '''Returns the pregenerated layout of 'floor', or None if there is none'''
+        if self._pending is None:
+            return None
+
+        pending_floor, future = self._pending
+        self._pending = None
+
+        if pending_floor != floor:
+            future.cancel()
+            return None
+
+        try:
+            return future.result()  #only waits if the worker is still busy
+        except (BrokenProcessPool, OSError):
+            #the worker died, the floor is regenerated from the same seed on the main process
+            self._executor = None
+            return None
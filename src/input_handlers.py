@@ -1,15 +1,14 @@
 from __future__ import annotations
 
-import os
 import copy
 import math
-import random
 
 from typing import Union, Optional, TYPE_CHECKING, Callable, Tuple
 from tcod.console import Console
 import tcod.event
 import tcod.constants
 import configs.interface_config as config
+import configs.save_config as save_config
 from tcod.event import KeyDown, MouseButtonDown, MouseMotion, Quit
 
 import actions
@@ -19,6 +18,8 @@ from engine import Engine
 import exceptions
 from entity import EquippableItem, ConsumableItem
 import entity_factories
+from persistence.action_journal import LEVEL_UPS, action_journal
+from persistence.save_slots import save_slots
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -86,16 +87,21 @@ class EventHandler(BaseEventHandler):
         action_or_state = self.dispatch(event)
         if isinstance(action_or_state, BaseEventHandler):
             return action_or_state
-        
-        if self.handle_action(action_or_state):
+        return self.play_turn(action_or_state)
+
+    def play_turn(self, action: Optional[Action]) -> BaseEventHandler:
+        '''Performs the player's action and everything that follows it, returning the next handler
+
+        Also how the action journal replays actions, see persistence.action_journal
+        '''
+        if self.handle_action(action):
             #Valid action is performed
 
-            #reduce equipped for all entities cooldowns
-            for actor in self.engine.game_map.actors:
-                if actor.equipment.weapon is not None:
-                    actor.equipment.weapon.equippable.current_cooldown -= 1
-                if actor.equipment.armor is not None:
-                    actor.equipment.armor.equippable.current_cooldown -= 1
+            #next turn, fires only the cooldowns and status effects expiring now
+            self.engine.timers.advance()
+            interval = save_config.AUTOSAVE_INTERVAL
+            if interval and self.engine.timers.turn % interval == 0 and self.engine.player.is_alive:
+                save_slots.autosave(self.engine)  #only the game being played, not replays
 
             #check for automatic switching to different game input states
             if not self.engine.player.is_alive:
@@ -104,14 +110,15 @@ class EventHandler(BaseEventHandler):
                     return GameOverEventHandler(self.engine)
                 
                 #procedurally randomizes next character creation   TODO: maybe make this more organized, helper function
+                rng = self.engine.game_world.rng("respawn")
                 new_skill_points = self.engine.player.fighter.max_hp//10+10
                 random_points = min(max(6-self.engine.player.fighter.base_power, 0), new_skill_points)  #between 0 and new skill points
                 new_skill_points = max(new_skill_points-random_points, 0)
 
-                new_hp = math.floor(random.random() * random_points)
+                new_hp = math.floor(rng.random() * random_points)
                 random_points = max(random_points-new_hp, 0)
 
-                new_power = math.floor(random.random() * random_points)
+                new_power = math.floor(rng.random() * random_points)
                 random_points = max(random_points-new_power, 0) #rest goes to defense_base_pts
 
                 new_weapons = None
@@ -146,22 +153,26 @@ class EventHandler(BaseEventHandler):
         '''
         if action is None:  #player has not taken turn yet
             return False
-        
+
+        journal_entry = action_journal.encode_action(self.engine, action)
         try:
             action.perform()
 
         except exceptions.Impossible as exc:
+            action_journal.record(self.engine, journal_entry)  #some actions change things before finding out
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  #skips enemy turns on exceptions
-        
+
+        action_journal.record(self.engine, journal_entry)  #not if it quit the game
         self.engine.handle_enemy_turns()  #handles enemies after each *player turn*, not tick/other time method
 
         self.engine.update_fov()  #updates the FOV before player's next action
         return True
 
     def ev_mousemotion(self, event: MouseMotion) -> Action | None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
+        location = self.engine.game_map.to_map(event.tile.x, event.tile.y)
+        if location is not None:
+            self.engine.mouse_location = location
     
     def on_render(self, console: tcod.console.Console) -> None:
         self.engine.render(console)
@@ -185,6 +196,9 @@ class MainGameEventHandler(EventHandler):
         ):
             return TakeStairsAction(player)  #returns this action because this is an if not elif
 
+        if key == tcod.event.KeySym.COMMA and modifier & (tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT):
+            return TakeStairsAction(player)  #"<", the action takes whichever stairs the player is on
+
         if key in config.MOVE_KEYS:
             dx, dy = config.MOVE_KEYS[key]
             action = BumpAction(player, dx, dy)
@@ -262,8 +276,9 @@ class GameOverEventHandler(EventHandler):
         #TODO: possibly add a spectator mode after death, can be easy -- just change visible
         #TODO: add manual save
         '''Handles exiting the game when the player is dead, mainly deleting the save file to prevent bug'''
-        if os.path.exists("savegame.sav"): #TODO: change savegame.sav to save/savegame.sav + multiple save files
-            os.remove("savegame.sav")
+        action_journal.discard()
+        if save_slots.game_slot is not None:
+            save_slots.remove_game(save_slots.game_slot)  #waits for a save still being written, which would bring it back
         raise exceptions.QuitWithoutSaving() #Avoid saving a finished game, exits
     
     def ev_quit(self, event: Quit) -> ActionOrHandler | None:
@@ -471,41 +486,16 @@ class AttributeSelection(EventHandler):
             if self.current_skill_points != 0:
                 return PopupMessage(self, "Spend all your points!")
 
-            if not self.engine.player.is_alive:
-                player = entity_factories.player.spawn(self.engine.game_map, *(self.engine.game_map.entrance_location))
-                self.engine.player = player
-                self.engine.update_fov()
-
-            # self.engine.player = copy.deepcopy(entity_factories.player)
-            # player = self.engine.player
-            # player.parent = self.engine.game_map
-            # self.engine.game_map.entities.add(player)
-            # player.place(*self.engine.game_map.entrance_location, self.engine.game_map)
-            
-            player.fighter.max_hp = 5 + 5 * self.hp_points #need to set maxhp first before setting hp
-            player.fighter.hp = player.fighter.max_hp
-            player.fighter.base_defense = self.defense_points
-            player.fighter.base_power = self.power_points
-
-            if self.buy_weapon is not None:
-                #initial equipment
-                weapon = copy.deepcopy(list(self.type_of_weapon.keys())[0])
-                #put these in the inventory
-                weapon.parent = player.inventory
-                #put weapon in the inventory and equip it
-                player.inventory.items.append(weapon)
-                player.equipment.toggle_equip(weapon, add_message=False)
-
-            if self.buy_armor is not None:
-                #initial equipment
-                armor = copy.deepcopy(list(self.type_of_armor.keys())[0])
-
-                #put these in the inventory
-                armor.parent = player.inventory
-
-                #put weapon in the inventory and equip it
-                player.inventory.items.append(armor)
-                player.equipment.toggle_equip(armor, add_message=False)
+            #the items by their name in entity_factories, so the action journal can replay the choice
+            choice = {
+                "hp_points": self.hp_points,
+                "power_points": self.power_points,
+                "defense_points": self.defense_points,
+                "weapon": None if self.buy_weapon is None else factory_name(list(self.type_of_weapon.keys())[0]),
+                "armor": None if self.buy_armor is None else factory_name(list(self.type_of_armor.keys())[0]),
+            }
+            action_journal.record(self.engine, {"character": choice})
+            create_character(self.engine, **choice)
 
             return MainGameEventHandler(self.engine)
         
@@ -611,13 +601,59 @@ class AttributeSelection(EventHandler):
         '''Don't allow any action when mouse down (when originally, it would have exited)'''
         return None
 
+def factory_name(item: EquippableItem) -> str:
+    '''Returns the name of an item prototype in entity_factories'''
+    return next(name for name, value in vars(entity_factories).items() if value is item)
+
+
+def create_character(
+    engine: Engine,
+    hp_points: int,
+    power_points: int,
+    defense_points: int,
+    weapon: Optional[str],
+    armor: Optional[str],
+) -> None:
+    '''Sets up the player as chosen in AttributeSelection, respawning them if they died
+
+    'weapon' and 'armor' are names of item prototypes in entity_factories, or None
+    '''
+    player = engine.player
+    if not player.is_alive:
+        player = entity_factories.player.spawn(engine.game_map, *(engine.game_map.entrance_location))
+        engine.player = player
+        engine.update_fov()
+
+    # self.engine.player = copy.deepcopy(entity_factories.player)
+    # player = self.engine.player
+    # player.parent = self.engine.game_map
+    # self.engine.game_map.entities.add(player)
+    # player.place(*self.engine.game_map.entrance_location, self.engine.game_map)
+
+    player.fighter.max_hp = 5 + 5 * hp_points #need to set maxhp first before setting hp
+    player.fighter.hp = player.fighter.max_hp
+    player.fighter.base_defense = defense_points
+    player.fighter.base_power = power_points
+
+    for name in (weapon, armor):
+        if name is not None:
+            #initial equipment
+            item = copy.deepcopy(getattr(entity_factories, name))
+            #put it in the inventory and equip it
+            item.parent = player.inventory
+            player.inventory.items.append(item)
+            item.mark_changed()
+            player.equipment.toggle_equip(item, add_message=False)
+
+
 class CharacterScreenEventHandler(AskUserEventHandler):
     TITLE = "Character Information"
 
     def on_render(self, console: tcod.console.Console) -> None:
         super().on_render(console)
 
-        if self.engine.player.x <= 30:
+        #opposite side of the screen to the player
+        if self.engine.game_map.to_screen(self.engine.player.x, self.engine.player.y)[0] <= 30:
             x = 40
         else:
             x = 0
@@ -662,7 +698,8 @@ class LevelUpHandler(AskUserEventHandler):
     def on_render(self, console: tcod.console.Console) -> None:
         super().on_render(console)
 
-        if self.engine.player.x <= 30:
+        #opposite side of the screen to the player
+        if self.engine.game_map.to_screen(self.engine.player.x, self.engine.player.y)[0] <= 30:
             x = 40
         else:
             x = 0
@@ -705,12 +742,9 @@ class LevelUpHandler(AskUserEventHandler):
         index = key - tcod.event.KeySym.a
 
         if 0 <= index <= 2:
-            if index == 0:
-                player.level.increase_max_hp()
-            elif index == 1:
-                player.level.increase_power()
-            elif index == 2:
-                player.level.increase_defense()
+            level_up = LEVEL_UPS[index]
+            action_journal.record(self.engine, {"level_up": level_up})
+            getattr(player.level, level_up)()
         else:
             self.engine.message_log.add_message("Invalid Entry.", color.invalid)
             return None
@@ -746,7 +780,8 @@ class InventoryEventHandler(AskUserEventHandler):
         if height <= 3:
             height = 3
 
-        if self.engine.player.x <= 30:
+        #opposite side of the screen to the player
+        if self.engine.game_map.to_screen(self.engine.player.x, self.engine.player.y)[0] <= 30:
             x = 40
         else: 
             x = 0
@@ -837,7 +872,7 @@ class SelectIndexHandler(AskUserEventHandler):
     def on_render(self, console: Console) -> None:
         '''Highlight the tile under the cursor'''
         super().on_render(console)
-        x, y = self.engine.mouse_location
+        x, y = self.engine.game_map.to_screen(*self.engine.mouse_location)
         console.rgb["bg"][x, y] = color.white
         console.rgb["fg"][x, y] = color.black
 
@@ -857,9 +892,10 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = config.MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            #clamp x, y on both sides of the map
-            x = max(0, min(x, self.engine.game_map.width-1))
-            y = max(0, min(y, self.engine.game_map.height-1))
+            #clamp x, y on both sides of the part of the map on screen
+            x1, y1, x2, y2 = self.engine.game_map.get_viewport()
+            x = max(x1, min(x, x2-1))
+            y = max(y1, min(y, y2-1))
             self.engine.mouse_location = x, y
             return None
 
@@ -871,7 +907,7 @@ class SelectIndexHandler(AskUserEventHandler):
     def ev_mousebuttondown(self, event: MouseButtonDown) -> ActionOrHandler | None:
         '''Left click confirms a selection'''
 
-        if self.engine.game_map.in_bounds(*event.tile):
+        if self.engine.game_map.to_map(*event.tile) is not None:
             if event.button == 1:
                 return self.on_index_selected(*self.engine.mouse_location)
         return super().ev_mousebuttondown(event)
@@ -914,7 +950,7 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         '''Highlights radius'''
         super().on_render(console)
 
-        x, y = self.engine.mouse_location
+        x, y = self.engine.game_map.to_screen(*self.engine.mouse_location)
 
         #draws a red rectangle around blast radius
         console.draw_frame(
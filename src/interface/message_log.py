@@ -1,4 +1,4 @@
-from typing import Iterable, List, Reversible, Tuple
+from typing import Any, Iterable, List, Optional, Reversible, Tuple
 import textwrap
 
 import tcod
@@ -7,10 +7,28 @@ import configs.color as color
 
 
 class Message:
-    def __init__(self, text: str, fg: Tuple[int, int, int]) -> None:
-        self.plain_text = text
+    def __init__(self, text: str, fg: Tuple[int, int, int], args: Tuple[Any, ...] = ()) -> None:
+        '''If 'args' are given, 'text' is a str.format template only filled in once the text is needed'''
+        self.template = text
+        self.args = args
         self.fg = fg
         self.count = 1
+        self.changed = True  #since the last save, see MessageLog.add_message
+
+        self._plain_text: Optional[str] = None if args else text
+
+    @property
+    def plain_text(self) -> str:
+        '''The formatted text of this message, without the count'''
+        if self._plain_text is None:
+            self._plain_text = self.template.format(*self.args)
+        return self._plain_text
+
+    def matches(self, text: str, args: Tuple[Any, ...] = ()) -> bool:
+        '''Returns True if this message reads the same as 'text' formatted with 'args' '''
+        if text == self.template and args == self.args:
+            return True  #same template and arguments, no need to format either
+        return self.plain_text == (text.format(*args) if args else text)
 
     @property
     def full_text(self) -> str:
@@ -20,20 +38,32 @@ class Message:
         return self.plain_text
     
 class MessageLog:
-    def __init__(self) -> None:
+    def __init__(self, silent: bool = False) -> None:
+        '''A 'silent' log drops every message, for headless runs where nobody reads them'''
         self.messages: List[Message] = []
+        self.silent = silent
 
     def add_message(
-            self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True,
+            self,
+            text: str,
+            fg: Tuple[int, int, int] = color.white,
+            *,
+            args: Tuple[Any, ...] = (),
+            stack: bool = True,
     ) -> None:
         '''Add message to the log
         'text' is message text, 'fg' is text color
+        If 'args' are given, 'text' is a str.format template, formatted only when the message is read
         If 'stack' is True, then the message can stack with the previous message of the same text
         '''
-        if stack and len(self.messages) > 0 and text == self.messages[-1].plain_text:
+        if self.silent:
+            return
+
+        if stack and len(self.messages) > 0 and self.messages[-1].matches(text, args):
             self.messages[-1].count += 1
+            self.messages[-1].changed = True  #the only change to a message once logged
         else: 
-            self.messages.append(Message(text, fg))
+            self.messages.append(Message(text, fg, args))
 
     def render(
         self, console: tcod.console.Console, x: int, y: int, width: int, height: int,
@@ -6,15 +6,26 @@ import tcod
 import configs.color as color
 import exceptions
 import input_handlers
+from persistence.action_journal import action_journal
+from persistence.save_service import save_service
+from persistence.save_slots import save_slots
 import setup_game
 
 #shebang for ./src/main.py and imports
 
-def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
-    '''If the current handler has an engine that is initialized and viable, then save'''
+def save_game(handler: input_handlers.BaseEventHandler) -> None:
+    '''If the current handler has an engine that is initialized and viable, then save it to its slot'''
     if isinstance(handler, input_handlers.EventHandler):
-        handler.engine.save_as(filename)
-        print('Game Saved') # on command line
+        future = save_slots.save(handler.engine)
+        if future is not None:
+            future.add_done_callback(report_save)
+
+def report_save(future) -> None:
+    '''Prints the outcome of a background save on the command line'''
+    if future.exception() is None:
+        print('Game Saved')
+    else:
+        print(f'Failed to save: {future.exception()}')
 
 def main():
 
@@ -29,6 +40,19 @@ def main():
 
     handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
 
+    try:
+        run(handler, screen_width, screen_height, tileset)
+    finally:
+        #the window is closed by now, this only waits if a save is still being written
+        save_service.wait()
+        action_journal.close()
+        save_slots.close()
+
+def run(
+    handler: input_handlers.BaseEventHandler, screen_width: int, screen_height: int, tileset: tcod.tileset.Tileset,
+) -> None:
+    '''Runs the game loop until the window is closed, saving the game on the way out'''
+
     #creates screen, can change configurations for title, vsync, windowflags, renderer
     with tcod.context.new_terminal(
         screen_width, screen_height, 
@@ -67,14 +91,13 @@ def main():
         except exceptions.QuitWithoutSaving:
             raise #just exits the game
         
-        #TODO: multiple save files
         #TODO: add a save game button (maybe limits on the saves on certain difficulties?)
 
         except SystemExit: #Save and Quit
-            save_game(handler, "savegame.sav")
+            save_game(handler)
             raise
         except BaseException: #save on any unexpected error
-            save_game(handler, "savegame.sav")
+            save_game(handler)
             raise
 
 
@@ -0,0 +1,125 @@
+'''Observations of the game as stacked NumPy layers, for learning agents and analysis tools
+
+Every layer is a map-sized (or crop-sized) plane of one property, indexed [x, y] like the map:
+    walkable, transparent  the tiles
+    visible, explored      what the player sees and has seen, see Engine.update_fov
+    actors, items          1 where a living actor or an item is, on the whole map
+    hp                     each living actor's hp as a fraction of its max hp
+The layers live in one preallocated array that every update rewrites in place, so observing
+copies no layers per turn and views of the layers stay valid across updates
+'''
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from entity import Actor, ConsumableItem, EquippableItem
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from game_map import GameMap
+
+LAYERS = ("walkable", "transparent", "visible", "explored", "actors", "items", "hp")
+WALKABLE, TRANSPARENT, VISIBLE, EXPLORED, ACTORS, ITEMS, HP = range(len(LAYERS))
+
+
+class ObservationBuilder:
+    '''Keeps the layers of one engine's current floor up to date
+
+    Without 'crop' the layers cover the whole map, 'width' by 'height'. With it they are the
+    (2 * crop + 1) square centered on the player, what lies outside of the map reading as 0;
+    only that window is written each update, so the cost doesn't grow with the map
+    '''
+
+    def __init__(self, width: int, height: int, crop: Optional[int] = None, dtype: np.dtype = np.float32) -> None:
+        self.crop = crop
+        self.map_shape = (width, height)
+        shape = (2 * crop + 1, 2 * crop + 1) if crop is not None else self.map_shape
+
+        self.layers = np.zeros((len(LAYERS), *shape), dtype=dtype)
+        self.views: Dict[str, np.ndarray] = dict(zip(LAYERS, self.layers))
+
+        #what the whole-map tile layers were written from, they are only rewritten when it changes
+        self._tiles_of: Optional[Tuple[GameMap, int]] = None
+        #where the entity layers were written last, cleared before writing the new positions
+        self._entity_cells: List[Tuple[int, int]] = []
+
+    @classmethod
+    def for_engine(cls, engine: Engine, crop: Optional[int] = None, dtype: np.dtype = np.float32) -> ObservationBuilder:
+        '''A builder for the maps of 'engine', which share the size of its current floor'''
+        return cls(engine.game_map.width, engine.game_map.height, crop, dtype)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.views[name]
+
+    def update(self, engine: Engine) -> np.ndarray:
+        '''Rewrites the layers from the engine's current floor and returns them, (layers, x, y)'''
+        game_map = engine.game_map
+        if self.crop is not None:
+            self._update_crop(engine, game_map)
+            return self.layers
+
+        if (game_map.width, game_map.height) != self.map_shape:
+            raise ValueError(
+                f"The map is {game_map.width}x{game_map.height}, the layers {self.map_shape[0]}x{self.map_shape[1]};"
+                " crop the observation to observe maps of any size"
+            )
+
+        #chunked maps grow as they are explored, dense ones never change once generated
+        tiles_of = (game_map, len(getattr(game_map, "chunks", ())))
+        if tiles_of != self._tiles_of:
+            tiles = game_map.get_tiles(0, 0, game_map.width, game_map.height)
+            np.copyto(self.layers[WALKABLE], tiles["walkable"])
+            np.copyto(self.layers[TRANSPARENT], tiles["transparent"])
+            self._tiles_of = tiles_of
+
+        np.copyto(self.layers[VISIBLE], game_map.visible)
+        np.copyto(self.layers[EXPLORED], game_map.explored)
+
+        if self._entity_cells:
+            xs, ys = zip(*self._entity_cells)
+            self.layers[ACTORS:, xs, ys] = 0
+        self._entity_cells = self._write_entities(game_map, 0, 0, *self.map_shape)
+        return self.layers
+
+    def _update_crop(self, engine: Engine, game_map: GameMap) -> None:
+        crop = self.crop
+        x, y = engine.player.x, engine.player.y
+        x1, y1, x2, y2 = game_map.clip(x - crop, y - crop, x + crop + 1, y + crop + 1)
+        #the same region in the window
+        wx1, wy1 = x1 - (x - crop), y1 - (y - crop)
+        window = np.s_[wx1 : wx1 + x2 - x1, wy1 : wy1 + y2 - y1]
+
+        self.layers[...] = 0
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        tiles = game_map.get_tiles(x1, y1, x2, y2)
+        self.layers[WALKABLE][window] = tiles["walkable"]
+        self.layers[TRANSPARENT][window] = tiles["transparent"]
+        self.layers[VISIBLE][window] = game_map.visible[x1:x2, y1:y2]
+        self.layers[EXPLORED][window] = game_map.explored[x1:x2, y1:y2]
+        self._write_entities(game_map, x - crop, y - crop, 2 * crop + 1, 2 * crop + 1)
+
+    def _write_entities(self, game_map: GameMap, origin_x: int, origin_y: int, width: int, height: int) -> List[Tuple[int, int]]:
+        '''Writes the entity layers of the entities in [origin, origin + size), returns the cells written
+
+        A floor has a few dozen entities, which one pass over the entity set writes faster than
+        gathering their positions into arrays would
+        '''
+        actors, items, hp = self.layers[ACTORS], self.layers[ITEMS], self.layers[HP]
+        cells = []
+        for entity in game_map.entities:
+            x, y = entity.x - origin_x, entity.y - origin_y
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            if isinstance(entity, Actor):
+                if entity.is_alive:
+                    actors[x, y] = 1
+                    hp[x, y] = entity.fighter.hp / max(entity.fighter.max_hp, 1)
+                    cells.append((x, y))
+            elif isinstance(entity, (ConsumableItem, EquippableItem)):
+                items[x, y] = 1
+                cells.append((x, y))
+        return cells
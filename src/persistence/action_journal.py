@@ -0,0 +1,285 @@
+'''Journal of the player's actions since the last save, so a killed game can be recovered
+
+Every action the player takes (see EventHandler.handle_action), and every choice made outside of
+actions (level ups, character creation), is appended to "<save file>.journal" as a line of JSON.
+Markers tell where replaying can start from:
+    {"new": seed}                                   a new game, setup_game.new_game(seed)
+    {"checkpoint": [save id, saves], "seed": seed, "file": save file}
+                                                    the state of a save (see save_service.Checkpoint)
+A game's autosaves go to other files than its save (see persistence.save_slots), which is why
+checkpoints name theirs. Recovering loads the save and replays the entries after its marker headlessly, see setup_game.continue_game.
+
+Lines are buffered and written by a background thread every JOURNAL_FLUSH_INTERVAL seconds, so
+recording never waits on the disk; a hard kill loses at most that much play. Once a save is on
+disk, the journal is rewritten to start at its marker
+'''
+from __future__ import annotations
+
+from concurrent.futures import Future
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, TYPE_CHECKING
+
+import configs.save_config as save_config
+from persistence.save_service import Checkpoint, write_atomic
+
+if TYPE_CHECKING:
+    from actions import Action
+    from engine import Engine
+    import input_handlers
+
+#the only Level methods level ups call, see LevelUpHandler
+LEVEL_UPS = ("increase_max_hp", "increase_power", "increase_defense")
+
+
+class JournalError(Exception):
+    '''An action or journal entry that can't be journaled or replayed'''
+
+
+def journal_path(filename: str) -> str:
+    return filename + ".journal"
+
+
+def encode_action(action: Action) -> list:
+    '''Returns the action as [class name, attributes], with the player and their items as references
+
+    The player is the only one whose actions are journaled, so everything an action refers to is
+    either the player, an item in their inventory, or plain data
+    '''
+    player = action.entity
+    inventory = player.inventory.items
+
+    def encode(value: Any) -> Any:
+        if value is None or type(value) in (bool, int, float, str):
+            return value
+        if isinstance(value, tuple):
+            return {"#t": [encode(item) for item in value]}
+        if value is player:
+            return {"#player": None}
+        for index, item in enumerate(inventory):
+            if value is item:
+                return {"#item": index}
+            if value is getattr(item, "equippable", None):
+                return {"#equippable": index}
+        raise JournalError(f"{type(action).__name__} refers to a {type(value).__name__}, which can't be journaled")
+
+    return [type(action).__name__, {name: encode(value) for name, value in vars(action).items()}]
+
+
+def decode_action(record: list, engine: Engine) -> Action:
+    '''Rebuilds an action of the player of 'engine' from encode_action's record'''
+    import actions
+
+    class_name, attributes = record
+    cls = getattr(actions, class_name, None)
+    if not isinstance(cls, type) or not issubclass(cls, actions.Action):
+        raise JournalError(f"{class_name} is not an action")
+
+    player = engine.player
+    inventory = player.inventory.items
+
+    def decode(value: Any) -> Any:
+        if not isinstance(value, dict):
+            return value
+        (tag, payload), = value.items()
+        if tag == "#t":
+            return tuple(decode(item) for item in payload)
+        if tag == "#player":
+            return player
+        if tag in ("#item", "#equippable") and 0 <= payload < len(inventory):
+            item = inventory[payload]
+            return item if tag == "#item" else item.equippable
+        raise JournalError(f"Can't replay {class_name}, {value} is unknown")
+
+    #created like a loaded save, without __init__, which may look at the state
+    action = cls.__new__(cls)
+    action.__dict__.update({name: decode(value) for name, value in attributes.items()})
+    return action
+
+
+def checkpoint_marker(engine: Engine, checkpoint: Checkpoint, filename: str) -> Dict[str, Any]:
+    return {"checkpoint": list(checkpoint), "seed": engine.game_world.seed, "file": filename}
+
+
+def read(path: str) -> List[Dict[str, Any]]:
+    '''Returns the entries of a journal file, up to a torn last line'''
+    entries = []
+    if not os.path.exists(path):
+        return entries
+
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  #the game was killed while writing it
+            if not isinstance(entry, dict):
+                break
+            entries.append(entry)
+    return entries
+
+
+def markers(entries: List[Dict[str, Any]]) -> Iterator[int]:
+    '''Yields the indices of the markers replaying could start from, the last one first
+
+    A checkpoint can only be replayed from if its save file still holds its state; there is
+    none of either after a save that failed, or once a journal's autosave was overwritten
+    '''
+    for index in range(len(entries) - 1, -1, -1):
+        if "new" in entries[index] or "checkpoint" in entries[index]:
+            yield index
+
+
+def replay(
+    engine: Engine, entries: List[Dict[str, Any]], handler: input_handlers.EventHandler,
+) -> input_handlers.EventHandler:
+    '''Replays the entries after a marker on 'engine', without rendering
+
+    Actions go through EventHandler.play_turn like when they were taken, so enemy turns, FOV,
+    timers, deaths and level ups play out the same. Returns the handler the game continues with,
+    'handler' if there was nothing to replay. Stops at an "end" entry, left by an action that
+    couldn't be journaled
+    '''
+    import input_handlers
+
+    for entry in entries:
+        if "end" in entry:
+            break
+        if "action" in entry:
+            handler = input_handlers.MainGameEventHandler(engine).play_turn(decode_action(entry["action"], engine))
+        elif "level_up" in entry:
+            if entry["level_up"] not in LEVEL_UPS:
+                raise JournalError(f"{entry['level_up']} is not a level up")
+            getattr(engine.player.level, entry["level_up"])()
+            handler = input_handlers.MainGameEventHandler(engine)
+        elif "character" in entry:
+            input_handlers.create_character(engine, **entry["character"])
+            handler = input_handlers.MainGameEventHandler(engine)
+        elif "checkpoint" not in entry:
+            raise JournalError(f"Unknown journal entry {entry}")
+    return handler
+
+
+class ActionJournal:
+    '''Records the player's actions in the journal of one engine
+
+    Recording only puts the line on a queue; a flusher thread writes the queued lines every
+    'flush_interval' seconds and fsyncs them, so input never waits on the disk
+    '''
+
+    def __init__(self, flush_interval: float = save_config.JOURNAL_FLUSH_INTERVAL) -> None:
+        self.flush_interval = flush_interval
+        self.engine: Optional[Engine] = None  #recorded, None while closed
+        self.path: Optional[str] = None
+
+        self._queue: queue.SimpleQueue[str] = queue.SimpleQueue()
+        self._lines: List[str] = []  #the journal file's lines, for rewriting it
+        self._lock = threading.Lock()  #of the file and _lines, between the flusher and the save thread
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def start(self, engine: Engine, filename: str, entries: List[Dict[str, Any]]) -> None:
+        '''Starts recording 'engine' into the journal of 'filename', which is rewritten to hold 'entries' first'''
+        self.close()
+        with self._lock:
+            self.path = journal_path(filename)
+            self._lines = [json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries]
+            write_atomic(self.path, "".join(self._lines).encode())
+        self.engine = engine
+
+        self._wake.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal", daemon=True)
+        self._flusher.start()
+
+    def new_game(self, engine: Engine, filename: str) -> None:
+        self.start(engine, filename, [{"new": engine.game_world.seed}])
+
+    def record(self, engine: Engine, entry: Optional[Dict[str, Any]]) -> None:
+        if engine is self.engine and entry is not None:
+            self._queue.put(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def encode_action(self, engine: Engine, action: Action) -> Optional[Dict[str, Any]]:
+        '''Returns the entry of an action of the player, to record once it was performed
+
+        Taken before performing it, which can change what it refers to (e.g. use up the item).
+        None if 'engine' isn't journaled
+        '''
+        if engine is not self.engine:
+            return None
+        try:
+            return {"action": encode_action(action)}
+        except JournalError as exc:
+            #replaying past this action would go wrong, so replays stop here until the next checkpoint
+            return {"end": str(exc)}
+
+    def checkpoint(self, engine: Engine, checkpoint: Checkpoint, save: Future, filename: str) -> None:
+        '''Marks where a save to 'filename' was taken; once 'save' is written, the journal is rewritten to start here'''
+        if engine is not self.engine:
+            return
+
+        marker = json.dumps(checkpoint_marker(engine, checkpoint, filename), separators=(",", ":")) + "\n"
+        self._queue.put(marker)
+        self._wake.set()  #written right away, so a save on disk always has its marker
+
+        def restart(future: Future) -> None:
+            if future.exception() is None:
+                self._restart(marker)
+        save.add_done_callback(restart)
+
+    def flush(self) -> None:
+        '''Writes the queued lines and fsyncs them'''
+        with self._lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not lines or self.path is None:
+                return
+
+            self._lines.extend(lines)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self) -> None:
+        '''Stops recording, writing whatever is still queued'''
+        if self._flusher is not None:
+            self._wake.set()
+            self.engine = None
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def discard(self) -> None:
+        '''Stops recording and deletes the journal, e.g. once the game is over'''
+        path = self.path
+        self.close()
+        with self._lock:
+            self._lines = []
+            self.path = None
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def _flush_loop(self) -> None:
+        while self.engine is not None:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _restart(self, marker: str) -> None:
+        '''Drops the lines before 'marker', which are in the save now'''
+        self.flush()  #so the marker is among the lines
+        with self._lock:
+            if self.path is None or marker not in self._lines:
+                return
+            self._lines = self._lines[self._lines.index(marker):]
+            write_atomic(self.path, "".join(self._lines).encode())
+
+
+#shared like the save service, recording the game being played
+action_journal = ActionJournal()
@@ -0,0 +1,59 @@
+'''Compression codecs for save files, picked per save and recorded in its header'''
+from __future__ import annotations
+
+import bz2
+import lzma
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import zlib
+
+
+class Codec(NamedTuple):
+    compress: Callable[[bytes, int], bytes]  #(data, level)
+    decompress: Callable[[bytes], bytes]
+    default_level: int
+    levels: range
+
+
+def _store(data: bytes, level: int) -> bytes:
+    return data
+
+def _unstore(data: bytes) -> bytes:
+    return data
+
+def _zlib_compress(data: bytes, level: int) -> bytes:
+    return zlib.compress(data, level)
+
+def _bz2_compress(data: bytes, level: int) -> bytes:
+    return bz2.compress(data, level)
+
+def _lzma_compress(data: bytes, level: int) -> bytes:
+    return lzma.compress(data, preset=level)
+
+
+#all of them release the GIL while they work, so background saves don't stall the game
+CODECS: Dict[str, Codec] = {
+    "none": Codec(_store, _unstore, 0, range(0, 1)),
+    "zlib": Codec(_zlib_compress, zlib.decompress, 6, range(0, 10)),
+    "bz2": Codec(_bz2_compress, bz2.decompress, 9, range(1, 10)),
+    "lzma": Codec(_lzma_compress, lzma.decompress, 6, range(0, 10)),
+}
+
+
+def get_codec(name: str, level: Optional[int] = None) -> Tuple[Codec, int]:
+    '''Returns the codec called 'name' and the level to use it at, its default one if 'level' is None'''
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec {name!r}, expected one of {', '.join(CODECS)}")
+
+    if level is None:
+        level = codec.default_level
+    if level not in codec.levels:
+        raise ValueError(f"{name} levels go from {codec.levels.start} to {codec.levels.stop - 1}, not {level}")
+    return codec, level
+
+
+def parse_codec(text: str) -> Tuple[str, Optional[int]]:
+    '''Parses a codec given as NAME or NAME:LEVEL, e.g. "lzma:1" '''
+    name, _, level = text.partition(":")
+    get_codec(name, int(level) if level else None)  #validates both
+    return name, int(level) if level else None
@@ -0,0 +1,844 @@
+'''Versioned, columnar binary container for saves and floor snapshots, without pickle
+
+A file is laid out as:
+    MAGIC | header length (u32, little endian) | header (JSON) | padding | body
+The body holds
+    records  JSON list of the columns that aren't arrays, then the root value
+    arrays   raw array bytes, each aligned to ARRAY_ALIGNMENT
+and the header the format version, the codec the body is compressed with (see persistence.codecs),
+where every array is in the body and the record groups, plus the metadata menus show of the
+save, which read_file_header reads without touching the body. Compressed data moves the layout
+(LAYOUT_KEYS, what only loading needs) to the start of the compressed body.
+
+Objects are saved as records, grouped by class and attribute names, and every attribute of a
+group is saved as a column: numbers and references to other records as arrays, repeated values
+(colors, render orders, ...) once each plus an array of codes, anything else in the JSON.
+Loading thus sets up thousands of entities and components with a handful of tolist() calls
+instead of decoding every value, and numpy arrays (tile ids, explored, ...) are
+stored as they are in memory, so loading only wraps np.frombuffer around the file's buffer (a
+copy-on-write memory map for uncompressed files) instead of copying.
+
+Only classes of SAVEABLE_MODULES are ever created when loading, each from its recorded state
+like pickle would (__setstate__ or __dict__), and the only methods bound are SAVEABLE_METHODS,
+so a save file can't run arbitrary code
+
+Saves can also be deltas on top of earlier ones, see SaveHistory, and the state of a live object
+graph can be put back into the same objects, see take_snapshot
+'''
+from __future__ import annotations
+
+from collections import OrderedDict
+import enum
+import hashlib
+import importlib
+import json
+import math
+import mmap
+import random
+import struct
+import types
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from persistence import codecs
+
+MAGIC = b"RLGSAVE\n"
+VERSION = 1
+ARRAY_ALIGNMENT = 64
+
+#shorter columns stay in the JSON, an array isn't worth its header entry and padding
+MIN_ARRAY_COLUMN = 8
+COLUMN_DTYPES = {bool: np.bool_, int: np.int64, float: np.float64}
+
+#values saved as they are in the JSON
+PLAIN_TYPES = frozenset((type(None), bool, int, float, str))
+
+#columns of these values, which can be shared between objects, are saved as their distinct values and a code per row
+SHAREABLE_TYPES = (type(None), bool, int, float, str, enum.Enum)
+
+#the classes defined in these modules are the only ones saves can hold
+SAVEABLE_MODULES = (
+    "components.ai",
+    "components.consumable",
+    "components.equipment",
+    "components.equippable",
+    "components.fighter",
+    "components.inventory",
+    "components.level",
+    "configs.render_order",
+    "engine",
+    "entity",
+    "equipment_types",
+    "floor_cache",
+    "game_map",
+    "interface.message_log",
+    "procgen",
+    "timer_wheel",
+)
+
+#the bound methods saves can hold, the timer wheel's callbacks, by the class defining them
+SAVEABLE_METHODS = {
+    "components.ai.ConfusedEnemy": ("expire",),
+    "components.equippable.Equippable": ("end_cooldown",),
+}
+
+#the parts of the header only loading needs, compressed with the body, see compress
+LAYOUT_KEYS = ("objects", "groups", "records", "arrays", "persistent", "history_arrays")
+
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+class SaveFormatError(Exception):
+    '''The data is not a save this version can read'''
+
+
+_registry: Optional[Dict[str, type]] = None
+
+def get_registry() -> Dict[str, type]:
+    '''Returns the saveable classes by their qualified name, collected on first use'''
+    global _registry
+    if _registry is None:
+        _registry = {}
+        for module_name in SAVEABLE_MODULES:
+            module = importlib.import_module(module_name)
+            for value in vars(module).values():
+                if isinstance(value, type) and value.__module__ == module_name:
+                    _registry[f"{module_name}.{value.__qualname__}"] = value
+    return _registry
+
+
+def is_saveable_method(obj: Any, method_name: str) -> bool:
+    '''Whether the method 'method_name' of 'obj' is one of SAVEABLE_METHODS'''
+    registry = get_registry()
+    return any(
+        method_name in method_names and isinstance(obj, registry[class_name])
+        for class_name, method_names in SAVEABLE_METHODS.items()
+    )
+
+
+class SaveHistory:
+    '''The objects of a full save and of the delta saves on top of it, by persistent index
+
+    Handed to dumps, objects the history already holds are saved as a reference to it if they are
+    unchanged since, i.e. have a 'changed' attribute that is False. Everything they reference is
+    then left out as well, so a map whose floor nobody touched costs a few bytes instead of all
+    its entities and arrays. Objects without the attribute are always saved, over the old ones.
+    Arrays have no flag, numpy writes them in too many places: the history holds a digest of
+    each array saved, by the attribute holding it, and the saves after only write arrays whose
+    digest changed, e.g. the explored tiles once something new was seen.
+    Handed to loads, in the same order, the saves rebuild the objects in place.
+    Holding the objects also keeps their ids from being reused for others
+    '''
+
+    def __init__(self, save_id: str) -> None:
+        self.save_id = save_id  #recorded in every save, so deltas are never applied to another full save
+        self.saves = 0  #the full save and the deltas so far
+        self.objects: List[Any] = []
+        self.indices: Dict[int, int] = {}  #id(obj) to persistent index
+        #persistent index and digest of the latest array saved, by (id(obj), attribute) or else id(array)
+        self.arrays: Dict[Any, Tuple[int, bytes]] = {}
+
+    def add(self, objects: Iterable[Any]) -> None:
+        for obj in objects:
+            self.indices[id(obj)] = len(self.objects)
+            self.objects.append(obj)
+
+    def add_array(self, key: Any, array: np.ndarray, digest: bytes) -> None:
+        previous = self.arrays.get(key)
+        if previous is not None:
+            self.objects[previous[0]] = None  #never referred to again
+        self.arrays[key] = (len(self.objects), digest)
+        self.objects.append(array)
+
+
+def _digest(array: np.ndarray) -> bytes:
+    '''A digest of the shape, type and contents of an array, which tells delta saves whether it changed'''
+    digest = hashlib.blake2b(f"{array.shape}{array.dtype.str}".encode(), digest_size=16)
+    if array.flags.c_contiguous or array.flags.f_contiguous:
+        digest.update(array.ravel(order="A").view(np.uint8))
+    else:
+        digest.update(array.tobytes())
+    return digest.digest()
+
+
+class _Group:
+    '''The records of one class and set of attribute names, by row until they are saved as columns'''
+
+    def __init__(self, class_name: str, attributes: Optional[Tuple[str, ...]]) -> None:
+        self.class_name = class_name
+        self.attributes = attributes  #None if the states aren't dicts, they are then saved whole
+        self.indices: List[int] = []  #record index of each row
+        self.values: List[list] = []  #as they are, to pick the column type
+        self.encoded: List[list] = []
+
+    def columns(self) -> Iterator[Tuple[list, list]]:
+        '''Returns the values and encoded values of each column'''
+        return zip(map(list, zip(*self.values)), map(list, zip(*self.encoded)))
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _is_shareable(value: Any) -> bool:
+    '''Immutable values, which can be shared between objects instead of each having its own'''
+    if isinstance(value, tuple):
+        return all(isinstance(item, SHAREABLE_TYPES) for item in value)
+    return isinstance(value, SHAREABLE_TYPES)
+
+
+def _share_key(value: Any) -> Any:
+    '''Tells apart equal values of different types, like 1, 1.0 and True'''
+    if isinstance(value, tuple):
+        return tuple(map(type, value)), value
+    return type(value), value
+
+
+class _Encoder:
+    '''Flattens an object graph into JSON friendly values, record groups and arrays
+
+    Values are JSON values, except that containers other than lists and string keyed dicts, and
+    everything that isn't plain data, are tagged as a JSON object with a single '#' key, e.g.
+    {"#t": [...]} for a tuple or {"#r": 3} for a reference to record 3. Dicts with keys starting
+    with '#' are tagged as well, so tags are never mistaken for them.
+    Shared and cyclic references come out as the same record, unchanged objects and arrays of the
+    history as {"#p": persistent index}
+    '''
+
+    def __init__(self, externals: Dict[str, Any], history: Optional[SaveHistory] = None) -> None:
+        self.externals = {id(obj): name for name, obj in externals.items()}
+        self.class_names = {cls: name for name, cls in get_registry().items()}
+        self.history = history
+
+        self.record_ids: Dict[int, int] = {}  #id(obj) to record index
+        self.objects: List[Any] = []  #by record index
+        self.persistent: List[int] = []  #persistent index of each record, -1 for objects new to the history
+        self.groups: Dict[Tuple[type, Optional[Tuple[str, ...]]], _Group] = {}
+        self.arrays: List[np.ndarray] = []
+        self.history_arrays: List[Tuple[Any, int, bytes]] = []  #key, position and digest of the arrays the history tracks
+        self.json_columns: List[list] = []
+        self.keep_alive: List[Any] = []  #states built here, so their ids aren't reused while encoding
+
+    def encode(self, value: Any) -> Any:
+        kind = type(value)
+        if kind in PLAIN_TYPES:
+            return value
+        if kind is list:
+            return [self.encode(item) for item in value]
+        if kind is tuple:
+            return {"#t": [self.encode(item) for item in value]}
+        if id(value) in self.externals:
+            return {"#x": self.externals[id(value)]}
+        if kind in self.class_names and not issubclass(kind, enum.Enum):
+            return self.reference(value)
+
+        #subclasses of the above and everything else
+        if isinstance(value, (bool, int, float, str)) and not isinstance(value, enum.Enum):
+            return value
+        if isinstance(value, list):
+            return [self.encode(item) for item in value]
+        if isinstance(value, tuple):
+            return {"#t": [self.encode(item) for item in value]}
+        if isinstance(value, OrderedDict):
+            return {"#o": [[self.encode(k), self.encode(v)] for k, v in value.items()]}
+        if isinstance(value, dict):
+            if all(type(k) is str and not k.startswith("#") for k in value):
+                return {k: self.encode(v) for k, v in value.items()}
+            return {"#d": [[self.encode(k), self.encode(v)] for k, v in value.items()]}
+        if isinstance(value, (set, frozenset)):
+            return {"#s": [self.encode(item) for item in value]}
+        if isinstance(value, np.ndarray):
+            if self.history is not None:
+                return self.history_array(value, id(value))
+            return {"#a": self.add_array(value)}
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, bytes):
+            return {"#b": self.add_array(np.frombuffer(value, dtype=np.uint8))}
+        if isinstance(value, slice):
+            return {"#sl": [value.start, value.stop, value.step]}
+        if isinstance(value, random.Random):
+            return {"#rng": self.encode(value.getstate())}
+        if isinstance(value, enum.Enum):
+            return {"#e": [self.class_name(value), value.value]}
+        if isinstance(value, types.MethodType):
+            if not is_saveable_method(value.__self__, value.__func__.__name__):
+                raise TypeError(f"{value.__qualname__} is not in SAVEABLE_METHODS, it can't be saved")
+            return {"#m": [self.encode(value.__self__), value.__func__.__name__]}
+        return self.reference(value)
+
+    def reference(self, obj: Any) -> Dict[str, int]:
+        if self.history is not None and getattr(obj, "changed", True) is False:
+            index = self.history.indices.get(id(obj))
+            if index is not None:
+                return {"#p": index}
+        return {"#r": self.add_record(obj)}
+
+    def class_name(self, obj: Any) -> str:
+        try:
+            return self.class_names[type(obj)]
+        except KeyError:
+            raise TypeError(f"{type(obj).__qualname__} objects can't be saved") from None
+
+    def history_array(self, array: np.ndarray, key: Any) -> Dict[str, int]:
+        '''Saves an array unless the history holds the same contents under the same key'''
+        digest = _digest(array)
+        known = self.history.arrays.get(key)
+        if known is not None and known[1] == digest:
+            return {"#p": known[0]}
+        position = self.add_array(array)
+        self.history_arrays.append((key, position, digest))
+        return {"#a": position}
+
+    def add_array(self, array: np.ndarray) -> int:
+        if array.dtype.hasobject:
+            raise TypeError("Arrays of Python objects can't be saved")
+        self.arrays.append(array)
+        return len(self.arrays) - 1
+
+    def add_record(self, obj: Any) -> int:
+        if id(obj) in self.record_ids:
+            return self.record_ids[id(obj)]
+
+        #the index is taken before the state is encoded, so cycles back to this object find it
+        index = len(self.record_ids)
+        self.record_ids[id(obj)] = index
+        self.objects.append(obj)
+        if self.history is not None:
+            self.persistent.append(self.history.indices.get(id(obj), -1))
+
+        state = obj.__getstate__()  #like pickle, so classes can leave out or compact what they save
+        self.keep_alive.append(state)
+        if type(state) is dict:
+            key: Tuple[type, Optional[Tuple[str, ...]]] = (type(obj), tuple(state))
+            values = list(state.values())
+        else:
+            key, values = (type(obj), None), [state]
+
+        group = self.groups.get(key)
+        if group is None:
+            if key[1] is not None and not all(type(name) is str for name in key[1]):
+                key, values = (type(obj), None), [state]
+                group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = _Group(self.class_name(obj), key[1])
+
+        #the row is added before it is encoded, encoding can add rows to the same group
+        encoded: list = []
+        group.indices.append(index)
+        group.values.append(values)
+        group.encoded.append(encoded)
+        if self.history is not None and key[1] is not None:
+            #arrays are keyed by the attribute holding them, GameMap saves new tile id arrays each time
+            encoded[:] = [
+                self.history_array(value, (id(obj), name)) if type(value) is np.ndarray else self.encode(value)
+                for name, value in zip(key[1], values)
+            ]
+        else:
+            encoded[:] = map(self.encode, values)
+        return index
+
+    def add_column(self, values: list, encoded: list) -> list:
+        '''Returns how a column is saved
+
+        ["a", array] for numbers, ["r", array] for records, ["k", json column, array] for repeated
+        shareable values (the distinct values and the code of each row) or else ["j", json column]
+        '''
+        if len(values) >= MIN_ARRAY_COLUMN:
+            kind = type(values[0])
+            if kind in COLUMN_DTYPES and all(type(value) is kind for value in values):
+                try:
+                    return ["a", self.add_array(np.array(values, dtype=COLUMN_DTYPES[kind]))]
+                except OverflowError:  #ints too large for int64 stay in the JSON
+                    pass
+            elif all(type(value) is dict and len(value) == 1 and "#r" in value for value in encoded):
+                return ["r", self.add_array(np.array([value["#r"] for value in encoded], dtype=np.int32))]
+            elif all(map(_is_shareable, values)):
+                codes: Dict[Any, int] = {}
+                distinct = []
+                for value, encoded_value in zip(values, encoded):
+                    key = _share_key(value)
+                    if key not in codes:
+                        codes[key] = len(distinct)
+                        distinct.append(encoded_value)
+                if len(distinct) <= len(values) // 2:
+                    self.json_columns.append(distinct)
+                    codes_array = np.array([codes[_share_key(value)] for value in values], dtype=np.int32)
+                    return ["k", len(self.json_columns) - 1, self.add_array(codes_array)]
+
+        self.json_columns.append(encoded)
+        return ["j", len(self.json_columns) - 1]
+
+    def group_specs(self) -> List[list]:
+        '''Returns the header entry of every group
+
+        [class name, attribute names or None, record indices (a list, or an array for large groups), columns]
+        '''
+        return [
+            [
+                group.class_name,
+                None if group.attributes is None else list(group.attributes),
+                (
+                    group.indices if len(group.indices) < MIN_ARRAY_COLUMN
+                    else self.add_array(np.array(group.indices, dtype=np.int32))
+                ),
+                [self.add_column(values, encoded) for values, encoded in group.columns()],
+            ]
+            for group in self.groups.values()
+        ]
+
+
+class _Decoder:
+    '''Rebuilds the object graph written by _Encoder
+
+    Every object is created up front from the groups in the header, so the JSON records can be
+    resolved in a single json.loads pass: 'resolve' is its object_hook, called on each JSON object
+    after its contents, and references simply look up the already created objects.
+    Records of objects the history already holds are filled into those instead; 'keep_arrays'
+    names the array attributes to keep of those, by persistent index, see copy_into_kept_arrays
+    '''
+
+    def __init__(
+        self,
+        arrays: List[np.ndarray],
+        externals: Dict[str, Any],
+        history: Optional[SaveHistory] = None,
+        keep_arrays: Optional[Dict[int, Tuple[str, ...]]] = None,
+    ) -> None:
+        self.arrays = arrays
+        self.externals = externals
+        self.history = history
+        self.registry = get_registry()
+        self.objects: List[Any] = []
+        self.keep_arrays = keep_arrays
+        self.kept_arrays: List[Tuple[Any, Dict[str, np.ndarray]]] = []
+
+    def create_objects(self, count: int, groups: List[list], persistent: Optional[Sequence[int]] = None) -> None:
+        self.objects = [None] * count
+        for class_name, _, indices, _ in groups:
+            cls = self.registry.get(class_name)
+            if cls is None or issubclass(cls, enum.Enum):
+                raise SaveFormatError(f"{class_name} is not a saveable class")
+            for index in self.group_indices(indices):
+                if persistent is None or persistent[index] < 0:
+                    self.objects[index] = cls.__new__(cls)
+                else:
+                    obj = self.history_object(persistent[index])
+                    if type(obj) is not cls:
+                        raise SaveFormatError(f"The delta save changes an object into a {class_name}")
+                    if self.keep_arrays is not None and persistent[index] in self.keep_arrays:
+                        state = obj.__dict__
+                        names = self.keep_arrays[persistent[index]]
+                        self.kept_arrays.append((obj, {name: state[name] for name in names if name in state}))
+                    obj.__dict__.clear()  #its state is replaced, not merged
+                    self.objects[index] = obj
+
+        if None in self.objects:
+            raise SaveFormatError("Records are missing")
+
+    def history_object(self, index: int) -> Any:
+        if self.history is None:
+            raise SaveFormatError("A delta save can only be loaded after the saves it builds on")
+        if not 0 <= index < len(self.history.objects):
+            raise SaveFormatError("The delta save refers to objects of another save")
+        return self.history.objects[index]
+
+    def group_indices(self, indices: Union[List[int], int]) -> List[int]:
+        indices = indices if isinstance(indices, list) else self.arrays[indices].tolist()
+        if not all(type(index) is int and 0 <= index < len(self.objects) for index in indices):
+            raise SaveFormatError("A record index is out of range")
+        return indices
+
+    def column(self, spec: list, json_columns: List[list]) -> list:
+        kind, position = spec[:2]
+        if kind == "a":
+            return self.arrays[position].tolist()
+        if kind == "r":
+            objects = self.objects
+            return [objects[index] for index in self.arrays[position].tolist()]
+        if kind == "k":
+            distinct = json_columns[position]
+            return [distinct[code] for code in self.arrays[spec[2]].tolist()]
+        if kind == "j":
+            return json_columns[position]
+        raise SaveFormatError(f"Unknown column kind {kind!r}")
+
+    def fill_objects(self, groups: List[list], json_columns: List[list]) -> None:
+        for _, attributes, indices, columns in groups:
+            objects = [self.objects[index] for index in self.group_indices(indices)]
+            values = [self.column(spec, json_columns) for spec in columns]
+
+            if attributes is None:
+                states = values[0]
+            elif attributes:
+                states = [dict(zip(attributes, row)) for row in zip(*values)]
+            else:
+                states = [{} for _ in objects]
+
+            if hasattr(type(objects[0]), "__setstate__"):
+                for obj, state in zip(objects, states):
+                    obj.__setstate__(state)
+            else:
+                for obj, state in zip(objects, states):
+                    if state is not None:  #None for objects without attributes
+                        obj.__dict__.update(state)
+
+    def copy_into_kept_arrays(self) -> None:
+        '''Copies the arrays of the refilled objects into the arrays they had, where the shapes match
+
+        Those stay writable and in place, so nothing is allocated and views of them stay valid.
+        The other arrays are left as they were loaded
+        '''
+        for obj, arrays in self.kept_arrays:
+            state = obj.__dict__
+            for name, old in arrays.items():
+                new = state.get(name)
+                if (
+                    type(new) is np.ndarray and new is not old and old.flags.writeable
+                    and new.shape == old.shape and new.dtype == old.dtype
+                ):
+                    np.copyto(old, new)
+                    state[name] = old
+
+    def resolve(self, value: Dict[str, Any]) -> Any:
+        if len(value) != 1:
+            return value
+        (tag, payload), = value.items()
+        if not tag.startswith("#"):
+            return value
+        if tag == "#r":
+            if type(payload) is not int or not 0 <= payload < len(self.objects):
+                raise SaveFormatError("A record reference is out of range")
+            return self.objects[payload]
+        if tag == "#p":
+            if type(payload) is not int:
+                raise SaveFormatError("A persistent reference is not an index")
+            return self.history_object(payload)
+        if tag == "#t":
+            if type(payload) is not list:
+                raise SaveFormatError("A tuple is not saved as a list")
+            return tuple(payload)
+        if tag == "#d" or tag == "#o":
+            #keys are checked up front, a crafted key could be a list or a dict
+            if type(payload) is not list or not all(
+                type(item) is list and len(item) == 2 and _is_hashable(item[0]) for item in payload
+            ):
+                raise SaveFormatError("A dict is not saved as a list of key and value pairs with hashable keys")
+            return dict(payload) if tag == "#d" else OrderedDict(payload)
+        if tag == "#s":
+            if type(payload) is not list or not all(map(_is_hashable, payload)):
+                raise SaveFormatError("A set is not saved as a list of hashable items")
+            return set(payload)
+        if tag == "#a":
+            return self.arrays[payload]
+        if tag == "#b":
+            return self.arrays[payload].tobytes()
+        if tag == "#sl":
+            return slice(*payload)
+        if tag == "#x":
+            return self.externals[payload]
+        if tag == "#rng":
+            rng = random.Random()
+            rng.setstate(payload)
+            return rng
+        if tag == "#e":
+            class_name, enum_value = payload
+            cls = self.registry.get(class_name)
+            if cls is None or not issubclass(cls, enum.Enum):
+                raise SaveFormatError(f"{class_name} is not a saveable enum")
+            return cls(enum_value)
+        if tag == "#m":
+            obj, method_name = payload
+            if not isinstance(method_name, str) or not is_saveable_method(obj, method_name):
+                raise SaveFormatError(f"{method_name} is not a saveable method")
+            return getattr(obj, method_name)
+        raise SaveFormatError(f"Unknown value tag {tag!r}")
+
+
+def _padding(length: int) -> int:
+    return -length % ARRAY_ALIGNMENT
+
+
+def _pack(header: dict, body: List[bytes]) -> bytes:
+    header_data = json.dumps(header, separators=(",", ":")).encode()
+    header_size = len(MAGIC) + _HEADER_LENGTH.size + len(header_data)
+    return b"".join([MAGIC, _HEADER_LENGTH.pack(len(header_data)), header_data, bytes(_padding(header_size)), *body])
+
+
+def dumps(
+    obj: Any,
+    externals: Optional[Dict[str, Any]] = None,
+    codec: str = "none",
+    level: Optional[int] = None,
+    history: Optional[SaveHistory] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    '''Returns the save data of 'obj', its body compressed with 'codec' at 'level' (see persistence.codecs)
+
+    Objects in 'externals' are written as their name only, and have to be handed to loads again.
+    With a 'history', the save is a delta on top of the saves in it (a full save if it is empty),
+    the objects saved are added to it and their 'changed' attributes cleared.
+    'metadata' (JSON values) goes into the header as it is
+    '''
+    data, _ = _dump(obj, externals or {}, history, metadata)
+    return data if codec == "none" else compress(data, codec, level)
+
+
+def _dump(
+    obj: Any, externals: Dict[str, Any], history: Optional[SaveHistory], metadata: Optional[Dict[str, Any]],
+) -> Tuple[bytes, _Encoder]:
+    '''Returns the uncompressed save data of 'obj', and the encoder, which holds the objects of its records'''
+    encoder = _Encoder(externals, history)
+    root = encoder.encode(obj)
+    groups = encoder.group_specs()
+    records = json.dumps([encoder.json_columns, root], separators=(",", ":")).encode()
+
+    persistent_array = None
+    if history is not None and max(encoder.persistent, default=-1) >= 0:
+        persistent_array = encoder.add_array(np.array(encoder.persistent, dtype=np.int32))
+
+    #arrays go after the records, each starting on an aligned offset of the body
+    offset = len(records) + _padding(len(records))
+    array_entries = []
+    for array in encoder.arrays:
+        order = "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+        array_entries.append([offset, np.lib.format.dtype_to_descr(array.dtype), list(array.shape), order])
+        offset += array.nbytes + _padding(array.nbytes)
+
+    header = {
+        "version": VERSION,
+        "codec": "none",
+        "objects": len(encoder.record_ids),
+        "groups": groups,
+        "records": len(records),
+        "arrays": array_entries,
+    }
+    if metadata is not None:
+        header["metadata"] = metadata
+    if history is not None:
+        header["history"] = [history.save_id, history.saves]
+        if persistent_array is not None:
+            header["persistent"] = persistent_array
+        header["history_arrays"] = [position for _, position, _ in encoder.history_arrays]
+
+        history.add(obj for obj, index in zip(encoder.objects, encoder.persistent) if index < 0)
+        for key, position, digest in encoder.history_arrays:
+            history.add_array(key, encoder.arrays[position], digest)
+        history.saves += 1
+        for obj in encoder.objects:
+            if getattr(obj, "changed", False):
+                obj.changed = False
+    body = [records, bytes(_padding(len(records)))]
+    for array in encoder.arrays:
+        body.append(array.tobytes(order="A"))
+        body.append(bytes(_padding(array.nbytes)))
+
+    return _pack(header, body), encoder
+
+
+def compress(data: bytes, codec: str, level: Optional[int] = None) -> bytes:
+    '''Compresses the body of uncompressed save data, e.g. on a background thread after dumps took the snapshot
+
+    The header stays uncompressed and records the codec, so loads can find out how to decompress.
+    Its layout is compressed along with the body, as a length prefixed JSON object padded to
+    ARRAY_ALIGNMENT, as the group specs are most of the header of a small delta save
+    '''
+    header, body = read_header(data)
+    if header.get("codec", "none") != "none":
+        raise ValueError("The save data is already compressed")
+
+    compressor, level = codecs.get_codec(codec, level)
+    layout = json.dumps({key: header.pop(key) for key in LAYOUT_KEYS if key in header}, separators=(",", ":")).encode()
+    prefix = _HEADER_LENGTH.size + len(layout)
+    payload = b"".join([_HEADER_LENGTH.pack(len(layout)), layout, bytes(_padding(prefix)), memoryview(data)[body:]])
+    header["codec"], header["level"] = codec, level
+    return _pack(header, [compressor.compress(payload, level)])
+
+
+def _read_layout(buffer: bytearray) -> Tuple[dict, int]:
+    '''Returns the layout at the start of a decompressed body, and the offset the body proper starts at'''
+    if len(buffer) < _HEADER_LENGTH.size:
+        raise SaveFormatError("The body is truncated")
+    (length,) = _HEADER_LENGTH.unpack_from(buffer, 0)
+    prefix = _HEADER_LENGTH.size + length
+    return _parse_header(bytes(buffer[_HEADER_LENGTH.size : prefix])), prefix + _padding(prefix)
+
+
+def read_header(buffer: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Tuple[dict, int]:
+    '''Returns the header of save data and the offset its body starts at'''
+    if len(buffer) < len(MAGIC) + _HEADER_LENGTH.size or bytes(buffer[: len(MAGIC)]) != MAGIC:
+        raise SaveFormatError("Not a save file")
+
+    (header_length,) = _HEADER_LENGTH.unpack_from(buffer, len(MAGIC))
+    header_start = len(MAGIC) + _HEADER_LENGTH.size
+    header = _check_version(_parse_header(bytes(buffer[header_start : header_start + header_length])))
+
+    body_start = header_start + header_length
+    return header, body_start + _padding(body_start)
+
+
+def read_file_header(f: BinaryIO) -> dict:
+    '''Returns the header of the save data starting at the file's position, reading nothing of the body'''
+    prefix = f.read(len(MAGIC) + _HEADER_LENGTH.size)
+    if len(prefix) < len(MAGIC) + _HEADER_LENGTH.size or prefix[: len(MAGIC)] != MAGIC:
+        raise SaveFormatError("Not a save file")
+
+    (header_length,) = _HEADER_LENGTH.unpack_from(prefix, len(MAGIC))
+    return _check_version(_parse_header(f.read(header_length)))
+
+
+def _parse_header(data: bytes) -> dict:
+    try:
+        header = json.loads(data)
+    except ValueError as exc:  #decoding errors as well
+        raise SaveFormatError(f"The header is corrupt: {exc}") from None
+    if type(header) is not dict:
+        raise SaveFormatError("The header is corrupt")
+    return header
+
+
+def _check_version(header: dict) -> dict:
+    if header.get("version", 0) > VERSION:
+        raise SaveFormatError(f"The save is from a newer version ({header['version']}) of the game")
+    return header
+
+
+def loads(
+    buffer: Union[bytes, bytearray, memoryview, mmap.mmap],
+    externals: Optional[Dict[str, Any]] = None,
+    history: Optional[SaveHistory] = None,
+) -> Any:
+    '''Rebuilds the object saved in 'buffer', decompressing it first if its header names a codec
+
+    Arrays of uncompressed saves are views on the buffer, writable only if the buffer is (e.g. a
+    bytearray or a copy-on-write mmap). Those of compressed saves are always writable.
+    Saves dumped with a history are loaded with one, holding the saves before them (none for a full save)
+    '''
+    header, body = read_header(buffer)
+    if history is not None and header.get("history") != [history.save_id, history.saves]:
+        raise SaveFormatError("The save doesn't follow the saves loaded before it")
+
+    codec = header.get("codec", "none")
+    if codec != "none":
+        try:
+            decompressor, _ = codecs.get_codec(codec)
+        except ValueError as exc:
+            raise SaveFormatError(str(exc)) from None
+        try:
+            buffer, body = bytearray(decompressor.decompress(memoryview(buffer)[body:])), 0
+        except Exception as exc:  #each codec has errors of its own
+            raise SaveFormatError(f"The body doesn't decompress: {exc}") from None
+        if "objects" not in header:  #compressed along with the body
+            layout, body = _read_layout(buffer)
+            header = {**header, **layout}
+
+    try:
+        arrays = _array_views(buffer, header, body)
+        persistent = arrays[header["persistent"]].tolist() if "persistent" in header else None
+
+        #every record is in a group's indices, at least a byte each, so larger counts are crafted
+        if type(header["objects"]) is not int or not 0 <= header["objects"] <= len(buffer):
+            raise SaveFormatError("The record count is corrupt")
+        decoder = _Decoder(arrays, externals or {}, history)
+        decoder.create_objects(header["objects"], header["groups"], persistent)
+        json_columns, root = json.loads(bytes(buffer[body : body + header["records"]]), object_hook=decoder.resolve)
+        decoder.fill_objects(header["groups"], json_columns)
+        history_arrays = [arrays[position] for position in header.get("history_arrays", ())]
+    except (TypeError, ValueError, IndexError, KeyError, AttributeError) as exc:
+        #a truncated or crafted save, whatever part of it broke loading
+        raise SaveFormatError(f"The save is corrupt: {exc!r}") from None
+
+    if history is not None:
+        if persistent is None:
+            history.add(decoder.objects)
+        else:
+            history.add(obj for obj, index in zip(decoder.objects, persistent) if index < 0)
+        history.objects.extend(history_arrays)
+        history.saves += 1
+    return root
+
+
+def _array_views(buffer: Union[bytes, bytearray, memoryview, mmap.mmap], header: dict, body: int) -> List[np.ndarray]:
+    '''Returns the arrays of uncompressed save data, as views on its buffer'''
+    arrays = []
+    for offset, descr, shape, order in header["arrays"]:
+        dtype = np.lib.format.descr_to_dtype(descr if isinstance(descr, str) else [tuple(field) for field in descr])
+        count = math.prod(shape)
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=body + offset)
+        arrays.append(array.reshape(shape, order=order))
+    return arrays
+
+
+class GraphSnapshot:
+    '''The state of a live object graph, which restore_snapshot puts back into the same objects'''
+
+    def __init__(self, data: bytes, objects: List[Any]) -> None:
+        self.data = data  #uncompressed save data
+        self.header, self.body = read_header(data)
+        self.objects = objects  #by record index, kept alive so they can be refilled
+
+        #the attributes holding arrays, by record index, which restoring copies into
+        self.array_attributes: Dict[int, Tuple[str, ...]] = {}
+        for index, obj in enumerate(objects):
+            names = tuple(name for name, value in vars(obj).items() if type(value) is np.ndarray)
+            if names:
+                self.array_attributes[index] = names
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+
+def take_snapshot(obj: Any, externals: Optional[Dict[str, Any]] = None) -> GraphSnapshot:
+    '''Captures the state of 'obj' and everything it references, like dumps without a codec
+
+    Unlike dumps with a history, the 'changed' flags are left alone, so taking snapshots doesn't
+    get in the way of delta saves
+    '''
+    data, encoder = _dump(obj, externals or {}, None, None)
+    return GraphSnapshot(data, encoder.objects)
+
+
+def restore_snapshot(snapshot: GraphSnapshot, externals: Optional[Dict[str, Any]] = None) -> Any:
+    '''Puts the state of a snapshot back into its objects, in place, and returns its root
+
+    Objects created since are no longer referenced by the graph. The snapshot can be restored any
+    number of times: arrays its objects still have are copied into, the others (e.g. the tile ids
+    of chunks, which are only ever replaced) are read-only views of the snapshot, shared until
+    they are replaced. Objects with a 'changed' flag are marked changed, the saves taken since
+    the snapshot don't hold their state
+    '''
+    history = SaveHistory("snapshot")
+    history.objects = snapshot.objects
+
+    header, body, buffer = snapshot.header, snapshot.body, snapshot.data
+    decoder = _Decoder(_array_views(buffer, header, body), externals or {}, history, keep_arrays=snapshot.array_attributes)
+    decoder.create_objects(header["objects"], header["groups"], range(len(snapshot.objects)))
+    json_columns, root = json.loads(buffer[body : body + header["records"]], object_hook=decoder.resolve)
+    decoder.fill_objects(header["groups"], json_columns)
+    decoder.copy_into_kept_arrays()
+
+    for obj in snapshot.objects:
+        if "changed" in obj.__dict__:
+            obj.changed = True
+    return root
+
+
+def save(obj: Any, filename: str, codec: str = "none", level: Optional[int] = None) -> None:
+    with open(filename, "wb") as f:
+        f.write(dumps(obj, codec=codec, level=level))
+
+
+def load(filename: str) -> Any:
+    '''Loads a save file of any codec
+
+    Uncompressed files are read through a copy-on-write memory map, so their arrays are read lazily and never copied up front
+    '''
+    with open(filename, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return loads(buffer)
@@ -0,0 +1,329 @@
+'''Saves games in the background, so quitting or autosaving doesn't stall the game
+
+Most saves are deltas: only what changed since the previous save, appended to the journal next
+to the save file ("<save file>.delta"). Every so often the deltas are compacted into a new full
+save, which starts an empty journal.
+
+A save's future gives a SavedFile, with the checksum of the save file and its journal, see
+persistence.save_slots for the index kept of them
+'''
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
+import uuid
+import zlib
+
+import configs.save_config as save_config
+from persistence import save_format
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+#identifies the state a save holds: the id of its full save and the number of saves up to it, deltas included
+Checkpoint = Tuple[str, int]
+
+#every delta in the journal is prefixed by its length and CRC-32, so a torn last delta is recognized
+_DELTA_FRAME = struct.Struct("<II")
+
+
+def journal_path(filename: str) -> str:
+    return filename + ".delta"
+
+
+def write_atomic(filename: str, data: bytes) -> None:
+    '''Writes a file through a temporary file renamed over it, so a crash never leaves half a save behind'''
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())  #on disk before the rename makes it the save
+        os.replace(temp_path, filename)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def append_delta(filename: str, data: bytes) -> None:
+    '''Appends a delta save to the journal of 'filename', on disk once this returns'''
+    with open(journal_path(filename), "ab") as f:
+        f.write(_DELTA_FRAME.pack(len(data), zlib.crc32(data)))
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def file_checksum(filename: str) -> int:
+    '''Returns the CRC-32 of a save file followed by its journal, like the SavedFile of its latest save'''
+    checksum = 0
+    for path in (filename, journal_path(filename)):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(1 << 20)
+                    if not block:
+                        break
+                    checksum = zlib.crc32(block, checksum)
+    return checksum
+
+
+def remove_save(filename: str) -> None:
+    '''Deletes a save file and its journal, if they exist'''
+    for path in (filename, journal_path(filename)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class SaveMetadata(NamedTuple):
+    '''What menus show of a save, see Engine.save_metadata'''
+    floor: int
+    lives_left: int
+    level: int
+    turn: int
+    timestamp: float  #when it was saved, in seconds since the epoch
+    size: int  #bytes on disk, of the full save and its deltas
+
+
+class SavedFile(NamedTuple):
+    '''The outcome of a save, once it is on disk'''
+    filename: str
+    checkpoint: Checkpoint
+    metadata: Dict[str, Any]  #see Engine.save_metadata
+    checksum: int  #CRC-32 of the save file followed by its journal, see file_checksum
+    size: int  #bytes on disk, of the full save and its deltas
+
+
+def read_metadata(filename: str) -> Optional[SaveMetadata]:
+    '''Returns the metadata of the latest state of a save, reading only headers
+
+    That of the last delta in the journal which load would apply, else of the full save. None if
+    the save has none (an older save)
+    '''
+    with open(filename, "rb") as f:
+        header = save_format.read_file_header(f)
+    metadata = header.get("metadata")
+    size = os.path.getsize(filename)
+
+    path = journal_path(filename)
+    if "history" in header and os.path.exists(path):
+        save_id, saves = header["history"]
+        with open(path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + _DELTA_FRAME.size <= end:
+                f.seek(offset)
+                length, _ = _DELTA_FRAME.unpack(f.read(_DELTA_FRAME.size))
+                if offset + _DELTA_FRAME.size + length > end:
+                    break  #torn
+                try:
+                    delta_header = save_format.read_file_header(f)
+                except (save_format.SaveFormatError, ValueError):
+                    break
+                if delta_header.get("history") != [save_id, saves + 1]:
+                    break  #like load, see there
+                saves += 1
+                metadata = delta_header.get("metadata", metadata)
+                offset += _DELTA_FRAME.size + length
+        size += offset
+
+    if metadata is None:
+        return None
+    return SaveMetadata(**{field: metadata.get(field) for field in SaveMetadata._fields[:-1]}, size=size)
+
+
+def load(filename: str) -> Any:
+    '''Loads a full save and then every delta of its journal on top of it
+
+    The journal ends at the first delta that is torn (the game stopped while appending it) or
+    doesn't follow the ones before it, e.g. after a failed write, so loading still gets the
+    state of the last save that fully made it to disk
+    '''
+    return load_checkpoint(filename)[0]
+
+
+def load_checkpoint(filename: str) -> Tuple[Any, Optional[Checkpoint]]:
+    '''Like load, but also returns the checkpoint of the save loaded, None for saves without one'''
+    with open(filename, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)  #like save_format.load
+    header, _ = save_format.read_header(buffer)
+    if "history" not in header:
+        return save_format.loads(buffer), None  #saved without deltas
+
+    history = save_format.SaveHistory(header["history"][0])
+    root = save_format.loads(buffer, history=history)
+
+    path = journal_path(filename)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return root, (history.save_id, history.saves)
+
+    with open(path, "rb") as f:
+        journal = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with journal:
+        offset = 0
+        while offset + _DELTA_FRAME.size <= len(journal):
+            length, crc = _DELTA_FRAME.unpack_from(journal, offset)
+            data = journal[offset + _DELTA_FRAME.size : offset + _DELTA_FRAME.size + length]
+            if len(data) < length or zlib.crc32(data) != crc:
+                break  #torn
+            delta_header, _ = save_format.read_header(data)
+            if delta_header.get("history") != [history.save_id, history.saves]:
+                break  #belongs to an older full save, or a delta before it is missing
+            save_format.loads(bytearray(data), history=history)
+            offset += _DELTA_FRAME.size + length
+    return root, (history.save_id, history.saves)
+
+
+class SaveService:
+    '''Writes saves on a background thread
+
+    'save' takes the snapshot (the engine's save data, arrays copied) on the calling thread, so the
+    game can carry on changing right away, and leaves compressing and writing to a single worker
+    thread, which keeps saves in order. The codecs release the GIL while they compress.
+
+    Saving the same engine to the same file again only takes a delta against the history of the
+    saves so far, see save_format.SaveHistory and the 'changed' flags of GameMap, Entity and Message.
+    A failed write fails every delta after it as well, until the next full save
+    '''
+
+    def __init__(self) -> None:
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending: Optional[Future] = None  #the latest save, done once it is on disk
+
+        #of the latest full save and the deltas since, None when the next save has to be a full one
+        self._history: Optional[save_format.SaveHistory] = None
+        self._history_of: Optional[Tuple[Engine, str]] = None
+        self._full_size = 0
+        self._delta_size = 0
+        self._checksums: Dict[str, int] = {}  #of the files written so far
+        self.checkpoint: Optional[Checkpoint] = None  #of the latest save, see action_journal
+
+        #the save ids of histories a write failed in, which no later delta may build on
+        self._failed: Set[str] = set()
+        #of the above, the worker thread fails writes and the game's thread starts saves
+        self._lock = threading.Lock()
+
+    def save(
+        self,
+        engine: Engine,
+        filename: str,
+        codec: str = save_config.SAVE_CODEC,
+        level: Optional[int] = save_config.SAVE_COMPRESSION_LEVEL,
+    ) -> Future:
+        '''Starts saving the engine to 'filename' and returns the future of the save
+
+        A delta save if the previous save was of this engine to this file, unless it is time to compact
+        '''
+        with self._lock:
+            full = self._needs_full_save(engine, filename)
+            if full:
+                #kept even without delta saves, the saves' checkpoints come from it
+                self._history, self._history_of = save_format.SaveHistory(uuid.uuid4().hex), (engine, filename)
+            history = self._history
+
+        metadata = engine.save_metadata()
+        data = save_format.dumps(engine, history=history, metadata=metadata)
+        self.checkpoint = (history.save_id, history.saves)
+        if full:
+            self._full_size, self._delta_size = len(data), 0
+        else:
+            self._delta_size += len(data)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+
+        self.pending = self._executor.submit(self._compress_and_write, filename, data, codec, level, full, history, self.checkpoint, metadata,
+        )
+        return self.pending
+
+    def needs_full_save(self, engine: Engine, filename: str) -> bool:
+        '''Whether saving the engine to 'filename' now would write a full save rather than a delta'''
+        with self._lock:
+            return self._needs_full_save(engine, filename)
+
+    def _needs_full_save(self, engine: Engine, filename: str) -> bool:
+        history = self._history
+        return (
+            history is None
+            or history.save_id in self._failed
+            or not save_config.DELTA_SAVES
+            or self._history_of != (engine, filename)
+            or history.saves > save_config.DELTAS_PER_FULL_SAVE
+            or self._delta_size > self._full_size * save_config.MAX_DELTA_SIZE_RATIO
+        )
+
+    def _compress_and_write(
+        self,
+        filename: str,
+        data: bytes,
+        codec: str,
+        level: Optional[int],
+        full: bool,
+        history: save_format.SaveHistory,
+        checkpoint: Checkpoint,
+        metadata: Dict[str, Any],
+    ) -> SavedFile:
+        try:
+            if not full:
+                with self._lock:
+                    if history.save_id in self._failed:
+                        raise OSError(f"Not saving to {filename}, an earlier save the delta builds on failed")
+            data = save_format.compress(data, codec, level)
+            if full:
+                write_atomic(filename, data)
+                #the deltas of the previous full save; load would skip them anyway
+                if os.path.exists(journal_path(filename)):
+                    os.remove(journal_path(filename))
+                checksum = zlib.crc32(data)
+            else:
+                append_delta(filename, data)
+                #CRC-32 carries on over appended data, so the checksum of the whole doesn't reread the files
+                with self._lock:
+                    previous = self._checksums.get(filename)
+                if previous is None:
+                    checksum = file_checksum(filename)
+                else:
+                    frame = _DELTA_FRAME.pack(len(data), zlib.crc32(data))
+                    checksum = zlib.crc32(data, zlib.crc32(frame, previous))
+        except BaseException:
+            #later deltas would build on this one, so they fail too and the next save is a full one
+            with self._lock:
+                self._failed.add(history.save_id)
+                self._checksums.pop(filename, None)
+            raise
+
+        with self._lock:
+            self._checksums[filename] = checksum
+        size = os.path.getsize(filename)
+        if not full:
+            size += os.path.getsize(journal_path(filename))
+        return SavedFile(filename, checkpoint, metadata, checksum, size)
+
+    def forget(self, filename: str) -> None:
+        '''Makes the next save to 'filename' a full one, e.g. after its files were deleted'''
+        with self._lock:
+            if self._history_of is not None and self._history_of[1] == filename:
+                self._history = self._history_of = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self.pending is not None and not self.pending.done()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        '''Blocks until the latest save is done, returning right away if none is in flight
+
+        Doesn't raise if the save failed, its future holds the error
+        '''
+        if self.pending is not None:
+            wait([self.pending], timeout)
+
+
+#shared by everything that saves, so waiting on it covers every save in flight
+save_service = SaveService()
@@ -0,0 +1,190 @@
+'''Save slots in the saves folder, and the index of what they hold
+
+Every slot is a save file in SAVE_DIR, "<slot>.sav", with its delta and action journals next to
+it. The index, "index.json" there, has an entry per slot with the metadata of its latest save,
+its size and its checksum; it is updated every time a save is written, so menus list the slots
+without opening any save file.
+
+Games are played in one of the game slots, which they are saved to on quitting. Every
+AUTOSAVE_INTERVAL turns they are also saved to an autosave slot: deltas go to the current
+autosave slot, and whenever a full save is due it moves on to the next one, so the other
+autosave slots keep older states of their games to roll back to
+'''
+from __future__ import annotations
+
+from concurrent.futures import Future
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+import configs.save_config as save_config
+from persistence import action_journal
+from persistence.save_service import SaveMetadata, file_checksum, remove_save, save_service, write_atomic
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+INDEX_FILE = "index.json"
+
+
+class SaveSlots:
+    '''The slots of a saves folder, and the game being played in one of them'''
+
+    def __init__(
+        self,
+        directory: str = save_config.SAVE_DIR,
+        slots: int = save_config.SAVE_SLOTS,
+        autosaves: int = save_config.AUTOSAVE_SLOTS,
+    ) -> None:
+        self.directory = directory
+        self.game_slots = [f"slot_{i}" for i in range(1, slots + 1)]
+        self.autosave_slots = [f"autosave_{i}" for i in range(1, autosaves + 1)]
+
+        self.engine: Optional[Engine] = None  #being played, autosaved, None in the menus
+        self.game_slot: Optional[str] = None  #its slot
+        self.autosave_slot: Optional[str] = None  #autosaved to last, the index has it for the next session
+
+        self._lock = threading.Lock()  #of the index file, written by the save thread and the game's
+
+    @property
+    def slots(self) -> List[str]:
+        return self.game_slots + self.autosave_slots
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def path(self, slot: str) -> str:
+        return os.path.join(self.directory, slot + ".sav")
+
+    def read_index(self) -> Dict[str, Any]:
+        '''Returns the index, {"slots": {slot: entry}, "autosave": current autosave slot}
+
+        An empty one if there is none or it can't be read. Entries hold "metadata" (see
+        Engine.save_metadata), "size", "checksum" (see save_service.SavedFile), "checkpoint" and
+        "game_slot", the game slot of the game saved there
+        '''
+        try:
+            with open(self.index_path, "rb") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if not isinstance(index, dict) or not isinstance(index.get("slots"), dict):
+            index = {"slots": {}}
+        return index
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(self.index_path, json.dumps(index, indent=1).encode())
+
+    def open(self, engine: Engine, game_slot: str) -> None:
+        '''Makes 'engine' the game played in 'game_slot', which it is saved and autosaved as, closing the one before'''
+        os.makedirs(self.directory, exist_ok=True)  #for its journal
+        if self.engine is not None and self.engine is not engine:
+            self.engine.game_world.close()
+        self.engine, self.game_slot = engine, game_slot
+
+    def close(self) -> None:
+        '''Closes the game being played, when the app exits'''
+        if self.engine is not None:
+            self.engine.game_world.close()
+        self.engine = self.game_slot = self.autosave_slot = None
+
+    def save(self, engine: Engine, slot: Optional[str] = None) -> Optional[Future]:
+        '''Starts saving the engine to a slot, by default its game slot; None if it has none
+
+        The index gets the save's entry once it is written
+        '''
+        game_slot = self.game_slot if engine is self.engine else None
+        slot = slot or game_slot
+        if slot is None:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        future = engine.save_as(self.path(slot))
+        future.add_done_callback(lambda future: self._saved(slot, game_slot or slot, future))
+        return future
+
+    def autosave(self, engine: Engine) -> Optional[Future]:
+        '''Saves the game being played to the current autosave slot, or the next one if a full save is due
+
+        None if 'engine' isn't the game being played or there are no autosave slots
+        '''
+        if engine is not self.engine or not self.autosave_slots:
+            return None
+
+        current = self.autosave_slot
+        if current is None:
+            with self._lock:
+                current = self.read_index().get("autosave")
+        if current not in self.autosave_slots:
+            current = self.autosave_slots[-1]  #so the first one is the first used
+        if save_service.needs_full_save(engine, self.path(current)):
+            current = self.autosave_slots[(self.autosave_slots.index(current) + 1) % len(self.autosave_slots)]
+        self.autosave_slot = current
+        return self.save(engine, current)
+
+    def _saved(self, slot: str, game_slot: str, future: Future) -> None:
+        '''Puts a written save in the index, on the save thread'''
+        if future.exception() is not None:
+            if slot in self.autosave_slots:
+                print(f"Failed to autosave: {future.exception()}", file=sys.stderr)
+            return
+
+        saved = future.result()
+        with self._lock:
+            index = self.read_index()
+            index["slots"][slot] = {
+                "metadata": saved.metadata,
+                "size": saved.size,
+                "checksum": saved.checksum,
+                "checkpoint": list(saved.checkpoint),
+                "game_slot": game_slot,
+            }
+            if slot in self.autosave_slots:
+                index["autosave"] = slot
+            self._write_index(index)
+
+    def remove_game(self, game_slot: str) -> None:
+        '''Deletes the game of a game slot, its autosaves and journal included, e.g. once it is over'''
+        save_service.wait()  #a save still being written would bring a file back
+        with self._lock:
+            index = self.read_index()
+            for slot, entry in list(index["slots"].items()):
+                if slot == game_slot or entry.get("game_slot") == game_slot:
+                    del index["slots"][slot]
+                    self._remove_files(slot)
+            self._remove_files(game_slot)
+            if os.path.exists(self.index_path):
+                self._write_index(index)
+
+    def _remove_files(self, slot: str) -> None:
+        path = self.path(slot)
+        remove_save(path)
+        save_service.forget(path)
+        if os.path.exists(action_journal.journal_path(path)):
+            os.remove(action_journal.journal_path(path))
+
+    def verify(self, slot: str, index: Optional[Dict[str, Any]] = None) -> bool:
+        '''Whether the files of a slot are the ones its index entry was written for'''
+        entry = (index or self.read_index())["slots"].get(slot)
+        return entry is not None and entry.get("checksum") == file_checksum(self.path(slot))
+
+    @staticmethod
+    def entry_metadata(entry: Dict[str, Any]) -> SaveMetadata:
+        '''Returns the metadata of an index entry, like save_service.read_metadata'''
+        metadata = entry.get("metadata", {})
+        return SaveMetadata(**{field: metadata.get(field) for field in SaveMetadata._fields[:-1]}, size=entry.get("size", 0))
+
+    def latest_game(self, index: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        '''Returns the game slot of the game saved last, autosaves included, None if there is none'''
+        entries = [entry for entry in (index or self.read_index())["slots"].values() if entry.get("game_slot") in self.game_slots]
+        if not entries:
+            return None
+        return max(entries, key=lambda entry: entry.get("metadata", {}).get("timestamp") or 0)["game_slot"]
+
+
+#shared like the save service, the slots of the game being played
+save_slots = SaveSlots()
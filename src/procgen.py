@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-import random
-from typing import Dict, Iterator, Tuple, List, TYPE_CHECKING
+import functools
+from typing import Callable, Dict, Optional, Tuple, List, TYPE_CHECKING
 
+import numpy as np
 import tcod
 
 import entity_factories
-from game_map import GameMap
+from game_map import ChunkedGameMap, GameMap
 import tile_types
 
 if TYPE_CHECKING:
@@ -14,16 +15,16 @@ if TYPE_CHECKING:
     from entity import Entity
 
 #in the form of (floor, max entities per floor)
-max_items_by_floor = [
+max_items_by_floor = (
     (1, 1),
     (4, 2),
-]
+)
 
-max_monsters_by_floor = [
+max_monsters_by_floor = (
     (1, 2),
     (4, 3),
     (6, 5),
-]
+)
 
 #TODO: add boss to final level
 
@@ -42,11 +43,21 @@ enemy_chances: Dict[int, List[Tuple[Entity, int]]] = {
     7: [(entity_factories.troll, 60)],
 }
 
+#every entity that can be spawned, so layouts can refer to them by index (their spawnable entity id)
+spawnable_entities: List[Entity] = list(dict.fromkeys(
+    entity
+    for chances in (item_chances, enemy_chances)
+    for weighted_entities in chances.values()
+    for entity, _ in weighted_entities
+))
+spawnable_entity_ids: Dict[Entity, int] = {entity: i for i, entity in enumerate(spawnable_entities)}
 
+
+@functools.lru_cache(maxsize=None)
 def get_max_value_for_floor(
-        max_value_by_floor: List[Tuple[int, int]], floor: int
+        max_value_by_floor: Tuple[Tuple[int, int], ...], floor: int
 ):
-    '''Gets max number of items and monsters per floor'''
+    '''Gets max number of items and monsters per floor, or any other value of a (floor, value) table'''
     current_value = 0
 
     for floor_minimum, value in max_value_by_floor:
@@ -57,34 +68,41 @@ def get_max_value_for_floor(
     return current_value
 
 
-def get_entities_at_random(
-    weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int,
-    floor: int,
-) -> List[Entity]:
-    '''Returns a list of entities given weights and floors'''
+class SpawnTable:
+    '''The weighted entity choices of one floor, compiled into cumulative weights
 
-    entity_weighted_chances = {}  #dict of final entity weights used to choose
+    All picks of a floor are then made with a single vectorized draw
+    '''
 
-    #update entity_weighted_chances based on most recent floor level
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
+    def __init__(self, weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]], floor: int) -> None:
+        entity_weighted_chances = {}  #dict of final entity weights used to choose
 
-                entity_weighted_chances[entity] = weighted_chance
+        #update entity_weighted_chances based on most recent floor level
+        for key, values in weighted_chances_by_floor.items():
+            if key > floor:
+                break
+            else:
+                for entity, weighted_chance in values:
+                    entity_weighted_chances[entity] = weighted_chance
 
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
+        self.entity_ids = np.array(
+            [spawnable_entity_ids[entity] for entity in entity_weighted_chances], dtype=np.int32
+        )
+        self.cumulative_weights = np.cumsum(list(entity_weighted_chances.values()), dtype=np.float64)
+
+    def sample(self, rng: np.random.Generator, number_of_entities: int) -> np.ndarray:
+        '''Returns the spawnable entity ids of 'number_of_entities' weighted random picks'''
+        if number_of_entities == 0 or len(self.entity_ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+
+        draws = rng.random(number_of_entities) * self.cumulative_weights[-1]
+        return self.entity_ids[np.searchsorted(self.cumulative_weights, draws, side="right")]
 
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
-    )
 
-    return chosen_entities
+@functools.lru_cache(maxsize=None)
+def get_spawn_tables(floor: int) -> Tuple[SpawnTable, SpawnTable]:
+    '''Returns the (monster, item) spawn tables of a floor, compiled once per floor'''
+    return SpawnTable(enemy_chances, floor), SpawnTable(item_chances, floor)
 
 
 class RectangularRoom: 
@@ -109,126 +127,715 @@ class RectangularRoom:
     def inner(self) -> Tuple[slice, slice]:
         '''returns inner area of the room as a 2D array index'''
         return (slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2))
+
+    @property
+    def outer(self) -> Tuple[slice, slice]:
+        '''returns the whole room including its walls as a 2D array index'''
+        return (slice(self.x1, self.x2 + 1), slice(self.y1, self.y2 + 1))
     
     def intersects(self, other: RectangularRoom) -> bool:
         '''Returns True if this room overlaps with another rectangular room'''
         return (
             self.x1 <= other.x2
             and self.x2 >= other.x1
-            and self.y1 <= self.y2
-            and self.y2 >= self.y1
+            and self.y1 <= other.y2
+            and self.y2 >= other.y1
         )
     
-def place_entities(
-        room: RectangularRoom, dungeon: GameMap, floor_number: int,
-) -> None:
-    
-    number_of_monsters = random.randint(0, get_max_value_for_floor(max_monsters_by_floor, floor_number))
-    number_of_items = random.randint(0, get_max_value_for_floor(max_items_by_floor, floor_number))
-
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number,
-    )
+def sample_spawns(
+        number_of_areas: int, floor_number: int, rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    '''Returns the spawnable entity ids spawned over 'number_of_areas' areas (rooms), and the area of each
+
+    Counts and entity picks are each drawn for every area at once.
+    Items come before monsters, as they win any fight over a tile
+    '''
+    area_indices = np.arange(number_of_areas)
+
+    number_of_monsters = rng.integers(0, get_max_value_for_floor(max_monsters_by_floor, floor_number) + 1, number_of_areas)
+    number_of_items = rng.integers(0, get_max_value_for_floor(max_items_by_floor, floor_number) + 1, number_of_areas)
+
+    monster_table, item_table = get_spawn_tables(floor_number)
+
+    entity_ids = np.concatenate((
+        item_table.sample(rng, int(number_of_items.sum())),
+        monster_table.sample(rng, int(number_of_monsters.sum())),
+    ))
+    entity_areas = np.concatenate((
+        np.repeat(area_indices, number_of_items),
+        np.repeat(area_indices, number_of_monsters),
+    ))
+    return entity_ids, entity_areas
+
+def first_spawns(
+        entity_ids: np.ndarray, xs: np.ndarray, ys: np.ndarray, entrance_location: Tuple[int, int],
+) -> np.ndarray:
+    '''Returns the (spawnable entity id, x, y) rows, keeping only the first pick of every position and nothing on the player'''
+    _, first_picks = np.unique(np.stack((xs, ys)), axis=1, return_index=True)
+    keep = np.zeros(len(entity_ids), dtype=bool)
+    keep[first_picks] = True
+    keep &= (xs != entrance_location[0]) | (ys != entrance_location[1])
+
+    return np.stack((entity_ids, xs, ys), axis=1)[keep].astype(np.int32)
 
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number,
-    )
-
-    for entity in items + monsters:
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+def place_entities(
+        rooms: List[RectangularRoom],
+        floor_number: int,
+        rng: np.random.Generator,
+        entrance_location: Tuple[int, int],
+) -> np.ndarray:
+    '''Returns the (spawnable entity id, x, y) rows of the entities spawned in all the rooms
+
+    Counts, entity picks and positions are each drawn for every room at once.
+    A position that is already taken (by the player or an earlier pick) is skipped
+    '''
+    if not rooms:
+        return np.zeros((0, 3), dtype=np.int32)
+
+    x1, y1, x2, y2 = np.array([(room.x1, room.y1, room.x2, room.y2) for room in rooms]).T
+    entity_ids, entity_rooms = sample_spawns(len(rooms), floor_number, rng)
+
+    #somewhere in the inner area of their room
+    xs = rng.integers(x1[entity_rooms] + 1, x2[entity_rooms])
+    ys = rng.integers(y1[entity_rooms] + 1, y2[entity_rooms])
+
+    return first_spawns(entity_ids, xs, ys, entrance_location)
+
+def scatter_entities(
+        open_cells: np.ndarray,
+        number_of_areas: int,
+        floor_number: int,
+        rng: np.random.Generator,
+        entrance_location: Tuple[int, int],
+) -> np.ndarray:
+    '''Returns the (spawnable entity id, x, y) rows of entities spawned anywhere on the (n, 2) 'open_cells'
+
+    For layouts without rooms, spawning as many entities as 'number_of_areas' rooms would
+    '''
+    if number_of_areas == 0 or len(open_cells) == 0:
+        return np.zeros((0, 3), dtype=np.int32)
+
+    entity_ids, _ = sample_spawns(number_of_areas, floor_number, rng)
+    picks = open_cells[rng.integers(0, len(open_cells), len(entity_ids))]
+
+    return first_spawns(entity_ids, picks[:, 0], picks[:, 1], entrance_location)
 
 def tunnel_between(
-    start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-    '''Return an L-shaped tunnel between two points'''
+    start: Tuple[int, int], end: Tuple[int, int], horizontal_first: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    '''Return an L-shaped tunnel between two points as (xs, ys) index arrays
+
+    The arrays can be used directly as a fancy index, carving the whole tunnel in one write
+    '''
 
     x1, y1 = start
     x2, y2 = end
 
-    if random.random() < 0.5:   # 50% chance
+    if horizontal_first:
         #move horizontally, then vertically
         corner_x, corner_y = x2, y1
     else: 
         #move vertically then horizontally
         corner_x, corner_y = x1, y2
 
-    #generate the coords for the tunnel through Bresenham algo
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
+    #generate the coords for the tunnel through Bresenham algo, the corner is shared by both legs
+    path = np.concatenate((
+        tcod.los.bresenham((x1, y1), (corner_x, corner_y)),
+        tcod.los.bresenham((corner_x, corner_y), (x2, y2))[1:],
+    ))
+
+    return path[:, 0], path[:, 1]
+
+
+class DungeonLayout:
+    '''The result of generating a floor, as compact arrays without any engine or entity objects
+
+    Layouts are cheap to pickle, so they can be generated in a worker process.
+    'tiles' holds tile ids (see tile_types.TILES) and 'spawns' is an (n, 3) array of
+    (spawnable entity id, x, y) rows
+    '''
+
+    def __init__(
+        self,
+        tiles: np.ndarray,
+        entrance_location: Tuple[int, int],
+        downstairs_location: Tuple[int, int],
+        spawns: np.ndarray,
+        upstairs_location: Optional[Tuple[int, int]] = None,
+        rooms_placed: int = 0,
+        rooms_attempted: int = 0,
+        regions_connected: int = 0,
+        regions_filled: int = 0,
+    ) -> None:
+        self.tiles = tiles
+        self.entrance_location = entrance_location
+        self.downstairs_location = downstairs_location
+        self.upstairs_location = upstairs_location
+        self.spawns = spawns
+
+        #generation statistics
+        self.rooms_placed = rooms_placed
+        self.rooms_attempted = rooms_attempted
+        self.regions_connected = regions_connected  #stranded regions tunnelled to by repair_connectivity
+        self.regions_filled = regions_filled  #stranded regions filled in by it
+
+
+#stranded regions smaller than this many tiles are filled in, with whatever spawned in them, instead of tunnelled to
+MIN_CONNECTED_AREA = 9
+
+def label_regions(mask: np.ndarray) -> np.ndarray:
+    '''Labels the 8-connected regions of True cells with a non-negative id per region, and -1 elsewhere
+
+    8-connected like actors walk, diagonally between two walls included, so a pocket the player
+    can step into diagonally is part of the region next to it.
+    Horizontal runs of True cells are numbered with a cumulative sum, then joined wherever they
+    touch the row below, straight or diagonally, by a vectorized union-find: each round hooks the
+    larger root of every pair still apart onto the smaller one and jumps every pointer straight
+    to its root. Working on runs instead of cells keeps the union-find to a few hundred elements
+    on a whole floor
+    '''
+    #the run of every cell, counted in Fortran order so runs go along x
+    run_starts = mask.copy()
+    run_starts[1:, :] &= ~mask[:-1, :]
+    runs = np.cumsum(run_starts.ravel(order="F"), dtype=np.int32).reshape(mask.shape, order="F") - 1
+
+    #one pair of runs per stretch where a run touches the run below it: below, below right and below left
+    upper, lower = runs[:, :-1], runs[:, 1:]
+    pairs = [
+        (mask[:, :-1] & mask[:, 1:], upper, lower),
+        (mask[:-1, :-1] & mask[1:, 1:], upper[:-1], lower[1:]),
+        (mask[1:, :-1] & mask[:-1, 1:], upper[1:], lower[:-1]),
+    ]
+    firsts, seconds = [], []
+    for touching, upper_runs, lower_runs in pairs:
+        stretch_starts = touching.copy()
+        stretch_starts[1:, :] &= ~touching[:-1, :]
+        firsts.append(upper_runs[stretch_starts])
+        seconds.append(lower_runs[stretch_starts])
+    first, second = np.concatenate(firsts), np.concatenate(seconds)
+
+    parent = np.arange(int(run_starts.sum()), dtype=np.int32)
+    while True:
+        first_roots, second_roots = parent[first], parent[second]
+        apart = first_roots != second_roots
+        if not apart.any():
+            break
+
+        #pairs that joined one region stay joined, so only the others are looked at again
+        first, second = first[apart], second[apart]
+        first_roots, second_roots = first_roots[apart], second_roots[apart]
+        np.minimum.at(parent, np.maximum(first_roots, second_roots), np.minimum(first_roots, second_roots))
+
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    if len(parent) == 0:
+        return np.full(mask.shape, -1, dtype=np.int32, order="F")  #no walkable tile at all
+    return np.where(mask, parent.take(runs, mode="clip"), -1)
+
+
+def repair_connectivity(layout: DungeonLayout) -> DungeonLayout:
+    '''Makes every walkable tile of the layout reachable from its entrance, in place
+
+    Stranded regions of at least MIN_CONNECTED_AREA tiles, and the one holding the down stairs,
+    get a tunnel from their tile nearest the entrance's region. Smaller ones are filled in and
+    what spawned in them is dropped. Floors that are connected already only pay for the labeling
+    '''
+    tiles = layout.tiles
+    walkable = tile_types.TILES["walkable"][tiles]
+    if not walkable[layout.entrance_location]:
+        return layout  #nothing was dug
+
+    labels = label_regions(walkable)
+    main = labels == labels[layout.entrance_location]
+    stranded = walkable & ~main
+    if not stranded.any():
+        return layout
+
+    region_labels, region_sizes = np.unique(labels[stranded], return_counts=True)
+    connect = (region_sizes >= MIN_CONNECTED_AREA) | (region_labels == labels[layout.downstairs_location])
+
+    tiles[np.isin(labels, region_labels[~connect])] = tile_types.WALL
+
+    if connect.any():
+        #walking distance to the entrance's region through anything, tunnels follow it downhill
+        distance = tcod.path.maxarray(tiles.shape, dtype=np.int32, order="F")
+        distance[main] = 0
+        tcod.path.dijkstra2d(distance, np.ones(tiles.shape, dtype=np.int8), 1, 0, out=distance)
+
+        #the tile of every region to connect that is nearest the entrance's region
+        xs, ys = np.nonzero(np.isin(labels, region_labels[connect]))
+        order = np.lexsort((distance[xs, ys], labels[xs, ys]))
+        _, nearest = np.unique(labels[xs, ys][order], return_index=True)
+
+        for start in zip(xs[order][nearest].tolist(), ys[order][nearest].tolist()):
+            path = tcod.path.hillclimb2d(distance, start, True, False)
+            path_tiles = tiles[path[:, 0], path[:, 1]]
+            tiles[path[:, 0], path[:, 1]] = np.where(path_tiles == tile_types.WALL, tile_types.FLOOR, path_tiles)
+
+    #drop the spawns of the regions that were filled in
+    spawns = layout.spawns
+    layout.spawns = spawns[tile_types.TILES["walkable"][tiles[spawns[:, 1], spawns[:, 2]]]]
+
+    layout.regions_connected = int(connect.sum())
+    layout.regions_filled = int((~connect).sum())
+    return layout
+
+
+def carve_rooms(
+    tiles: np.ndarray,
+    rng: np.random.Generator,
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+) -> List[RectangularRoom]:
+    '''Digs up to 'max_rooms' non-overlapping rooms into the tile ids, each tunnelled to the previous one
 
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    Returns the rooms placed, in the order they were dug
+    '''
+    map_width, map_height = tiles.shape
+    if map_width <= room_max_size or map_height <= room_max_size:
+        return []  #too small for the biggest room, e.g. a chunk cut off by the map edge
 
+    #temp structure to keep track of rooms already added for no overlap and other features
+    rooms: List[RectangularRoom] = []
 
-def generate_dungeon(
+    #tiles covered by accepted rooms (walls included), so an overlap test doesn't depend on the room count
+    occupied = np.zeros((map_width, map_height), dtype=bool, order="F")
+
+    #draw all max_room tries for new rooms at once
+    room_widths = rng.integers(room_min_size, room_max_size + 1, max_rooms)
+    room_heights = rng.integers(room_min_size, room_max_size + 1, max_rooms)
+    room_xs = rng.integers(0, map_width - room_widths)
+    room_ys = rng.integers(0, map_height - room_heights)
+    horizontal_first = rng.random(max_rooms) < 0.5   # 50% chance per tunnel
+
+    for x, y, room_width, room_height, tunnel_horizontal_first in zip(
+        room_xs.tolist(), room_ys.tolist(), room_widths.tolist(), room_heights.tolist(), horizontal_first.tolist(),
+    ):
+        new_room = RectangularRoom(x, y, room_width, room_height)
+
+        #check the occupancy bitmap for any other room under this one
+        if occupied[new_room.outer].any():
+            continue  #intersects, so onto the next attempt
+        #if there are no intersections, then room is valid
+        occupied[new_room.outer] = True
+
+        #dig out the room's inner area
+        tiles[new_room.inner] = tile_types.FLOOR
+
+        if len(rooms) > 0:
+            #all rooms after the first, dig a tunnel between this and the previous one
+            #TODO: add more interesting tunnels/dungeon features
+            tiles[tunnel_between(rooms[-1].center, new_room.center, tunnel_horizontal_first)] = tile_types.FLOOR
+
+        #append the new room to the rooms list
+        rooms.append(new_room)
+
+    return rooms
+
+
+def generate_layout(
     max_rooms: int,
     room_min_size: int,
     room_max_size: int,
     map_width: int,
     map_height: int,
-    engine: Engine
-) -> GameMap:
-    '''Generates a new dungeon map'''
+    floor_number: int,
+    seed: int,
+) -> DungeonLayout:
+    '''Generates the layout of a new dungeon floor; the same arguments always give the same layout'''
+    rng = np.random.default_rng(seed)
 
     #full wall dungeon
+    tiles = np.full((map_width, map_height), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+
+    rooms = carve_rooms(tiles, rng, max_rooms, room_min_size, room_max_size)
+
+    return layout_from_rooms(tiles, rooms, floor_number, rng, rooms_attempted=max_rooms)
+
+
+def layout_from_rooms(
+    tiles: np.ndarray,
+    rooms: List[RectangularRoom],
+    floor_number: int,
+    rng: np.random.Generator,
+    rooms_attempted: int,
+) -> DungeonLayout:
+    '''Adds the stairs and spawns to the carved tile ids of a room based floor'''
+    #the first room, where player starts
+    entrance_location = rooms[0].center if rooms else (0, 0)
+
+    #add downstairs in the last room
+    downstairs_location = rooms[-1].center if len(rooms) > 1 else (0, 0)
+    tiles[downstairs_location] = tile_types.DOWN_STAIRS
+
+    #add upstairs where the player arrives, every floor but the first leads back up
+    upstairs_location = None
+    if floor_number > 1:
+        upstairs_location = entrance_location
+        tiles[upstairs_location] = tile_types.UP_STAIRS
+
+    return repair_connectivity(DungeonLayout(
+        tiles=tiles,
+        entrance_location=entrance_location,
+        downstairs_location=downstairs_location,
+        upstairs_location=upstairs_location,
+        spawns=place_entities(rooms, floor_number, rng, entrance_location),
+        rooms_placed=len(rooms),
+        rooms_attempted=rooms_attempted,
+    ))
+
+
+def split_bsp(
+    tiles: np.ndarray,
+    rng: np.random.Generator,
+    x: int,
+    y: int,
+    width: int,
+    height: int,
+    room_min_size: int,
+    room_max_size: int,
+    rooms: List[RectangularRoom],
+) -> None:
+    '''Splits the area in two until it is about one room across, then digs a room into it
+
+    The two halves of every split are joined by a tunnel between their rooms nearest the split
+    '''
+    min_leaf = room_min_size + 1  #smallest area still fitting a room and its walls
+    can_split_x = width >= 2 * min_leaf
+    can_split_y = height >= 2 * min_leaf
+
+    #split while the area would hold two of the biggest rooms and their walls side by side
+    if (width > 2 * (room_max_size + 2) or height > 2 * (room_max_size + 2)) and (can_split_x or can_split_y):
+        #split across the longer side, so leaves stay roughly square
+        split_x = can_split_x and (not can_split_y or width > height)
+        first = len(rooms)
+
+        if split_x:
+            at = int(rng.integers(min_leaf, width - min_leaf + 1))
+            split_bsp(tiles, rng, x, y, at, height, room_min_size, room_max_size, rooms)
+            middle = len(rooms)
+            split_bsp(tiles, rng, x + at, y, width - at, height, room_min_size, room_max_size, rooms)
+        else:
+            at = int(rng.integers(min_leaf, height - min_leaf + 1))
+            split_bsp(tiles, rng, x, y, width, at, room_min_size, room_max_size, rooms)
+            middle = len(rooms)
+            split_bsp(tiles, rng, x, y + at, width, height - at, room_min_size, room_max_size, rooms)
+
+        if first < middle < len(rooms):
+            tiles[tunnel_between(rooms[middle - 1].center, rooms[middle].center, split_x)] = tile_types.FLOOR
+        return
+
+    if width < min_leaf or height < min_leaf:
+        return  #only a whole map smaller than a room can be, left all wall like generate_layout leaves it
+
+    #a leaf, dig a room of random size and position inside it
+    room_width = int(rng.integers(room_min_size, min(room_max_size, width - 1) + 1))
+    room_height = int(rng.integers(room_min_size, min(room_max_size, height - 1) + 1))
+    room = RectangularRoom(
+        x + int(rng.integers(0, width - room_width)),
+        y + int(rng.integers(0, height - room_height)),
+        room_width,
+        room_height,
+    )
+
+    tiles[room.inner] = tile_types.FLOOR
+    rooms.append(room)
+
+
+def generate_bsp_layout(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    floor_number: int,
+    seed: int,
+) -> DungeonLayout:
+    '''Generates a floor by binary space partitioning: every room gets its own part of the map
+
+    The map size, not 'max_rooms', decides how many rooms there are, and no tries are wasted on overlaps
+    '''
+    rng = np.random.default_rng(seed)
+    tiles = np.full((map_width, map_height), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+
+    rooms: List[RectangularRoom] = []
+    split_bsp(tiles, rng, 0, 0, map_width, map_height, room_min_size, room_max_size, rooms)
+
+    return layout_from_rooms(tiles, rooms, floor_number, rng, rooms_attempted=len(rooms))
+
+
+#share of the tiles starting out as wall, and the number of smoothing passes, of cave floors
+CAVE_WALL_CHANCE = 0.45
+CAVE_SMOOTHING_STEPS = 4
+
+def neighborhood_sum(mask: np.ndarray) -> np.ndarray:
+    '''Returns the number of True cells in the 3x3 neighborhood of every cell, the cell itself included
+
+    Sums nine shifted views of the padded mask, a 3x3 box convolution without any per-cell loop.
+    Cells outside the map count as True
+    '''
+    width, height = mask.shape
+    padded = np.pad(mask.astype(np.uint8), 1, constant_values=1)
+
+    total = np.zeros((width, height), dtype=np.uint8, order="F")
+    for dx in range(3):
+        for dy in range(3):
+            total += padded[dx : dx + width, dy : dy + height]
+    return total
+
+
+def generate_cave_layout(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    floor_number: int,
+    seed: int,
+) -> DungeonLayout:
+    '''Generates a cave floor with a cellular automaton on random noise
+
+    Every smoothing pass turns a tile into wall when most of its neighborhood is wall, and into floor
+    otherwise. Entities spawn as if the cave had as many rooms as fit into its floor area
+    '''
+    rng = np.random.default_rng(seed)
+
+    walls = rng.random((map_width, map_height)) < CAVE_WALL_CHANCE
+    for _ in range(CAVE_SMOOTHING_STEPS):
+        walls = neighborhood_sum(walls) >= 5
+
+    #closed off at the map edges
+    walls[[0, -1], :] = True
+    walls[:, [0, -1]] = True
+
+    #the player starts on the open tile nearest the middle, which is in the main cave more often than not
+    open_cells = np.argwhere(~walls)
+    if len(open_cells) == 0:
+        walls[map_width // 2, map_height // 2] = False
+        open_cells = np.argwhere(~walls)
+    middle_distances = np.abs(open_cells - (map_width // 2, map_height // 2)).sum(axis=1)
+    entrance_location = tuple(open_cells[np.argmin(middle_distances)].tolist())
+
+    #walking distance from the entrance, the down stairs go on the furthest reachable tile
+    distance = tcod.path.maxarray((map_width, map_height), dtype=np.int32, order="F")
+    distance[entrance_location] = 0
+    tcod.path.dijkstra2d(distance, (~walls).astype(np.int8), 1, 1, out=distance)
+    reachable = distance != np.iinfo(np.int32).max
+
+    tiles = np.where(walls, tile_types.WALL, tile_types.FLOOR).astype(np.uint8, order="F")
+
+    downstairs_location = np.unravel_index(np.argmax(np.where(reachable, distance, -1)), distance.shape)
+    downstairs_location = (int(downstairs_location[0]), int(downstairs_location[1]))
+    tiles[downstairs_location] = tile_types.DOWN_STAIRS
+
+    upstairs_location = None
+    if floor_number > 1:
+        upstairs_location = entrance_location
+        tiles[upstairs_location] = tile_types.UP_STAIRS
+
+    #a room of average size, with the walls and tunnels around it, per area
+    open_cells = np.argwhere(~walls)
+    area_per_room = 2 * ((room_min_size + room_max_size) // 2) ** 2
+
+    #pockets the player can't reach are tunnelled to, or filled in when they are tiny
+    return repair_connectivity(DungeonLayout(
+        tiles=tiles,
+        entrance_location=entrance_location,
+        downstairs_location=downstairs_location,
+        upstairs_location=upstairs_location,
+        spawns=scatter_entities(open_cells, len(open_cells) // area_per_room, floor_number, rng, entrance_location),
+    ))
+
+
+#every layout generator by name, all taking the arguments of generate_layout
+layout_generators: Dict[str, Callable[..., DungeonLayout]] = {
+    "rooms": generate_layout,
+    "bsp": generate_bsp_layout,
+    "caves": generate_cave_layout,
+}
+
+#in the form of (floor, layout generator name)
+generators_by_floor = (
+    (1, "rooms"),
+    (3, "bsp"),
+    (5, "caves"),
+)
+
+
+def build_dungeon(layout: DungeonLayout, engine: Engine) -> GameMap:
+    '''Creates the GameMap of a generated layout and moves the player to its entrance'''
+    map_width, map_height = layout.tiles.shape
+
     player = engine.player
     dungeon = GameMap(engine, map_width, map_height, entities=[player])
 
-    #temp structure to keep track of rooms already added for no overlap and other features
-    rooms: List[RectangularRoom] = []
+    dungeon.tiles[...] = tile_types.from_tile_ids(layout.tiles)
+    dungeon.entrance_location = layout.entrance_location
+    dungeon.downstairs_location = layout.downstairs_location
+    dungeon.upstairs_location = layout.upstairs_location
+
+    #the first room, where player starts
+    player.place(*layout.entrance_location, dungeon)
 
-    #keep track of where the last room is to make the stiars descending down
-    center_of_last_room = (0, 0)
+    for entity_id, x, y in layout.spawns.tolist():
+        spawnable_entities[entity_id].spawn(dungeon, x, y)
 
-    #max_room tries for new rooms
-    for r in range(max_rooms):
+    return dungeon
 
-        #new room inits
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+class ChunkGenerator:
+    '''Generates the chunks of a ChunkedGameMap; the same chunk always comes out the same
+
+    Every chunk is a small room and tunnel layout of its own. Its first room is tunnelled to a
+    crossing point on each edge it shares with another chunk, and both chunks sharing an edge
+    pick the same point, so chunks generated at different times always join up.
+    The entrance is in the top left chunk and the down stairs in the bottom right one
+    '''
+
+    def __init__(
+        self,
+        chunk_size: int,
+        max_rooms: int,
+        room_min_size: int,
+        room_max_size: int,
+        map_width: int,
+        map_height: int,
+        floor_number: int,
+        seed: int,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.max_rooms = max_rooms
+        self.room_min_size = room_min_size
+        self.room_max_size = room_max_size
+        self.map_width = map_width
+        self.map_height = map_height
+        self.floor_number = floor_number
+        self.seed = seed
+
+        #number of chunks across and down, the last ones are cut off by the map edge
+        self.chunks_wide = -(-map_width // chunk_size)
+        self.chunks_high = -(-map_height // chunk_size)
+
+        self.entrance_chunk = (0, 0)
+        self.stairs_chunk = (self.chunks_wide - 1, self.chunks_high - 1)
+
+    def chunk_shape(self, chunk_x: int, chunk_y: int) -> Tuple[int, int]:
+        return (
+            min(self.chunk_size, self.map_width - chunk_x * self.chunk_size),
+            min(self.chunk_size, self.map_height - chunk_y * self.chunk_size),
+        )
 
-        new_room = RectangularRoom(x, y, room_width, room_height)
+    def crossing(self, axis: int, chunk_x: int, chunk_y: int) -> int:
+        '''Returns where the edge after chunk (chunk_x, chunk_y) is crossed, counted along the edge
+
+        'axis' 0 is the edge to the east chunk and 1 the edge to the south chunk
+        '''
+        length = self.chunk_shape(chunk_x, chunk_y)[1 - axis]
+        rng = np.random.default_rng([self.seed, axis, chunk_x, chunk_y])
+        return min(int(rng.integers(1, max(length - 1, 2))), length - 1)  #away from the corners
+
+    def generate(self, chunk_x: int, chunk_y: int) -> DungeonLayout:
+        '''Generates the layout of one chunk, in coordinates relative to its top left corner'''
+        rng = np.random.default_rng([self.seed, 2, chunk_x, chunk_y])
+        width, height = self.chunk_shape(chunk_x, chunk_y)
+
+        tiles = np.full((width, height), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+        rooms = carve_rooms(tiles, rng, self.max_rooms, self.room_min_size, self.room_max_size)
+
+        #every tunnel out of the chunk starts at its first room
+        hub = rooms[0].center if rooms else (width // 2, height // 2)
+        tiles[hub] = tile_types.FLOOR
+
+        #(crossing point, horizontal first) of each edge shared with another chunk, entered head on
+        exits = []
+        if chunk_x > 0:
+            exits.append(((0, self.crossing(0, chunk_x - 1, chunk_y)), False))
+        if chunk_x < self.chunks_wide - 1:
+            exits.append(((width - 1, self.crossing(0, chunk_x, chunk_y)), False))
+        if chunk_y > 0:
+            exits.append(((self.crossing(1, chunk_x, chunk_y - 1), 0), True))
+        if chunk_y < self.chunks_high - 1:
+            exits.append(((self.crossing(1, chunk_x, chunk_y), height - 1), True))
+
+        for exit_location, horizontal_first in exits:
+            tiles[tunnel_between(hub, exit_location, horizontal_first)] = tile_types.FLOOR
+
+        downstairs_location = rooms[-1].center if rooms else hub
+        upstairs_location = None
+        if (chunk_x, chunk_y) == self.entrance_chunk and self.floor_number > 1:
+            upstairs_location = hub
+            tiles[upstairs_location] = tile_types.UP_STAIRS
+        if (chunk_x, chunk_y) == self.stairs_chunk:
+            tiles[downstairs_location] = tile_types.DOWN_STAIRS
+
+        return DungeonLayout(
+            tiles=tiles,
+            entrance_location=hub,
+            downstairs_location=downstairs_location,
+            upstairs_location=upstairs_location,
+            spawns=place_entities(rooms, self.floor_number, rng, hub),
+            rooms_placed=len(rooms),
+            rooms_attempted=self.max_rooms,
+        )
 
-        #run through the other rooms and see if they intersect with this one
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            continue  #intersects, so onto the next attempt
-        #if there are no intersections, then room is valid
 
-        #dig out the room's inner area
-        dungeon.tiles[new_room.inner] = tile_types.floor
-
-        if len(rooms) == 0: 
-            #the first room, where player starts
-            player.place(*new_room.center, dungeon)
-            dungeon.entrance_location = new_room.center
-        else: #all rooms after the first
-            #dig a tunnel between this and the previous one
-            #TODO: add more interesting tunnels/dungeon features
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+def build_chunked_dungeon(chunk_generator: ChunkGenerator, engine: Engine) -> ChunkedGameMap:
+    '''Creates a chunked GameMap, generating only the chunks around its entrance, and moves the player there'''
+    player = engine.player
+    dungeon = ChunkedGameMap(
+        engine, chunk_generator.map_width, chunk_generator.map_height, chunk_generator, entities=[player],
+    )
 
-            center_of_last_room = new_room.center
+    chunk_x, chunk_y = chunk_generator.entrance_chunk
+    layout = dungeon.load_chunk(chunk_x, chunk_y)
+    dungeon.entrance_location = (
+        layout.entrance_location[0] + chunk_x * chunk_generator.chunk_size,
+        layout.entrance_location[1] + chunk_y * chunk_generator.chunk_size,
+    )
 
-        #add entities
-        place_entities(new_room, dungeon, engine.game_world.current_floor)
-        
-        #add downstairs
-        dungeon.tiles[center_of_last_room] = tile_types.down_stairs  #TODO: understand why this doesn't create stairs in every room
-        dungeon.downstairs_location = center_of_last_room
+    #chunks always come out the same, so the stairs can be found without keeping their chunk
+    chunk_x, chunk_y = chunk_generator.stairs_chunk
+    downstairs_location = chunk_generator.generate(chunk_x, chunk_y).downstairs_location
+    dungeon.downstairs_location = (
+        downstairs_location[0] + chunk_x * chunk_generator.chunk_size,
+        downstairs_location[1] + chunk_y * chunk_generator.chunk_size,
+    )
 
-        #append the new room to the rooms list
-        rooms.append(new_room)
+    player.place(*dungeon.entrance_location, dungeon)
+    dungeon.load_viewport()
 
     return dungeon
 
 
+def generate_dungeon(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    engine: Engine
+) -> GameMap:
+    '''Generates a new dungeon map for the current floor of the engine's game world'''
+    floor_number = engine.game_world.current_floor
+
+    layout = generate_layout(
+        max_rooms=max_rooms,
+        room_min_size=room_min_size,
+        room_max_size=room_max_size,
+        map_width=map_width,
+        map_height=map_height,
+        floor_number=floor_number,
+        seed=engine.game_world.floor_seed(floor_number),
+    )
+
+    return build_dungeon(layout, engine)
+
+
 
 
 
@@ -245,7 +852,6 @@ def generate_dungeon(
 #     dungeon.tiles[room_2.inner] = tile_types.floor
 
 #     #carves out the tunnel between the two rooms
-#     for x, y in tunnel_between(room_2.center, room_1.center):
-#         dungeon.tiles[x, y] = tile_types.floor
+#     dungeon.tiles[tunnel_between(room_2.center, room_1.center, True)] = tile_types.floor
 
 #     return dungeon
\ No newline at end of file
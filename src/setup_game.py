@@ -1,12 +1,12 @@
 '''Handles loading and inits game session'''
 from __future__ import annotations
 
-import lzma
-import pickle
+import os
+import time
 import traceback
 
 import copy
-from typing import Optional, TYPE_CHECKING
+from typing import Callable, List, Optional, TYPE_CHECKING
 
 import tcod
 from tcod.console import Console
@@ -15,6 +15,8 @@ import configs.color as color
 from game_map import GameWorld
 from engine import Engine
 import entity_factories
+from persistence import action_journal, save_service
+from persistence.save_slots import save_slots
 import input_handlers
 from procgen import generate_dungeon
 
@@ -24,8 +26,12 @@ from procgen import generate_dungeon
 # background_image = tcod.image.load("assets/menu_background.jpeg")[:, :, :3]
 
 
-def new_game() -> Engine:
-    '''Returns new game session as an engine'''
+def new_game(seed: Optional[int] = None, pregenerate: bool = True) -> Engine:
+    '''Returns new game session as an engine
+
+    The same 'seed' gives the same game; a random one is picked if it is None.
+    'pregenerate' generates the next floor in a worker process, see GameWorld
+    '''
 
     #map vars
     map_width = 80
@@ -49,6 +55,8 @@ def new_game() -> Engine:
         room_max_size=room_max_size,
         map_width=map_width, 
         map_height=map_height,
+        seed=seed,
+        pregenerate=pregenerate,
     )
 
     #gamemap first floor
@@ -62,19 +70,125 @@ def new_game() -> Engine:
     return engine
 
 def load_game(filename: str) -> Engine:
+    '''Loads an engine containing all the info, see persistence.save_slots for the files games are saved in'''
+    engine = save_service.load(filename)  #the full save and the delta saves since
 
-    #TODO: multiple save files/multiple engines in the same file
-
-    '''Loads an engine containing all the info'''
-    #TODO: change filename into saves/filename
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
-    
     assert isinstance(engine, Engine) #post condition
     return engine
 
+def continue_game(filename: str, game_filename: Optional[str] = None) -> input_handlers.EventHandler:
+    '''Loads the saved game and replays the actions journaled after it, then keeps journaling
+
+    This recovers games that were killed before they could save, even before their first save.
+    Replaying starts from the journal's last marker whose save still holds its state, which can
+    be a newer autosave of the game than 'filename'. The game is journaled as 'game_filename',
+    'filename' by default, e.g. when rolling back to an autosave.
+    Raises FileNotFoundError if there is neither a save nor a journal to recover from
+    '''
+    entries = action_journal.read(action_journal.journal_path(filename))
+
+    engine: Optional[Engine] = None
+    loaded = {}  #by file, most markers are of the same few saves
+    for start in action_journal.markers(entries):
+        marker = entries[start]
+        if "new" in marker:
+            #a game started after the save, or the only one there is
+            engine = new_game(seed=marker["new"])
+            handler: input_handlers.EventHandler = input_handlers.AttributeSelection(engine)
+            break
+
+        path = marker.get("file", filename)
+        if path not in loaded:
+            loaded[path] = save_service.load_checkpoint(path) if os.path.exists(path) else (None, None)
+        if loaded[path][1] == tuple(marker["checkpoint"]):
+            engine = loaded[path][0]
+            handler = input_handlers.MainGameEventHandler(engine)
+            break
+
+    if engine is not None:
+        assert isinstance(engine, Engine) #post condition
+        handler = action_journal.replay(engine, entries[start + 1 :], handler)
+        entries = entries[start:]
+    else:
+        #nothing of this game to replay, it is journaled from its save on
+        if filename not in loaded:
+            loaded[filename] = save_service.load_checkpoint(filename)  #raises FileNotFoundError
+        engine, checkpoint = loaded[filename]
+        assert isinstance(engine, Engine) #post condition
+        handler = input_handlers.MainGameEventHandler(engine)
+        entries = [] if checkpoint is None else [action_journal.checkpoint_marker(engine, checkpoint, filename)]
+
+    action_journal.action_journal.start(engine, game_filename or filename, entries)
+    return handler
+
+def describe_save(metadata: save_service.SaveMetadata) -> str:
+    '''One line about a save for the menus'''
+    saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(metadata.timestamp))
+    return (
+        f"Floor {metadata.floor}, level {metadata.level}, {metadata.lives_left} lives left"
+        f" - saved {saved}, {metadata.size / 1024:.0f} KiB"
+    )
+
+def slot_name(slot: str) -> str:
+    '''"slot_1" as "Slot 1"'''
+    return slot.replace("_", " ").capitalize()
+
+def start_game(game_slot: str) -> input_handlers.EventHandler:
+    '''Starts a new game in a slot, deleting the game that was there'''
+    save_slots.remove_game(game_slot)
+    engine = new_game()
+    save_slots.open(engine, game_slot)
+    action_journal.action_journal.new_game(engine, save_slots.path(game_slot))
+    return input_handlers.AttributeSelection(engine)
+
+def load_slot(slot: str, index: dict) -> input_handlers.EventHandler:
+    '''Continues the game saved in a slot; an autosave rolls its game back to it
+
+    Raises FileNotFoundError if the slot holds no game
+    '''
+    entry = index["slots"].get(slot, {})
+    game_slot = entry.get("game_slot", slot)
+    if game_slot not in save_slots.game_slots:
+        raise FileNotFoundError(save_slots.path(slot))
+
+    handler = continue_game(save_slots.path(slot), save_slots.path(game_slot))
+    save_slots.open(handler.engine, game_slot)
+
+    if entry and not save_slots.verify(slot, index):
+        #the game was killed while saving, or the files were changed; load kept what it could read
+        handler.engine.message_log.add_message(
+            f"{slot_name(slot)} doesn't match its checksum, its latest saves may be lost.", color.error
+        )
+    return handler
+
+def open_slot(parent: input_handlers.BaseEventHandler, load: Callable[[], input_handlers.BaseEventHandler]) -> input_handlers.BaseEventHandler:
+    '''Returns the handler of a game opened by 'load', or a popup over 'parent' telling why it couldn't be'''
+    try:
+        '''TODO: note: this here creates a bug such that if player died and reloads savegame, allows 1 extra turn
+        because this returns a MainGameEventHandler instead of GameOver... fixed by deleting the savegame file after death, but can be
+        a better way, especially if we saved the game while in some other eventhandler class'''
+        return load()
+
+    except FileNotFoundError:
+        return input_handlers.PopupMessage(parent, "No saved game to load. Start a new one!")
+
+    except Exception as exc:  #any other error
+        traceback.print_exc()  # Print to stderr.
+        return input_handlers.PopupMessage(parent, f"Failed to load save:\n{exc}")
+
 class MainMenu(input_handlers.BaseEventHandler):
     '''Handle the main menu rendering and input'''
+    def __init__(self) -> None:
+        #only the index is read, so the menu shows right away however large the saves are
+        self.index = save_slots.read_index()
+        self.latest_game = save_slots.latest_game(self.index)
+
+        self.save_description: Optional[str] = None
+        if self.latest_game is not None:
+            entries = [entry for entry in self.index["slots"].values() if entry.get("game_slot") == self.latest_game]
+            latest = max(entries, key=lambda entry: entry.get("metadata", {}).get("timestamp") or 0)
+            self.save_description = describe_save(save_slots.entry_metadata(latest))
+
     def on_render(self, console: Console) -> None:
         '''Renders the main menu on a background image'''
         # console.draw_semigraphics(background_image, 0, 0)
@@ -96,7 +210,7 @@ class MainMenu(input_handlers.BaseEventHandler):
 
         menu_width = 24
         for i, text in enumerate(
-            ["[N] Play new game", "[C] Continue last game", "[Q] Quit"]
+            ["[N] Play new game", "[C] Continue last game", "[L] Load game", "[Q] Quit"]
         ):
             console.print(
                 console.width // 2,
@@ -108,6 +222,15 @@ class MainMenu(input_handlers.BaseEventHandler):
                 bg_blend=tcod.constants.BKGND_ALPH,  #check again later
             )
 
+        if self.save_description is not None:
+            console.print(
+                console.width // 2,
+                console.height // 2 + 3,
+                f"{slot_name(self.latest_game)}: {self.save_description}",
+                fg=color.menu_text,
+                alignment=tcod.constants.CENTER,
+            )
+
     def ev_keydown(
         self, event: tcod.event.KeyDown
     ) -> Optional[input_handlers.BaseEventHandler]:
@@ -116,20 +239,63 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
 
         elif event.sym == tcod.event.KeySym.c:
-            try:
-                '''TODO: note: this here creates a bug such that if player died and reloads savegame, allows 1 extra turn
-                because this returns a MainGameEventHandler instead of GameOver... fixed by deleting the savegame file after death, but can be
-                a better way, especially if we saved the game while in some other eventhandler class'''
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
-            
-            except FileNotFoundError:
+            if self.latest_game is None:
                 return input_handlers.PopupMessage(self, "No saved game to load. Start a new one!")
-            
-            except Exception as exc:  #any other error
-                traceback.print_exc()  # Print to stderr.
-                return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
+            return open_slot(self, lambda: load_slot(self.latest_game, self.index))
+
+        elif event.sym == tcod.event.KeySym.l:
+            return SlotMenu(self, save_slots.slots, "Load game")
 
         elif event.sym == tcod.event.KeySym.n:
-            return input_handlers.AttributeSelection(new_game())
+            return SlotMenu(self, save_slots.game_slots, "New game in")
+
+        return None
+
+class SlotMenu(input_handlers.BaseEventHandler):
+    '''Lists save slots from the index, to start a new game in one or load one'''
+    def __init__(self, parent: MainMenu, slots: List[str], title: str) -> None:
+        self.parent = parent  #can go back
+        self.slots = slots
+        self.title = title
+
+    @property
+    def new_game(self) -> bool:
+        return self.slots == save_slots.game_slots
+
+    def on_render(self, console: Console) -> None:
+        '''Renders the slots over the dimmed main menu, two lines each, with the letter to select them'''
+        self.parent.on_render(console)
+        console.rgb["fg"] //= 8  #dims
+        console.rgb["bg"] //= 8  #dims
+
+        width = console.width - 4
+        x, y = 2, 2
+        console.draw_frame(
+            x=x,
+            y=y,
+            width=width,
+            height=len(self.slots) * 2 + 2,
+            title=self.title,
+            clear=True,
+            fg=color.white,
+            bg=color.black,
+        )
+
+        for i, slot in enumerate(self.slots):
+            entry = self.parent.index["slots"].get(slot)
+            name = f"({chr(ord('a') + i)}) {slot_name(slot)}"
+            if entry is not None and entry.get("game_slot") != slot:
+                name = f"{name}, of {slot_name(entry['game_slot']).lower()}"
+            description = "(Empty)" if entry is None else describe_save(save_slots.entry_metadata(entry))
+
+            console.print(x + 1, y + 1 + i * 2, name)
+            console.print(x + 5, y + 2 + i * 2, description[: width - 6], fg=color.menu_text)
 
-        return None
\ No newline at end of file
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[input_handlers.BaseEventHandler]:
+        index = event.sym - tcod.event.KeySym.a
+        if 0 <= index < len(self.slots):
+            slot = self.slots[index]
+            if self.new_game:
+                return start_game(slot)
+            return open_slot(self.parent, lambda: load_slot(slot, self.parent.index))
+        return self.parent  #any other key goes back
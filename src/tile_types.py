@@ -64,4 +64,27 @@ up_stairs = new_tile(
     light=(ord("<"), (255, 255, 255), (200, 180, 50)),
 )
 #TODO: make doors (impassible and passable)
-#TODO: can make trap door
\ No newline at end of file
+#TODO: can make trap door
+
+#every tile type indexed by its tile id; compact maps store ids and expand them with from_tile_ids
+TILES = np.array([wall, floor, down_stairs, up_stairs], dtype=tile_dt)
+WALL, FLOOR, DOWN_STAIRS, UP_STAIRS = range(len(TILES))
+
+#the bytes of every tile type, gathering these is many times faster than indexing the structured TILES
+_TILE_BYTES = TILES.view(np.uint8).reshape(len(TILES), tile_dt.itemsize)
+
+def from_tile_ids(tile_ids: np.ndarray) -> np.ndarray:
+    '''Returns a Fortran ordered tile_dt array of the tiles with the given ids, the same as TILES[tile_ids]'''
+    tile_ids = np.asfortranarray(tile_ids)
+    return _TILE_BYTES.take(tile_ids.T, axis=0).view(tile_dt)[..., 0].T
+
+def to_tile_ids(tiles: np.ndarray) -> np.ndarray:
+    '''Returns the tile id of every tile of a tile_dt array, the inverse of from_tile_ids'''
+    #compared as raw bytes, comparing structured tiles field by field is many times slower
+    as_bytes = np.dtype((np.void, tile_dt.itemsize))
+    tiles, tile_types_bytes = tiles.view(as_bytes), TILES.view(as_bytes)
+
+    tile_ids = np.zeros(tiles.shape, dtype=np.uint8, order="F")
+    for tile_id, tile in enumerate(tile_types_bytes):
+        tile_ids[tiles == tile] = tile_id
+    return tile_ids
@@ -0,0 +1,86 @@
+'''Turn based timer wheel for cooldowns and status effects'''
+from __future__ import annotations
+
+from typing import Callable, List, Optional
+
+
+class Timer:
+    '''A callback scheduled to fire once, when the wheel reaches turn 'expires' '''
+
+    paused: Optional[int] = None  #the turns left while paused, see TimerWheel.pause
+
+    def __init__(self, expires: int, callback: Callable[[], None]) -> None:
+        self.expires = expires
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel:
+    '''Hashed timer wheel keyed by turn number
+
+    Timers are bucketed by expiry turn modulo the number of slots, so advancing a turn only
+    looks at the one bucket that can hold timers expiring now, instead of at every actor.
+    Delays longer than the wheel simply stay in their bucket until their turn comes around.
+    Callbacks are saved with the engine, so they must be bound methods in save_format.SAVEABLE_METHODS, and
+    flag what they change for delta saves (see Entity.mark_changed), as it may not be on the current floor
+    '''
+
+    def __init__(self, slots: int = 64) -> None:
+        self.turn = 0
+        self.slots = slots
+        self._buckets: List[List[Timer]] = [[] for _ in range(slots)]
+
+    def schedule(self, delay: int, callback: Callable[[], None]) -> Timer:
+        '''Fires 'callback' after 'delay' turns (at least 1) and returns the timer'''
+        timer = Timer(self.turn + max(1, delay), callback)
+        self._buckets[timer.expires % self.slots].append(timer)
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        '''Stops the timer from firing; it is dropped from its bucket when the bucket is next visited'''
+        timer.cancelled = True
+
+    def pause(self, timer: Timer) -> None:
+        '''Stops the timer counting down until it is resumed, e.g. while its item is unequipped
+
+        It is taken out of the wheel, keeping the turns it has left, so a paused timer can also be
+        saved away from the wheel (e.g. in a floor snapshot) and resumed in another
+        '''
+        if timer.cancelled or timer.paused is not None or timer.expires <= self.turn:
+            return
+        bucket = self._buckets[timer.expires % self.slots]
+        if timer in bucket:  #timers of floors snapshotted with their timers running aren't
+            bucket.remove(timer)
+        timer.paused = timer.expires - self.turn
+
+    def resume(self, timer: Timer) -> None:
+        '''Lets a paused timer count down again from the turns it had left'''
+        if timer.cancelled or timer.paused is None:
+            return
+        timer.expires = self.turn + timer.paused
+        timer.paused = None
+        self._buckets[timer.expires % self.slots].append(timer)
+
+    def remaining(self, timer: Timer) -> int:
+        '''Returns the number of turns until the timer fires, 0 if it already fired or was cancelled'''
+        if timer.cancelled:
+            return 0
+        if timer.paused is not None:
+            return timer.paused
+        return max(0, timer.expires - self.turn)
+
+    def advance(self) -> None:
+        '''Moves to the next turn and fires every timer expiring on it'''
+        self.turn += 1
+
+        bucket = self._buckets[self.turn % self.slots]
+        if not bucket:
+            return
+
+        due = [timer for timer in bucket if timer.expires == self.turn and not timer.cancelled]
+        #replace the bucket before firing, so callbacks can schedule into it again
+        bucket[:] = [timer for timer in bucket if timer.expires > self.turn and not timer.cancelled]
+
+        for timer in due:
+            if not timer.cancelled:  #an earlier callback may have cancelled it
+                timer.callback()
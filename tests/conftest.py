@@ -0,0 +1,28 @@
+'''Runs the tests against the modules in src, which the game imports as top level modules'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+#first, like main does: some game modules are part of an import cycle that only resolves from here
+import input_handlers  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    '''Every test runs in a directory of its own, so saves and journals never touch the real ones'''
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def engine():
+    '''A new game with its character created, floors generated on the calling process'''
+    import input_handlers
+    import setup_game
+
+    engine = setup_game.new_game(seed=1, pregenerate=False)
+    input_handlers.create_character(engine, 0, 0, 0, weapon=None, armor=None)
+    return engine
@@ -0,0 +1,147 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+import tcod
+
+import area_of_effect
+import entity_factories
+from engine import Engine
+from game_map import ChunkedLayer, GameMap, GameWorld
+from persistence import save_format
+import tile_types
+from test_deltas import play_turn
+
+
+@pytest.fixture
+def chunked_engine():
+    engine = Engine(player=copy.deepcopy(entity_factories.player))
+    engine.game_world = GameWorld(
+        engine=engine, map_width=1000, map_height=700, max_rooms=6, room_min_size=6, room_max_size=10,
+        seed=1, chunk_size=32, pregenerate=False,
+    )
+    engine.game_world.generate_floor()
+    engine.update_fov()
+    return engine
+
+
+def test_a_chunked_layer_reads_and_writes_like_an_array():
+    rng = random.Random(5)
+    layer, reference = ChunkedLayer(100, 70, 16), np.zeros((100, 70), dtype=bool)
+    for _ in range(300):
+        x1, y1 = rng.randrange(100), rng.randrange(70)
+        region = np.s_[x1 : x1 + rng.randrange(1, 30), y1 : y1 + rng.randrange(1, 30)]
+        shape = reference[region].shape
+        kind = rng.randrange(4)
+        if kind == 0:
+            value = np.array([rng.random() < 0.2 for _ in range(shape[0] * shape[1])]).reshape(shape)
+            layer[region], reference[region] = value, value
+        elif kind == 1:
+            value = rng.random() < 0.5
+            layer[region], reference[region] = value, value
+        elif kind == 2:
+            value = np.array([rng.random() < 0.1 for _ in range(shape[0] * shape[1])]).reshape(shape)
+            layer[region] |= value
+            reference[region] |= value
+        else:
+            x, y = rng.randrange(100), rng.randrange(70)
+            layer[x, y] = reference[x, y] = rng.random() < 0.5
+            assert layer[x, y] == reference[x, y]
+        np.testing.assert_array_equal(layer[region], reference[region])
+
+    np.testing.assert_array_equal(np.asarray(layer), reference)
+    np.testing.assert_array_equal(layer[:, 20:], reference[:, 20:])
+
+
+def test_a_chunked_map_only_stores_the_layers_of_chunks_seen(chunked_engine):
+    rng = random.Random(6)
+    for _ in range(100):
+        play_turn(chunked_engine, rng)
+
+    game_map = chunked_engine.game_map
+    assert 0 < len(game_map.visible.chunks) <= len(game_map.explored.chunks) <= len(game_map.chunks)
+    assert game_map.visible[chunked_engine.player.x, chunked_engine.player.y]
+    #saves hold the chunks, not map-sized arrays
+    assert len(save_format.dumps(chunked_engine)) < game_map.width * game_map.height // 8
+
+
+def test_chunked_layers_stay_writable_after_loading_and_restoring(chunked_engine):
+    rng = random.Random(7)
+    snapshot = chunked_engine.snapshot()
+    explored = np.asarray(chunked_engine.game_map.explored)
+    for _ in range(50):
+        play_turn(chunked_engine, rng)
+
+    chunked_engine.restore(snapshot)
+    np.testing.assert_array_equal(np.asarray(chunked_engine.game_map.explored), explored)
+    loaded = save_format.loads(save_format.dumps(chunked_engine))
+    np.testing.assert_array_equal(np.asarray(loaded.game_map.explored), explored)
+
+    for engine in (chunked_engine, loaded):
+        for _ in range(20):
+            play_turn(engine, rng)  #writes into the chunks restored or loaded
+        assert engine.game_map.visible[engine.player.x, engine.player.y]
+
+
+def test_paths_on_dense_maps_search_the_whole_map(engine):
+    game_map = GameMap(engine, 30, 60)
+    game_map.tiles[1:-1, 1:-1] = tile_types.floor
+    game_map.tiles[10, :55] = tile_types.wall  #the way around is far longer than the ends are apart
+    orc = entity_factories.orc.spawn(game_map, 8, 5)
+
+    path = orc.ai.get_path_to(12, 5)
+    assert path[-1] == (12, 5) and len(path) > 90
+
+    game_map.path_margin = 16  #as on chunked maps
+    assert orc.ai.get_path_to(12, 5) == []
+
+
+def full_map_mask(game_map, inside):
+    return np.array([[inside(x, y) for y in range(game_map.height)] for x in range(game_map.width)])
+
+
+def check_area(game_map, area, reference):
+    x1, y1, x2, y2 = area.bounds
+    assert 0 <= x1 <= x2 <= game_map.width and 0 <= y1 <= y2 <= game_map.height
+    full = np.zeros((game_map.width, game_map.height), dtype=bool)
+    full[x1:x2, y1:y2] = area.mask
+    np.testing.assert_array_equal(full, reference)
+
+    assert area_of_effect.get_actors_in_area(game_map, area) == [
+        actor for actor in game_map.actors if reference[actor.x, actor.y]
+    ]
+
+
+def test_areas_cover_their_bounding_box_only(engine):
+    game_map = engine.game_map
+    rng = random.Random(8)
+    for _ in range(30):
+        cx, cy = rng.randrange(-3, game_map.width + 3), rng.randrange(-3, game_map.height + 3)
+        tx, ty = rng.randrange(game_map.width), rng.randrange(game_map.height)
+        radius = rng.randrange(1, 8)
+
+        check_area(
+            game_map,
+            area_of_effect.circle_area(game_map, (cx, cy), radius),
+            full_map_mask(game_map, lambda x, y: (x - cx) ** 2 + (y - cy) ** 2 <= radius ** 2),
+        )
+
+        if not game_map.in_bounds(cx, cy) or (cx, cy) == (tx, ty):
+            continue
+        aim = np.arctan2(ty - cy, tx - cx)
+        check_area(
+            game_map,
+            area_of_effect.cone_area(game_map, (cx, cy), (tx, ty), radius),
+            full_map_mask(game_map, lambda x, y: (
+                (x, y) != (cx, cy)
+                and (x - cx) ** 2 + (y - cy) ** 2 <= radius ** 2
+                and abs((np.arctan2(y - cy, x - cx) - aim + np.pi) % (2 * np.pi) - np.pi) <= np.pi / 4
+            )),
+        )
+        line = {tuple(point) for point in tcod.los.bresenham((cx, cy), (tx, ty))[1:].tolist()}
+        check_area(
+            game_map,
+            area_of_effect.line_area(game_map, (cx, cy), (tx, ty)),
+            full_map_mask(game_map, lambda x, y: (x, y) in line),
+        )
@@ -0,0 +1,95 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+import procgen
+import tile_types
+
+NEIGHBORS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+def bfs_regions(mask):
+    '''The 8-connected regions of 'mask' as a set of frozensets of cells, found one flood fill at a time'''
+    width, height = mask.shape
+    seen = np.zeros_like(mask)
+    regions = set()
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        region, queue = [], deque([start])
+        while queue:
+            x, y = queue.popleft()
+            region.append((int(x), int(y)))
+            for dx, dy in NEIGHBORS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height and mask[nx, ny] and not seen[nx, ny]:
+                    seen[nx, ny] = True
+                    queue.append((nx, ny))
+        regions.add(frozenset(region))
+    return regions
+
+
+def labeled_regions(labels):
+    regions = {}
+    for x, y in zip(*np.nonzero(labels >= 0)):
+        regions.setdefault(labels[x, y], []).append((int(x), int(y)))
+    return {frozenset(region) for region in regions.values()}
+
+
+def reachable_from(walkable, start):
+    return next(region for region in bfs_regions(walkable) if start in region)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_labels_match_a_flood_fill(seed):
+    rng = np.random.default_rng(seed)
+    shape = (int(rng.integers(1, 40)), int(rng.integers(1, 40)))
+    mask = np.asfortranarray(rng.random(shape) < rng.uniform(0.2, 0.7))
+
+    labels = procgen.label_regions(mask)
+    assert (labels[~mask] == -1).all()
+    assert labeled_regions(labels) == bfs_regions(mask)
+
+
+def test_diagonal_steps_join_regions():
+    mask = np.zeros((4, 4), dtype=bool, order="F")
+    mask[0, 0] = mask[1, 1] = mask[3, 0] = mask[2, 1] = True
+    assert labeled_regions(procgen.label_regions(mask)) == {frozenset({(0, 0), (1, 1), (2, 1), (3, 0)})}
+
+
+@pytest.mark.parametrize("generator", sorted(procgen.layout_generators))
+@pytest.mark.parametrize("floor", [1, 3, 6])
+def test_every_walkable_tile_is_reachable_from_the_entrance(generator, floor):
+    for seed in range(4):
+        layout = procgen.layout_generators[generator](
+            max_rooms=30, room_min_size=6, room_max_size=10, map_width=80, map_height=43,
+            floor_number=floor, seed=seed,
+        )
+        walkable = tile_types.TILES["walkable"][layout.tiles]
+        reachable = reachable_from(walkable, layout.entrance_location)
+
+        assert len(reachable) == walkable.sum()
+        assert layout.downstairs_location in reachable
+        assert all((x, y) in reachable for _, x, y in layout.spawns.tolist())
+
+
+def test_stranded_regions_are_tunnelled_to_or_filled_in():
+    tiles = np.full((30, 12), tile_types.WALL, dtype=np.uint8, order="F")
+    tiles[1:6, 1:6] = tile_types.FLOOR  #the entrance's room
+    tiles[20:25, 1:6] = tile_types.FLOOR  #a room far enough away to keep
+    tiles[10, 10] = tile_types.FLOOR  #a pocket too small to keep
+    tiles[27, 1] = tile_types.DOWN_STAIRS  #kept however small
+    spawns = np.array([[0, 10, 10], [0, 22, 3]], dtype=np.int32)
+    layout = procgen.DungeonLayout(tiles, (2, 2), (27, 1), spawns)
+
+    procgen.repair_connectivity(layout)
+
+    walkable = tile_types.TILES["walkable"][layout.tiles]
+    reachable = reachable_from(walkable, (2, 2))
+    assert len(reachable) == walkable.sum()
+    assert (22, 3) in reachable and (27, 1) in reachable
+    assert layout.tiles[10, 10] == tile_types.WALL
+    assert layout.spawns.tolist() == [[0, 22, 3]]
+    assert (layout.regions_connected, layout.regions_filled) == (2, 1)
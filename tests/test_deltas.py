@@ -0,0 +1,94 @@
+import random
+
+import actions
+import exceptions
+from persistence import save_format
+
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+def play_turn(engine, rng):
+    '''A turn of the game with a random bump, the player kept alive'''
+    player = engine.player
+    player.fighter.hp = player.fighter.max_hp
+    try:
+        actions.BumpAction(player, *rng.choice(DIRECTIONS)).perform()
+    except exceptions.Impossible:
+        return
+    engine.handle_enemy_turns()
+    engine.update_fov()
+    engine.timers.advance()
+
+
+def walkable_direction(engine):
+    player = engine.player
+    for dx, dy in DIRECTIONS:
+        x, y = player.x + dx, player.y + dy
+        if engine.game_map.is_walkable(x, y) and engine.game_map.get_blocking_entity_at_location(x, y) is None:
+            return dx, dy
+    raise AssertionError("the player is walled in")
+
+
+def state(engine):
+    '''The saved state of a game, as a full save without its 'changed' flags and caches'''
+    objects = save_format.take_snapshot(engine).objects
+    flags = [(obj, obj.changed) for obj in objects if "changed" in vars(obj)]
+    for obj, _ in flags:
+        obj.changed = True
+    for obj in objects:
+        if hasattr(obj, "invalidate_stats"):
+            obj.invalidate_stats()
+        if hasattr(obj, "plain_text"):
+            obj.plain_text  #cached on first read
+    data = save_format.dumps(engine)
+
+    for obj, changed in flags:  #left as they were for the deltas to come
+        obj.changed = changed
+    return data
+
+
+def test_a_delta_after_one_move_is_much_smaller_than_the_full_save(engine):
+    rng = random.Random(1)
+    for turn in range(300):
+        play_turn(engine, rng)
+        if turn % 100 == 99:
+            engine.game_world.generate_floor()  #a few live floors, like a game some way in
+
+    history = save_format.SaveHistory("test")
+    full = save_format.dumps(engine, history=history)
+    engine.player.move(*walkable_direction(engine))
+    engine.update_fov()
+    delta = save_format.dumps(engine, history=history)
+
+    assert len(delta) * 5 < len(full)
+    #the current floor's own record is saved again, but none of its other entities
+    header, _ = save_format.read_header(delta)
+    records = {name: len(indices) for name, _, indices, _ in header["groups"]}
+    assert records["game_map.GameMap"] == 1
+    assert records["entity.Actor"] == 1
+    assert "entity.ConsumableItem" not in records
+
+
+def test_a_delta_without_changes_saves_no_floor(engine):
+    history = save_format.SaveHistory("test")
+    save_format.dumps(engine, history=history)
+    delta = save_format.dumps(engine, history=history)
+
+    header, _ = save_format.read_header(delta)
+    saved = {name for name, _, _, _ in header["groups"]}
+    assert "game_map.GameMap" not in saved and "entity.Actor" not in saved
+
+
+def test_deltas_load_like_a_full_save(engine):
+    rng = random.Random(2)
+    history, loaded_history = save_format.SaveHistory("test"), save_format.SaveHistory("test")
+    loaded = save_format.loads(bytearray(save_format.dumps(engine, history=history)), history=loaded_history)
+
+    for turn in range(300):
+        play_turn(engine, rng)
+        if turn == 150:
+            engine.game_world.generate_floor()  #entities move between floors
+        if turn % 5 == 0:
+            #every save, so a change a delta misses shows up before later changes cover it
+            save_format.loads(bytearray(save_format.dumps(engine, history=history)), history=loaded_history)
+            assert state(loaded) == state(engine), turn
@@ -0,0 +1,84 @@
+import math
+import random
+
+import numpy as np
+
+import actions
+import entity_factories
+from persistence import save_format
+from test_deltas import play_turn
+
+
+def brute_force_in_range(game_map, x, y, max_range, fov=None, exclude=None):
+    '''get_actors_in_range as a scan of every entity'''
+    found = [
+        actor for actor in game_map.actors
+        if actor is not exclude
+        and math.hypot(actor.x - x, actor.y - y) <= max_range
+        and (fov is None or fov[actor.x, actor.y])
+    ]
+    return sorted(found, key=lambda actor: (actor.x - x) ** 2 + (actor.y - y) ** 2)
+
+
+def check_queries(game_map, rng):
+    everything = np.ones((game_map.width, game_map.height), dtype=bool)
+    for _ in range(50):
+        x, y = rng.randrange(game_map.width), rng.randrange(game_map.height)
+        max_range = rng.choice([0, 1, 2.5, 5, 8.9, 30])
+        assert game_map.get_actors_in_range(x, y, max_range, visible_only=False) == brute_force_in_range(
+            game_map, x, y, max_range,
+        )
+        assert game_map.get_actors_in_range(x, y, max_range) == brute_force_in_range(
+            game_map, x, y, max_range, fov=game_map.visible,
+        )
+        assert game_map.get_actors_in_range(x, y, max_range, fov=everything, k=2) == brute_force_in_range(
+            game_map, x, y, max_range,
+        )[:2]
+
+        x1, y1 = rng.randrange(game_map.width), rng.randrange(game_map.height)
+        x2, y2 = x1 + rng.randrange(1, 40), y1 + rng.randrange(1, 40)
+        assert game_map.entities.in_region(x1, y1, x2, y2) == [
+            entity for entity in game_map.entities if x1 <= entity.x < x2 and y1 <= entity.y < y2
+        ]
+
+
+def test_queries_match_a_scan_while_entities_move(engine):
+    rng = random.Random(3)
+    for turn in range(200):
+        play_turn(engine, rng)
+        if turn == 100:
+            engine.game_world.generate_floor()
+        if turn % 20 == 0:
+            check_queries(engine.game_map, rng)
+
+
+def test_queries_after_loading_and_restoring(engine):
+    rng = random.Random(4)
+    check_queries(engine.game_map, rng)  #builds the buckets
+
+    loaded = save_format.loads(save_format.dumps(engine))
+    check_queries(loaded.game_map, rng)
+
+    snapshot = engine.snapshot()
+    for _ in range(30):
+        play_turn(engine, rng)
+    check_queries(engine.game_map, rng)
+    engine.restore(snapshot)
+    check_queries(engine.game_map, rng)
+
+
+def test_lightning_reaches_actors_closer_than_its_range_plus_one(engine):
+    game_map = engine.game_map
+    for entity in list(game_map.actors):
+        if entity is not engine.player:
+            game_map.entities.remove(entity)
+    engine.player.place(40, 20)
+    game_map.visible[:] = True
+
+    near = entity_factories.orc.spawn(game_map, 45, 23)  #5.83 away
+    far = entity_factories.orc.spawn(game_map, 34, 20)  #6 away
+    scroll = entity_factories.lightning_scroll.spawn(game_map, 40, 20)
+
+    actions.ConsumableItemAction(engine.player, scroll).perform()
+    assert near.fighter.hp < near.fighter.max_hp
+    assert far.fighter.hp == far.fighter.max_hp
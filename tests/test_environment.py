@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from environment import ACTIONS, PLAYER_STATS, RLGameEnv
+
+
+def episode(env, seed, steps=300):
+    '''The observations, rewards and ends of an episode of sampled actions, copied out of the env's arrays'''
+    observation, _ = env.reset(seed=seed)
+    trace = [(observation["stats"].copy(), observation["layers"].copy())]
+    for _ in range(steps):
+        observation, reward, terminated, truncated, _ = env.step(env.sample_action())
+        trace.append((observation["stats"].copy(), observation["layers"].copy(), reward, terminated, truncated))
+        if terminated or truncated:
+            break
+    return trace
+
+
+def same_episodes(first, second):
+    return len(first) == len(second) and all(
+        all(np.array_equal(a, b) for a, b in zip(step, other_step)) for step, other_step in zip(first, second)
+    )
+
+
+@pytest.mark.parametrize("crop", [None, 6])
+def test_the_same_seed_plays_the_same_episode(crop):
+    env = RLGameEnv(max_steps=300, crop=crop)
+    first = episode(env, 3)
+    assert same_episodes(episode(env, 3), first)  #from an env that played before
+    assert same_episodes(episode(RLGameEnv(max_steps=300, crop=crop), 3), first)
+    assert not same_episodes(episode(env, 4), first)
+    env.close()
+
+
+def test_steps_follow_the_gymnasium_api():
+    env = RLGameEnv(max_steps=5, crop=4)
+    observation, info = env.reset(seed=1)
+    assert observation["stats"].shape == (len(PLAYER_STATS),)
+    assert observation["layers"].shape[1:] == (9, 9)
+    assert info["steps"] == 0 and env.action_count == len(ACTIONS)
+
+    results = [env.step(ACTIONS.index("wait")) for _ in range(5)]
+    assert all(len(result) == 5 for result in results)
+    assert [result[3] for result in results] == [False] * 4 + [True]  #truncated at max_steps
+    assert results[0][4]["turn_taken"]
+    with pytest.raises(RuntimeError):
+        env.step(0)
+
+    env.reset(seed=1)
+    with pytest.raises(ValueError):
+        env.step(len(ACTIONS))
+    env.close()
@@ -0,0 +1,87 @@
+import functools
+import random
+
+import pytest
+
+import actions
+import input_handlers
+from persistence import action_journal
+from persistence.action_journal import JournalError
+import setup_game
+from test_deltas import DIRECTIONS
+from test_snapshot import game_state
+
+CHARACTER = {"hp_points": 0, "power_points": 0, "defense_points": 0, "weapon": "dagger", "armor": None}
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    '''The shared journal, flushed by tests when they need it and closed after them'''
+    journal = action_journal.action_journal
+    monkeypatch.setattr(journal, "flush_interval", 60)
+    monkeypatch.setattr(setup_game, "new_game", functools.partial(setup_game.new_game, pregenerate=False))
+    yield journal
+    journal.close()
+
+
+def start(journal):
+    engine = setup_game.new_game(seed=5)
+    journal.new_game(engine, "game.sav")
+    journal.record(engine, {"character": CHARACTER})
+    input_handlers.create_character(engine, **CHARACTER)
+    return engine
+
+
+def play(engine, rng, turns):
+    '''Plays random moves, picking things up now and then, as long as the player is alive'''
+    for _ in range(turns):
+        action = actions.PickupAction(engine.player) if rng.random() < 0.1 else actions.BumpAction(
+            engine.player, *rng.choice(DIRECTIONS),
+        )
+        handler = input_handlers.MainGameEventHandler(engine).play_turn(action)
+        if not isinstance(handler, input_handlers.MainGameEventHandler):
+            break
+
+
+def test_a_game_killed_before_its_first_save_is_replayed(journal):
+    engine = start(journal)
+    play(engine, random.Random(1), 60)
+    journal.flush()
+
+    recovered = setup_game.continue_game("game.sav").engine
+    assert recovered.timers.turn > 0
+    assert game_state(recovered) == game_state(engine)
+
+
+def test_replays_start_from_the_last_save(journal):
+    engine = start(journal)
+    rng = random.Random(2)
+    play(engine, rng, 30)
+    engine.save_as("game.sav").result()
+    journal.flush()
+    entries = action_journal.read(action_journal.journal_path("game.sav"))
+    assert "checkpoint" in entries[0] and len(entries) == 1  #restarted at the save's marker
+
+    play(engine, rng, 30)
+    journal.flush()
+    assert game_state(setup_game.continue_game("game.sav").engine) == game_state(engine)
+
+
+def test_a_torn_last_line_is_left_out(journal):
+    engine = start(journal)
+    play(engine, random.Random(3), 30)
+    journal.flush()
+    expected = game_state(engine)
+
+    with open(action_journal.journal_path("game.sav"), "a") as f:
+        f.write('{"action": ["BumpAct')
+    assert game_state(setup_game.continue_game("game.sav").engine) == expected
+
+
+def test_entries_that_are_not_actions_are_refused(engine):
+    with pytest.raises(JournalError):
+        action_journal.decode_action(["Engine", {}], engine)
+    with pytest.raises(JournalError):
+        action_journal.decode_action(["BumpAction", {"entity": {"#item": 99}}], engine)
+    with pytest.raises(JournalError):
+        action_journal.replay(engine, [{"level_up": "__init__"}], None)
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+import json
+import random
+
+import numpy as np
+import pytest
+
+import configs.save_config as save_config
+from persistence import save_format
+from persistence.save_format import SaveFormatError
+
+
+def crafted(records, groups=(), objects=0, arrays=()):
+    '''Save data with the given records JSON, as a crafted file would hold'''
+    data = json.dumps(records).encode()
+    header = {
+        "version": save_format.VERSION,
+        "codec": "none",
+        "objects": objects,
+        "groups": list(groups),
+        "records": len(data),
+        "arrays": list(arrays),
+    }
+    return save_format._pack(header, [data])
+
+
+def test_values_round_trip():
+    rng = random.Random(7)
+    value = {
+        "tuple": (1, "a", None),
+        "tuple keys": {(1, 2): 3, 4.5: True},
+        "tag like key": {"#r": 1},
+        "ordered": OrderedDict([(2, "b"), (1, "a")]),
+        "set": {1, 2, 3},
+        "bytes": b"\x00\x01\xff",
+        "slice": slice(1, 10, 2),
+        "rng": rng,
+        "c array": np.arange(12, dtype=np.int16).reshape(3, 4),
+        "f array": np.asfortranarray(np.arange(12.0).reshape(3, 4)),
+        "structured": np.zeros(3, dtype=[("a", np.uint8), ("b", np.float32)]),
+        "number": np.int64(5),
+    }
+
+    loaded = save_format.loads(save_format.dumps(value))
+
+    for key in ("tuple", "tuple keys", "tag like key", "set", "bytes", "slice"):
+        assert loaded[key] == value[key]
+    assert type(loaded["ordered"]) is OrderedDict and list(loaded["ordered"].items()) == [(2, "b"), (1, "a")]
+    assert loaded["rng"].random() == rng.random()
+    for key in ("c array", "f array", "structured"):
+        assert loaded[key].dtype == value[key].dtype
+        np.testing.assert_array_equal(loaded[key], value[key])
+    assert loaded["f array"].flags.f_contiguous
+    assert loaded["number"] == 5 and type(loaded["number"]) is int
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "lzma"])
+def test_engine_round_trip(engine, codec):
+    loaded = save_format.loads(save_format.dumps(engine, codec=codec))
+
+    assert (loaded.player.x, loaded.player.y) == (engine.player.x, engine.player.y)
+    assert loaded.player.fighter.hp == engine.player.fighter.hp
+    assert loaded.player.gamemap is loaded.game_map
+    assert sorted((e.name, e.x, e.y) for e in loaded.game_map.entities) == sorted(
+        (e.name, e.x, e.y) for e in engine.game_map.entities
+    )
+    np.testing.assert_array_equal(loaded.game_map.explored, engine.game_map.explored)
+    np.testing.assert_array_equal(loaded.game_map.tiles, engine.game_map.tiles)
+    assert [m.full_text for m in loaded.message_log.messages] == [m.full_text for m in engine.message_log.messages]
+
+
+def test_floor_snapshot_dir_comes_from_the_config(engine, tmp_path, monkeypatch):
+    floors = engine.game_world.floors
+    floors.snapshot_dir = str(tmp_path / "crafted")
+
+    loaded = save_format.loads(save_format.dumps(engine))
+    assert loaded.game_world.floors.snapshot_dir == save_config.SNAPSHOT_DIR
+
+    monkeypatch.setattr(save_config, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    loaded = save_format.loads(save_format.dumps(engine))
+    assert loaded.game_world.floors.snapshot_dir == str(tmp_path / "snapshots")
+
+
+def test_floors_whose_snapshot_file_is_gone_are_generated_anew(engine, tmp_path):
+    floors = engine.game_world.floors
+    floors.snapshot_dir = str(tmp_path)
+    floors.live_capacity = 1
+    first_floor = engine.game_world.current_floor
+    engine.game_world.generate_floor()
+    assert floors.snapshots == {first_floor: None}
+
+    floors.snapshot_dir = None
+    assert floors.get(first_floor, engine) is None
+    assert first_floor not in floors
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"RLGSAVE\n",
+    b"not a save at all",
+    b"RLGSAVE\n\x05\x00\x00\x00{\"ver",
+    b"RLGSAVE\n\x02\x00\x00\x00[]",
+])
+def test_garbage_is_not_a_save(data):
+    with pytest.raises(SaveFormatError):
+        save_format.loads(data)
+
+
+def test_truncated_saves_raise(engine):
+    data = save_format.dumps(engine)
+    for length in (len(data) // 3, len(data) // 2, len(data) * 3 // 4):
+        with pytest.raises(SaveFormatError):
+            save_format.loads(data[:length])
+
+
+def test_corrupt_compressed_body_raises(engine):
+    data = bytearray(save_format.dumps(engine, codec="zlib"))
+    data[-10:] = bytes(10)
+    with pytest.raises(SaveFormatError):
+        save_format.loads(data)
+
+
+def test_newer_versions_raise():
+    data = crafted([[], 1])
+    data = data.replace(b'"version":%d' % save_format.VERSION, b'"version":%d' % (save_format.VERSION + 1))
+    with pytest.raises(SaveFormatError, match="newer version"):
+        save_format.loads(data)
+
+
+def test_well_formed_crafted_saves_load():
+    assert save_format.loads(crafted([[], {"#d": [[{"#t": [1, 2]}, 3]]}])) == {(1, 2): 3}
+    assert save_format.loads(crafted([[], {"#s": [1, "a"]}])) == {1, "a"}
+
+
+@pytest.mark.parametrize("root", [
+    {"#d": [[[1, 2], 3]]},  #list key
+    {"#d": [[{"a": 1}, 3]]},  #dict key
+    {"#o": [[[1], 3]]},
+    {"#d": [[1, 2, 3]]},  #not a pair
+    {"#d": 5},
+    {"#s": [[1, 2]]},  #list item
+    {"#s": [{"#t": [[1], 2]}]},  #tuple holding a list
+    {"#s": "abc"},
+    {"#t": 5},
+    {"#r": 0},  #no records
+    {"#r": -1},
+    {"#p": 0},  #no history
+    {"#a": 3},  #no arrays
+    {"#sl": [1, 2, 3, 4]},
+    {"#rng": [1, 2]},
+    {"#e": ["configs.render_order.RenderOrder", 99]},
+    {"#e": ["os.system", "ls"]},
+    {"#x": "engine"},  #no externals
+    {"#zz": 1},  #unknown tag
+])
+def test_crafted_values_raise(root):
+    with pytest.raises(SaveFormatError):
+        save_format.loads(crafted([[], root]))
+
+
+def test_crafted_records_raise():
+    #classes outside SAVEABLE_MODULES
+    with pytest.raises(SaveFormatError, match="not a saveable class"):
+        save_format.loads(crafted([[[]], {"#r": 0}], groups=[["subprocess.Popen", [], [0], []]], objects=1))
+    #a record index past the record count
+    with pytest.raises(SaveFormatError):
+        save_format.loads(crafted([[[]], None], groups=[["entity.Entity", [], [3], []]], objects=1))
+    #records no group creates
+    with pytest.raises(SaveFormatError):
+        save_format.loads(crafted([[], {"#r": 1}], groups=[["entity.Entity", [], [0], []]], objects=2))
+    #a record count far beyond the data
+    with pytest.raises(SaveFormatError):
+        save_format.loads(crafted([[], None], objects=10 ** 12))
+
+
+def test_crafted_methods_raise():
+    groups = [["entity.Entity", [], [0], []]]
+    with pytest.raises(SaveFormatError, match="not a saveable method"):
+        save_format.loads(crafted([[], {"#m": [{"#r": 0}, "place"]}], groups=groups, objects=1))
+    with pytest.raises(SaveFormatError, match="not a saveable method"):
+        save_format.loads(crafted([[], {"#m": [{"#r": 0}, "__class__"]}], groups=groups, objects=1))
+
+
+def test_unsaveable_values_raise_on_save():
+    with pytest.raises(TypeError):
+        save_format.dumps(object())
+    with pytest.raises(TypeError):
+        save_format.dumps(np.array([object()]))
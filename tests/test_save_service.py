@@ -0,0 +1,49 @@
+import pytest
+
+from persistence import save_service
+
+
+def test_saves_after_the_first_are_deltas(engine):
+    service = save_service.SaveService()
+    assert service.needs_full_save(engine, "game.sav")
+    service.save(engine, "game.sav").result()
+
+    assert not service.needs_full_save(engine, "game.sav")
+    service.save(engine, "game.sav").result()
+
+    loaded, checkpoint = save_service.load_checkpoint("game.sav")
+    assert checkpoint == service.checkpoint
+    assert (loaded.player.x, loaded.player.y) == (engine.player.x, engine.player.y)
+
+
+def test_a_failed_delta_fails_the_deltas_after_it(engine, monkeypatch):
+    service = save_service.SaveService()
+    service.save(engine, "game.sav").result()
+
+    append_delta = save_service.append_delta
+    calls = []
+
+    def fail_once(filename, data):
+        calls.append(filename)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        append_delta(filename, data)
+
+    monkeypatch.setattr(save_service, "append_delta", fail_once)
+
+    failed = service.save(engine, "game.sav")
+    built_on_it = service.save(engine, "game.sav")
+    with pytest.raises(OSError, match="disk full"):
+        failed.result()
+    with pytest.raises(OSError, match="earlier save"):
+        built_on_it.result()
+    assert len(calls) == 1  #never appended
+
+    #the next save starts over with a full one, and deltas follow it again
+    assert service.needs_full_save(engine, "game.sav")
+    service.save(engine, "game.sav").result()
+    service.save(engine, "game.sav").result()
+    assert len(calls) == 2
+
+    _, checkpoint = save_service.load_checkpoint("game.sav")
+    assert checkpoint == service.checkpoint
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+import setup_game
+from test_deltas import play_turn
+
+
+def game_state(engine):
+    world = engine.game_world
+    return (
+        (engine.player.x, engine.player.y),
+        engine.player.fighter.hp,
+        engine.timers.turn,
+        world.current_floor,
+        {key: rng.getstate() for key, rng in world._rngs.items()},
+        sorted((entity.name, entity.x, entity.y) for entity in engine.game_map.entities),
+        len(engine.message_log.messages),
+    )
+
+
+def test_restore_brings_back_the_state_of_the_snapshot(engine):
+    rng = random.Random(9)
+    for _ in range(20):
+        play_turn(engine, rng)
+    engine.game_world.rng("ai").random()  #a stream drawn from before the snapshot
+    player, game_map = engine.player, engine.game_map
+    snapshot = engine.snapshot()
+    expected = game_state(engine)
+
+    for rollout in range(3):  #any number of times
+        for _ in range(30):
+            play_turn(engine, rng)
+        engine.player.fighter.hp -= 1
+        engine.game_world.rng("respawn").random()  #a stream created after the snapshot
+        if rollout == 1:
+            engine.game_world.generate_floor()
+        assert game_state(engine) != expected
+
+        engine.restore(snapshot)
+        assert game_state(engine) == expected
+        assert engine.player is player and engine.game_map is game_map
+
+
+def test_restore_continues_the_random_streams(engine):
+    snapshot = engine.snapshot()
+    draws = [engine.game_world.rng("ai").random() for _ in range(5)]
+
+    engine.restore(snapshot)
+    assert [engine.game_world.rng("ai").random() for _ in range(5)] == draws
+
+
+def test_snapshots_of_other_engines_are_refused(engine):
+    other = setup_game.new_game(seed=2, pregenerate=False)
+    with pytest.raises(ValueError):
+        engine.restore(other.snapshot())
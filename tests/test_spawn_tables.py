@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import entity_factories
+import procgen
+
+
+def weights(table):
+    '''The weight of each entity in the table, taken back out of its cumulative weights'''
+    entities = [procgen.spawnable_entities[entity_id] for entity_id in table.entity_ids.tolist()]
+    return dict(zip(entities, np.diff(table.cumulative_weights, prepend=0).tolist()))
+
+
+def test_tables_take_the_latest_weight_of_each_entity_up_to_the_floor():
+    assert weights(procgen.SpawnTable(procgen.enemy_chances, 0)) == {entity_factories.orc: 80}
+    assert weights(procgen.SpawnTable(procgen.enemy_chances, 4)) == {entity_factories.orc: 80, entity_factories.troll: 15}
+    assert weights(procgen.SpawnTable(procgen.enemy_chances, 9)) == {entity_factories.orc: 80, entity_factories.troll: 60}
+    assert weights(procgen.SpawnTable(procgen.item_chances, 2)) == {
+        entity_factories.health_potion: 35, entity_factories.confusion_scroll: 10,
+    }
+
+
+@pytest.mark.parametrize("floor", [1, 4, 7])
+def test_picks_follow_the_weights(floor):
+    table = procgen.SpawnTable(procgen.item_chances, floor)
+    picks = table.sample(np.random.default_rng(floor), 100_000)
+
+    expected = weights(table)
+    total = sum(expected.values())
+    counts = np.bincount(picks, minlength=len(procgen.spawnable_entities))
+    for entity, weight in expected.items():
+        share = counts[procgen.spawnable_entity_ids[entity]] / len(picks)
+        assert share == pytest.approx(weight / total, abs=0.01)
+    assert counts.sum() == sum(counts[procgen.spawnable_entity_ids[entity]] for entity in expected)
+
+
+def test_picks_are_the_same_for_the_same_seed():
+    table = procgen.SpawnTable(procgen.enemy_chances, 5)
+    first = table.sample(np.random.default_rng(3), 50)
+    assert (table.sample(np.random.default_rng(3), 50) == first).all()
+    assert not (table.sample(np.random.default_rng(4), 50) == first).all()
+
+
+def test_empty_samples():
+    table = procgen.SpawnTable(procgen.enemy_chances, 1)
+    assert len(table.sample(np.random.default_rng(0), 0)) == 0
+    assert len(procgen.SpawnTable({}, 1).sample(np.random.default_rng(0), 10)) == 0
+
+
+@pytest.mark.parametrize("floor", [1, 4, 6])
+def test_spawns_per_area_stay_within_the_floor_maximums(floor):
+    entity_ids, areas = procgen.sample_spawns(200, floor, np.random.default_rng(floor))
+    items = np.isin(entity_ids, [procgen.spawnable_entity_ids[entity] for entity in weights(
+        procgen.SpawnTable(procgen.item_chances, floor),
+    )])
+
+    #items come first, then monsters
+    assert not (items[1:] & ~items[:-1]).any()
+    assert np.bincount(areas[items], minlength=200).max() <= procgen.get_max_value_for_floor(procgen.max_items_by_floor, floor)
+    assert np.bincount(areas[~items], minlength=200).max() <= procgen.get_max_value_for_floor(
+        procgen.max_monsters_by_floor, floor,
+    )
@@ -0,0 +1,100 @@
+import entity_factories
+from components.ai import ConfusedEnemy
+from timer_wheel import TimerWheel
+
+
+def test_timers_fire_on_their_turn_in_scheduling_order():
+    wheel = TimerWheel(slots=4)
+    fired = []
+    for delay, name in [(3, "a"), (1, "b"), (3, "c"), (7, "d"), (0, "e")]:  #7 wraps around the wheel
+        wheel.schedule(delay, lambda name=name: fired.append((wheel.turn, name)))
+
+    for _ in range(10):
+        wheel.advance()
+    assert fired == [(1, "b"), (1, "e"), (3, "a"), (3, "c"), (7, "d")]
+
+
+def test_cancelled_timers_never_fire():
+    wheel = TimerWheel(slots=4)
+    fired = []
+    first = wheel.schedule(2, lambda: fired.append("first"))
+    second = wheel.schedule(2, lambda: fired.append("second"))
+    wheel.schedule(1, lambda: wheel.cancel(second))  #cancelled by another timer's callback
+    wheel.cancel(first)
+
+    for _ in range(6):
+        wheel.advance()
+    assert fired == []
+    assert wheel.remaining(first) == wheel.remaining(second) == 0
+
+
+def test_callbacks_can_schedule_into_the_bucket_being_fired():
+    wheel = TimerWheel(slots=4)
+    fired = []
+
+    def again():
+        fired.append(wheel.turn)
+        if len(fired) < 3:
+            wheel.schedule(4, again)  #the same bucket, a lap later
+
+    wheel.schedule(4, again)
+    for _ in range(20):
+        wheel.advance()
+    assert fired == [4, 8, 12]
+
+
+def test_paused_timers_keep_the_turns_they_had_left():
+    wheel = TimerWheel(slots=4)
+    fired = []
+    timer = wheel.schedule(5, lambda: fired.append(wheel.turn))
+    wheel.advance()
+    wheel.advance()
+    wheel.pause(timer)
+
+    for _ in range(10):
+        wheel.advance()
+    assert fired == [] and wheel.remaining(timer) == 3
+
+    wheel.resume(timer)
+    for _ in range(10):
+        wheel.advance()
+    assert fired == [15]
+
+
+def test_cooldowns_only_run_down_while_equipped(engine):
+    player = engine.player
+    sword = entity_factories.sword.spawn(engine.game_map, player.x, player.y)
+    sword.parent = player.inventory
+    player.inventory.items.append(sword)
+    player.equipment.toggle_equip(sword, add_message=False)
+
+    sword.equippable.current_cooldown = 2
+    engine.timers.advance()
+    player.equipment.toggle_equip(sword, add_message=False)
+    for _ in range(5):
+        engine.timers.advance()
+    assert sword.equippable.current_cooldown == 1
+
+    player.equipment.toggle_equip(sword, add_message=False)
+    engine.timers.advance()
+    assert sword.equippable.current_cooldown == 0
+
+
+def test_confusion_waits_on_evicted_floors(engine):
+    world = engine.game_world
+    world.floors.live_capacity = 1
+    monster = next(actor for actor in engine.game_map.actors if actor is not engine.player)
+    monster.ai = ConfusedEnemy(monster, monster.ai, 3)
+    first_floor = world.current_floor
+
+    world.generate_floor()  #evicts the first floor
+    for _ in range(10):
+        engine.timers.advance()
+    assert not any("no longer confused" in message.plain_text for message in engine.message_log.messages)
+
+    world.move_to_floor(first_floor)
+    monster = next(actor for actor in engine.game_map.actors if isinstance(actor.ai, ConfusedEnemy))
+    assert monster.ai.turns_remaining == 3
+    for _ in range(3):
+        engine.timers.advance()
+    assert not isinstance(monster.ai, ConfusedEnemy)